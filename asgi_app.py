@@ -0,0 +1,411 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import local_api as api
+
+# ============================================================
+# BACKEND ASGI (mesmas rotas do Flask, servidor asyncio)
+# - /data só faz o parse do corpo e enfileira no escritor único
+#   (IngestorSerial): o event loop nunca roda parse de frame
+# - leituras saem do CacheLeitura (JSON pronto por versão do estado);
+#   cache válido responde direto no loop, miss monta num thread do executor
+#
+# Ex:
+#   pip install uvicorn
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 8485 --no-access-log
+# /stream (SSE) fica aberto sem ocupar thread: o assinante acorda o loop
+# - leituras rodam num executor só delas (BET_READ_WORKERS threads) e
+#   passam pelo limite por cliente (429); o /data não usa executor
+# - miss do cache é single-flight: leituras iguais que chegam enquanto a
+#   montagem roda esperam o mesmo future, sem pegar outra thread
+# ============================================================
+
+JSON = b"application/json"
+FLAT = api.flat.CONTENT_TYPE.encode()
+TEXTO = b"text/plain; charset=utf-8"
+
+LEITURAS = ThreadPoolExecutor(api.READ_WORKERS, thread_name_prefix="read") if api.READ_WORKERS > 0 else None
+_EM_VOO = {}  # nome no cache -> future da montagem em andamento
+
+
+async def _ler_corpo(receive) -> bytes:
+    partes = []
+    while True:
+        msg = await receive()
+        partes.append(msg.get("body", b""))
+        if not msg.get("more_body"):
+            break
+    return b"".join(partes)
+
+
+async def _responder(send, status: int, corpo: bytes, ctype: bytes = JSON, extra=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", ctype),
+            (b"content-length", str(len(corpo)).encode()),
+            (b"access-control-allow-origin", b"*"),
+            *extra,
+        ],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+def _json(obj) -> bytes:
+    return api.app.json.dumps(obj).encode("utf-8")
+
+
+async def _doc_cache(nome: str) -> bytes:
+    doc = api.CACHE_LEITURA.pronto(nome)
+    if doc is not None:
+        api.METRICAS.inc("read_cache_total", resultado="hit")
+        return doc
+    fut = _EM_VOO.get(nome)
+    if fut is None:
+        fut = _EM_VOO[nome] = asyncio.ensure_future(_no_executor(api.CACHE_LEITURA.obter, nome))
+        fut.add_done_callback(lambda _f: _EM_VOO.pop(nome, None))
+    return await asyncio.shield(fut)
+
+
+async def _no_executor(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(LEITURAS, fn, *args)
+
+
+# ------------------------------------------------------------
+# handlers: (args, corpo) -> (status, bytes, content-type)
+# ------------------------------------------------------------
+async def rota_data(args, corpo, cliente=None):
+    try:
+        data = json.loads(corpo or b"{}")
+    except ValueError:
+        return 400, b"0", TEXTO
+    if not isinstance(data, dict):
+        data = {}
+    raw = data.get("data", "")
+    now_ts = api.ts_agora_utc()
+    fonte = api.normalizar_fonte(data.get("source"), cliente)
+    aba = data.get("tab")
+    seq, sid = api.parse_seq(data)
+    feed = api.normalizar_feed(data.get("feed") or args.get("feed") or args.get("lang"))
+    api.registrar_recebimento(raw, now_ts, fonte, aba)
+    if not api.INGESTOR.enfileirar(raw, now_ts, fonte, aba, seq, sid, feed):
+        return 503, b"0", TEXTO
+    if api.consumir_resync(fonte, aba, sid):
+        return 200, b"resync", TEXTO
+    return 200, b"1", TEXTO
+
+
+async def _no_feed(feed, fn, *args):
+    """Leitura de um feed extra: monta direto no motor dele (sem cache)."""
+    status, doc = await _no_executor(api.ler_no_feed, feed, fn, *args)
+    return status, _json(doc), JSON
+
+
+async def _no_feed_flat(feed, tipo, fn, arg, filtro):
+    status, doc = await _no_executor(api.ler_no_feed, feed, fn, arg, filtro)
+    if status != 200:
+        return status, _json(doc), JSON
+    c2 = arg if tipo == "markets" else ""
+    return status, await _no_executor(api.encode_flat, tipo, doc, c2), FLAT
+
+
+def _pede_flat(scope) -> bool:
+    for k, v in scope.get("headers") or ():
+        if k == b"accept":
+            return api.pede_flat(v.decode("latin-1"))
+    return False
+
+
+async def rota_live(args, corpo, binario=False):
+    if api.since_com_filtro(args):
+        return 400, _json({"erro": api.ERRO_SINCE_FILTRADO}), JSON
+    feed = api.feed_da_requisicao(args)
+    if feed is not None:
+        if "since" in args:
+            return await _no_feed(feed, api.montar_live_delta, args.get("odds") != "0", api.parse_since(args.get("since")))
+        filtro = api.parse_filtro_leitura(args, "live")
+        if binario:
+            return await _no_feed_flat(feed, "live", api.montar_live, args.get("odds") != "0", filtro)
+        return await _no_feed(feed, api.montar_live, args.get("odds") != "0", filtro)
+    if "since" in args:
+        nome = "live_sem_odds" if args.get("odds") == "0" else "live"
+        return 200, await _no_executor(api.CACHE_LEITURA.delta, nome, api.parse_since(args.get("since"))), JSON
+    nome = api.nome_cache_live(args)
+    if binario:
+        return 200, await _no_executor(api.CACHE_LEITURA.binario, nome), FLAT
+    return 200, await _doc_cache(nome), JSON
+
+
+async def rota_markets(args, corpo, binario=False):
+    c2 = args.get("c2", "").strip()
+    feed = api.feed_da_requisicao(args)
+    if feed is not None:
+        filtro = api.parse_filtro_leitura(args, "markets")
+        if binario:
+            return await _no_feed_flat(feed, "markets", api.montar_markets, c2, filtro)
+        return await _no_feed(feed, api.montar_markets, c2, filtro)
+    nome = api.nome_cache_markets(args)
+    if binario:
+        return 200, await _no_executor(api.CACHE_LEITURA.binario, nome), FLAT
+    return 200, await _doc_cache(nome), JSON
+
+
+async def rota_feeds(args, corpo):
+    return 200, _json(api.montar_feeds()), JSON
+
+
+async def rota_explicar_frame(args, corpo):
+    c2 = args.get("c2", "").strip()
+    if not c2:
+        return 400, _json({"erro": "Informe o parâmetro ?c2=ID_DO_EVENTO"}), JSON
+
+    return await _no_feed(api.feed_da_requisicao(args), api.montar_explicar_frame, c2)
+
+
+async def rota_targets(args, corpo):
+    try:
+        limit = int(args.get("limit", "15"))
+    except ValueError:
+        return 400, _json({"erro": "limit inválido"}), JSON
+
+    # o cooldown (ULTIMO_ENVIO_TARGET_TS) muda a cada chamada: não cacheia
+    # a resposta, só reaproveita o live_sem_odds do cache
+    def montar():
+        live = api.CACHE_LEITURA.objeto("live_sem_odds")
+        return _json(api.montar_targets(limit, args.get("cooldown"), live=live))
+
+    return 200, await _no_executor(montar), JSON
+
+
+async def rota_active_ids(args, corpo):
+    return 200, await _doc_cache("active_ids"), JSON
+
+
+async def rota_active_map(args, corpo):
+    return 200, await _doc_cache("active_map"), JSON
+
+
+async def rota_sources(args, corpo):
+    return 200, _json(api.montar_sources()), JSON
+
+
+async def rota_history(args, corpo):
+    status, doc = await _no_executor(api.montar_history, args)
+    return status, _json(doc), JSON
+
+
+async def rota_history_score(args, corpo):
+    status, doc = await _no_executor(api.montar_history_score, args)
+    return status, _json(doc), JSON
+
+
+async def rota_goals(args, corpo):
+    return 200, _json(await _no_executor(api.montar_goals)), JSON
+
+
+async def rota_anomalies(args, corpo):
+    status, doc = await _no_executor(api.montar_anomalias, args)
+    return status, _json(doc), JSON
+
+
+async def rota_timeline(args, corpo):
+    status, doc = await _no_executor(api.montar_timeline, args)
+    return status, _json(doc), JSON
+
+
+async def rota_goals_replay(scope, receive, send, args):
+    """Devolve o dump de uma janela de gol em pedaços (leitura do arquivo no executor)."""
+    status, corpo, ctype = await _no_executor(api.replay_goal, args)
+    if isinstance(corpo, dict):
+        await _responder(send, status, _json(corpo))
+        return
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", ctype.encode()), (b"access-control-allow-origin", b"*")],
+    })
+    while True:
+        bloco = await _no_executor(next, corpo, None)
+        if bloco is None:
+            break
+        await send({"type": "http.response.body", "body": bloco, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _rota_executor(fn):
+    """Builder (args) -> (status, doc) rodando no executor."""
+    async def rota(args, corpo):
+        status, doc = await _no_executor(fn, args)
+        return status, _json(doc), JSON
+    return rota
+
+
+async def rota_feed_rates(args, corpo):
+    return 200, await _doc_cache("feed_rates"), JSON
+
+
+async def rota_metrics(args, corpo):
+    return 200, api.METRICAS.render_prometheus().encode("utf-8"), b"text/plain; version=0.0.4"
+
+
+async def rota_stream(scope, receive, send, args):
+    """SSE: mesmo formato do /stream do Flask, sem prender thread por cliente."""
+    topicos = api.parse_topicos(args.get("topics"))
+    sub = api.BROKER.subscribe(topicos)
+    desconectou = asyncio.Event()
+
+    async def vigiar():
+        while True:
+            msg = await receive()
+            if msg["type"] == "http.disconnect":
+                desconectou.set()
+                return
+
+    tarefa = asyncio.create_task(vigiar())
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        iniciais = await _no_executor(api.mensagens_iniciais, topicos)
+        corpo = "".join(api.format_sse(m) for m in iniciais).encode("utf-8")
+        if corpo:
+            await send({"type": "http.response.body", "body": corpo, "more_body": True})
+        while not desconectou.is_set():
+            msg = await sub.aget(15.0)
+            if desconectou.is_set():
+                break
+            corpo = api.sse_bytes(msg) if msg else api.SSE_PING_BYTES
+            await send({"type": "http.response.body", "body": corpo, "more_body": True})
+    except OSError:
+        pass
+    finally:
+        sub.close()
+        tarefa.cancel()
+
+
+# rotas que controlam a resposta inteira (streaming)
+ROTAS_STREAM = {
+    ("GET", "/stream"): rota_stream,
+    ("GET", "/goals/replay"): rota_goals_replay,
+}
+
+ROTAS = {
+    ("POST", "/data"): rota_data,
+    ("GET", "/live"): rota_live,
+    ("GET", "/markets"): rota_markets,
+    ("GET", "/explicar_frame"): rota_explicar_frame,
+    ("GET", "/targets"): rota_targets,
+    ("GET", "/active_ids"): rota_active_ids,
+    ("GET", "/active_map"): rota_active_map,
+    ("GET", "/feed_rates"): rota_feed_rates,
+    ("GET", "/sources"): rota_sources,
+    ("GET", "/feeds"): rota_feeds,
+    ("GET", "/history"): rota_history,
+    ("GET", "/history/score"): rota_history_score,
+    ("GET", "/goals"): rota_goals,
+    ("GET", "/anomalies"): rota_anomalies,
+    ("GET", "/timeline"): rota_timeline,
+    ("GET", "/process_dump"): _rota_executor(api.iniciar_job_dump),
+    ("POST", "/process_dump"): _rota_executor(api.iniciar_job_dump),
+    ("GET", "/process_dump/status"): _rota_executor(api.status_job_dump),
+    ("GET", "/process_dump/cancel"): _rota_executor(api.cancelar_job_dump),
+    ("POST", "/process_dump/cancel"): _rota_executor(api.cancelar_job_dump),
+    ("GET", "/process_dump/live"): _rota_executor(api.live_job_dump),
+    ("GET", "/process_dump/markets"): _rota_executor(api.markets_job_dump),
+    ("GET", "/metrics"): rota_metrics,
+}
+
+
+def iniciar_motor():
+    api.iniciar_shards()
+    api.iniciar_historico()
+    api.iniciar_persistencia()
+    api.iniciar_ingestor()
+    api.iniciar_publicador_shm()
+    api.iniciar_vigia_eventos()
+
+
+async def _lifespan(receive, send):
+    while True:
+        msg = await receive()
+        if msg["type"] == "lifespan.startup":
+            try:
+                iniciar_motor()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif msg["type"] == "lifespan.shutdown":
+            if api.GRAVADOR_SNAPSHOT is not None:
+                api.GRAVADOR_SNAPSHOT.stop()  # antes de parar os shards (o snapshot lê deles)
+            if api.SHARD_POOL is not None:
+                api.SHARD_POOL.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    metodo = scope["method"]
+    if metodo == "OPTIONS":
+        await send({
+            "type": "http.response.start",
+            "status": 204,
+            "headers": [
+                (b"access-control-allow-origin", b"*"),
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", b"content-type"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    qs = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    args = {k: v[0] for k, v in qs.items()}
+
+    if api.INGESTOR is None:
+        # servidor sem lifespan (ex: hypercorn --lifespan off)
+        iniciar_motor()
+
+    stream = ROTAS_STREAM.get((metodo, scope["path"]))
+    if stream is not None:
+        await stream(scope, receive, send, args)
+        return
+
+    handler = ROTAS.get((metodo, scope["path"]))
+    if handler is None:
+        await _responder(send, 404, _json({"erro": "rota não encontrada"}))
+        return
+
+    if metodo == "GET" and scope["path"] in api.ROTAS_LEITURA:
+        espera = api.checar_limite_leitura(scope["path"], (scope.get("client") or (None,))[0])
+        if espera:
+            await _responder(send, 429, _json({"erro": "limite de leituras", "retry_after": round(espera, 3)}),
+                             extra=[(b"retry-after", str(max(1, int(espera + 0.999))).encode())])
+            return
+
+    corpo = await _ler_corpo(receive) if metodo == "POST" else b""
+
+    if handler is rota_data:
+        cliente = (scope.get("client") or (None,))[0]
+        status, doc, ctype = await rota_data(args, corpo, cliente)
+    elif handler is rota_live or handler is rota_markets:
+        status, doc, ctype = await handler(args, corpo, _pede_flat(scope))
+    else:
+        status, doc, ctype = await handler(args, corpo)
+    await _responder(send, status, doc, ctype)
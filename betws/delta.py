@@ -0,0 +1,160 @@
+# betws/delta.py
+from __future__ import annotations
+import json
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# ============================================================
+# /live?since=<versão>: só o que mudou desde o cursor do cliente
+#
+# - DeltaTracker guarda uma assinatura (tupla de valores, nunca referência:
+#   o parser muda os dicts das seleções no lugar) por campo do evento, por
+#   mercado e por seleção, com a versão em que ela mudou pela última vez
+# - observe(doc) roda a cada montagem do /live: o que mudou ganha a versão
+#   nova; o que sumiu (mercado de gol podado, evento encerrado) vira lápide
+# - a versão começa no relógio da subida (µs): cursor de um processo
+#   anterior é sempre menor que o horizonte e recebe o documento inteiro
+# - lápides ficam até `max_tombstones`; cursor mais velho que a lápide mais
+#   antiga descartada (horizonte) também recebe o documento inteiro
+# - evento volta só com os campos que mudaram (o "time" anda todo segundo),
+#   mercado com os campos dele + só as seleções que mudaram
+# ============================================================
+
+SEL_CAMPOS = ("nome", "od_frac", "od_dec", "suspenso", "linha_ha", "linha_hd",
+              "ordem", "n2", "selection_id", "selection_it")
+
+
+def selection_key(sel: dict) -> str:
+    return sel.get("selection_id") or sel.get("selection_it") or sel.get("nome") or ""
+
+
+def _valor(v):
+    """Assinatura imutável de um campo do evento (next_goal é dict com seleções vivas)."""
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, sort_keys=True, default=str)
+    return v
+
+
+class DeltaTracker:
+    def __init__(self, max_tombstones: int = 50000, sel_fields: Sequence[str] = SEL_CAMPOS):
+        self.version = time.time_ns() // 1000
+        self.horizon = self.version
+        self.sel_fields = tuple(sel_fields)
+        self.max_tombstones = max(1, max_tombstones)
+        self._campos: Dict[str, Dict[str, Tuple[object, int]]] = {}    # c2 -> campo -> (valor, versão)
+        self._mercados: Dict[Tuple[str, str], Tuple[tuple, int]] = {}   # (c2, mercado) -> (assinatura, versão)
+        self._selecoes: Dict[Tuple[str, str, str], Tuple[tuple, int]] = {}
+        self._subarvore: Dict[tuple, int] = {}  # (c2,) / (c2, mercado) -> maior versão dentro
+        self._lapides: deque = deque()          # (versão, tipo, chave)
+
+    # ---------- montagem (dentro do lock do estado) ----------
+    def observe(self, doc: List[dict]) -> int:
+        nova = self.version + 1
+        mudou = False
+        vistos_ev, vistos_mk, vistos_sel = set(), set(), set()
+        sub = self._subarvore
+        for ev in doc:
+            c2 = ev.get("event_id")
+            if not c2:
+                continue
+            vistos_ev.add(c2)
+            antigos = self._campos.get(c2)
+            if antigos is None:
+                antigos = self._campos[c2] = {}
+            max_ev = sub.get((c2,), 0)
+            for campo, v in ev.items():
+                if campo == "mercados":
+                    continue
+                sig = _valor(v)
+                ant = antigos.get(campo)
+                if ant is None or ant[0] != sig:
+                    antigos[campo] = (sig, nova)
+                    max_ev = nova
+            for campo in [c for c in antigos if c not in ev]:
+                # campo que deixou de vir (ex: odds=0) vira None para o cliente
+                if antigos[campo][0] is not None:
+                    antigos[campo] = (None, nova)
+                    max_ev = nova
+
+            for nome, mk in (ev.get("mercados") or {}).items():
+                kmk = (c2, nome)
+                vistos_mk.add(kmk)
+                sig = (mk.get("nome_mercado"), mk.get("market_id"), mk.get("market_it"), mk.get("suspenso"))
+                ant = self._mercados.get(kmk)
+                max_mk = sub.get(kmk, 0)
+                if ant is None or ant[0] != sig:
+                    self._mercados[kmk] = (sig, nova)
+                    max_mk = nova
+                for sel in mk.get("selecoes") or ():
+                    ks = (c2, nome, selection_key(sel))
+                    vistos_sel.add(ks)
+                    sig = tuple(sel.get(c) for c in self.sel_fields)
+                    ant = self._selecoes.get(ks)
+                    if ant is None or ant[0] != sig:
+                        self._selecoes[ks] = (sig, nova)
+                        max_mk = nova
+                if max_mk == nova:
+                    sub[kmk] = nova
+                    max_ev = nova
+            if max_ev == nova:
+                sub[(c2,)] = nova
+                mudou = True
+
+        for tipo, atual, vistos in (("selections", self._selecoes, vistos_sel),
+                                    ("markets", self._mercados, vistos_mk)):
+            for k in [k for k in atual if k not in vistos]:
+                del atual[k]
+                sub.pop(k, None)
+                if k[0] in vistos_ev:  # evento que sumiu inteiro leva uma lápide só
+                    self._lapides.append((nova, tipo, k))
+                    mudou = True
+        for c2 in [c2 for c2 in self._campos if c2 not in vistos_ev]:
+            del self._campos[c2]
+            sub.pop((c2,), None)
+            self._lapides.append((nova, "events", c2))
+            mudou = True
+
+        while len(self._lapides) > self.max_tombstones:
+            self.horizon = self._lapides.popleft()[0]
+        if mudou:
+            self.version = nova
+        return self.version
+
+    # ---------- leitura (mesmo doc da última observe, dentro do lock) ----------
+    def delta(self, doc: List[dict], since: Optional[int]) -> dict:
+        if since is None or since < self.horizon or since > self.version:
+            return {"version": self.version, "since": since, "full": True, "events": doc,
+                    "removed": {"events": [], "markets": [], "selections": []}}
+        sub = self._subarvore
+        eventos = []
+        for ev in doc:
+            c2 = ev.get("event_id")
+            if not c2 or sub.get((c2,), 0) <= since:
+                continue
+            campos = self._campos.get(c2, {})
+            out = {campo: ev.get(campo) for campo, (_v, ver) in campos.items() if ver > since}
+            out["event_id"] = c2
+            mercados = {}
+            for nome, mk in (ev.get("mercados") or {}).items():
+                if sub.get((c2, nome), 0) <= since:
+                    continue
+                m = {k: v for k, v in mk.items() if k != "selecoes" and not k.startswith("_")}
+                m["selecoes"] = [s for s in mk.get("selecoes") or ()
+                                 if self._selecoes.get((c2, nome, selection_key(s)), (None, 0))[1] > since]
+                mercados[nome] = m
+            if mercados:
+                out["mercados"] = mercados
+            eventos.append(out)
+
+        removidos = {"events": [], "markets": [], "selections": []}
+        for ver, tipo, k in reversed(self._lapides):
+            if ver <= since:
+                break
+            removidos[tipo].append(list(k) if isinstance(k, tuple) else k)
+        return {"version": self.version, "since": since, "full": False, "events": eventos, "removed": removidos}
+
+    def stats(self) -> dict:
+        return {"version": self.version, "horizon": self.horizon, "events": len(self._campos),
+                "markets": len(self._mercados), "selections": len(self._selecoes),
+                "tombstones": len(self._lapides)}
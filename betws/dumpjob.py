@@ -0,0 +1,164 @@
+# betws/dumpjob.py
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+# ============================================================
+# Reprocessamento de arquivo de captura em background
+#
+# - iter_blocks() lê o arquivo linha a linha (memória ~ 1 frame), nos dois
+#   formatos gravados pelo projeto:
+#     indexado: "--- ts=<epoch> [fid=..]" antes de cada frame (dump de gol,
+#               /process_dump); cabeçalhos "== GOAL DETECTED ==" / "===== "
+#     raw log:  frames separados por linha em branco (raw_websocket.txt)
+# - DumpJob roda num thread: aplica cada bloco com o ts gravado (bloco sem
+#   ts usa o último ts visto, ou o relógio), respeita `rate` frames/s e
+#   para no cancel() entre dois frames
+# ============================================================
+
+
+def iter_blocks(path: str) -> Iterator[Tuple[Optional[int], str, int]]:
+    """(ts | None, raw, bytes_lidos) em ordem, sem carregar o arquivo."""
+    ts = None
+    indexado = False
+    cur = []
+    pos = 0
+    with open(path, "rb") as f:
+        for linha in f:
+            pos += len(linha)
+            s = linha.decode("utf-8", errors="replace").rstrip("\r\n")
+            if s.startswith("--- ts="):
+                if cur:
+                    raw = "\n".join(cur).strip()
+                    if raw:
+                        yield ts, raw, pos
+                cur = []
+                indexado = True
+                campo = s[7:].split(None, 1)[0] if len(s) > 7 else ""
+                ts = int(campo) if campo.isdigit() else None
+                continue
+            if s.startswith("== GOAL DETECTED ==") or s.startswith("===== "):
+                continue
+            if not indexado and not s:
+                if cur:
+                    raw = "\n".join(cur).strip()
+                    if raw:
+                        yield None, raw, pos
+                cur = []
+                continue
+            cur.append(s)
+    if cur:
+        raw = "\n".join(cur).strip()
+        if raw:
+            yield ts, raw, pos
+
+
+class DumpJob:
+    def __init__(self, job_id: str, path: str, apply: Callable[[str, int], None],
+                 rate: float = 0.0, recorded_ts: bool = True, target: str = "live",
+                 clock: Callable[[], int] = lambda: int(time.time())):
+        self.id = job_id
+        self.path = path
+        self.apply = apply
+        self.rate = max(0.0, float(rate or 0))
+        self.recorded_ts = recorded_ts
+        self.target = target
+        self.clock = clock
+        self.status = "pendente"
+        self.erro = None
+        self.blocks = 0
+        self.errors = 0
+        self.bytes_read = 0
+        self.size = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.started = None
+        self.finished = None
+        self.on_finish: Optional[Callable[["DumpJob"], None]] = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self) -> "DumpJob":
+        self.size = os.path.getsize(self.path)  # FileNotFoundError sobe para quem chamou
+        self.status = "rodando"
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"dump-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout: float = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        t0 = time.perf_counter()
+        ultimo_ts = None
+        try:
+            for ts, raw, pos in iter_blocks(self.path):
+                if self._cancel.is_set():
+                    self.status = "cancelado"
+                    break
+                if not self.recorded_ts or ts is None:
+                    ts = ultimo_ts if (self.recorded_ts and ultimo_ts is not None) else self.clock()
+                ultimo_ts = ts
+                try:
+                    self.apply(raw, ts)
+                except Exception:
+                    self.errors += 1
+                self.blocks += 1
+                self.bytes_read = pos
+                if self.first_ts is None:
+                    self.first_ts = ts
+                self.last_ts = ts
+                if self.rate:
+                    # limite de taxa: não passa de `rate` frames/s desde o início
+                    adiantado = self.blocks / self.rate - (time.perf_counter() - t0)
+                    if adiantado > 0 and self._cancel.wait(adiantado):
+                        self.status = "cancelado"
+                        break
+            else:
+                self.status = "concluido"
+                self.bytes_read = self.size
+        except Exception as e:
+            self.status = "erro"
+            self.erro = str(e)
+        self.finished = time.time()
+        if self.on_finish is not None:
+            try:
+                self.on_finish(self)
+            except Exception:
+                pass
+
+    def progress(self) -> dict:
+        fim = self.finished or time.time()
+        dur = max(1e-6, fim - self.started) if self.started else 0.0
+        frac = (self.bytes_read / self.size) if self.size else 0.0
+        fps = self.blocks / dur if dur else 0.0
+        eta = None
+        if self.status == "rodando" and frac > 0:
+            eta = round(dur * (1 - frac) / frac, 1)
+        return {
+            "job": self.id,
+            "path": self.path,
+            "target": self.target,
+            "status": self.status,
+            "erro": self.erro,
+            "blocks": self.blocks,
+            "errors": self.errors,
+            "bytes_read": self.bytes_read,
+            "size": self.size,
+            "progress": round(frac, 4),
+            "frames_per_s": round(fps, 1),
+            "rate": self.rate,
+            "eta_s": eta,
+            "recorded_ts": self.recorded_ts,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "started": self.started,
+            "finished": self.finished,
+        }
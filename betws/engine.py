@@ -0,0 +1,140 @@
+# betws/engine.py
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+# ============================================================
+# Motores por feed: cada Engine é um conjunto próprio de stores/índices
+#
+# O parser do local_api lê e escreve globais do módulo (DATA,
+# DADOS_MERCADO_POR_EVENTO, ...). EngineSet.use(feed) aponta essas globais
+# para o conjunto do motor pedido e, na saída, recolhe o que o parser
+# rebindou (ex: DATA no snapshot OVInPlay) e devolve o motor anterior.
+#
+# - troca = reatribuir os nomes (sem cópia), sempre dentro do lock do estado
+# - o motor padrão mora nas próprias globais: feed único nunca troca nada
+# - motor parado é só memória (nenhum thread, nenhum custo por frame);
+#   prune_idle() descarta os que ficaram sem uso
+# - StringTable: tabela única de strings para todos os motores (ids,
+#   odds, linhas): o mesmo selection_id/od nos feeds de idiomas diferentes
+#   é um objeto só; os dicts de mercado/seleção continuam por motor
+# ============================================================
+
+
+class EngineLimit(KeyError):
+    pass
+
+
+class StringTable:
+    """Interning com teto (sys.intern não solta nunca; ids novos chegam o dia todo)."""
+    __slots__ = ("max_size", "_d", "resets")
+
+    def __init__(self, max_size: int = 500_000):
+        self.max_size = max(1, max_size)
+        self._d: Dict[str, str] = {}
+        self.resets = 0
+
+    def __call__(self, s):
+        if not s:
+            return s
+        v = self._d.get(s)
+        if v is None:
+            if len(self._d) >= self.max_size:
+                # recomeça: quem já guardou a string continua com ela
+                self._d.clear()
+                self.resets += 1
+            v = self._d[s] = s
+        return v
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+
+class Engine:
+    __slots__ = ("feed", "state", "created", "last_used", "uses")
+
+    def __init__(self, feed: str, state: Optional[dict]):
+        self.feed = feed
+        self.state = state  # None enquanto o motor está ativo (estado nas globais)
+        self.created = time.time()
+        self.last_used = self.created
+        self.uses = 0
+
+
+class EngineSet:
+    def __init__(self, namespace: dict, names: Sequence[str], factory: Callable[[str], dict],
+                 default: str, lock=None, max_engines: int = 8):
+        self.ns = namespace
+        self.names = tuple(names)
+        self.factory = factory
+        self.default = default
+        self.lock = lock or threading.RLock()
+        self.max_engines = max(1, max_engines)
+        self.engines: Dict[str, Engine] = {default: Engine(default, None)}
+        self.active = default
+
+    def get(self, feed: Optional[str] = None, create: bool = False) -> Optional[Engine]:
+        feed = feed or self.default
+        eng = self.engines.get(feed)
+        if eng is None and create:
+            with self.lock:
+                eng = self.engines.get(feed)
+                if eng is None:
+                    if len(self.engines) >= self.max_engines:
+                        raise EngineLimit(feed)
+                    eng = self.engines[feed] = Engine(feed, self.factory(feed))
+        return eng
+
+    def _switch(self, feed: str):
+        atual = self.engines.get(self.active)
+        if atual is not None:
+            atual.state = {n: self.ns[n] for n in self.names}
+        eng = self.engines[feed]
+        self.ns.update(eng.state)
+        eng.state = None
+        self.active = feed
+
+    @contextmanager
+    def use(self, feed: Optional[str] = None, create: bool = False) -> Iterator[Engine]:
+        """Roda o bloco com as globais apontando para o motor `feed` (KeyError se não existe)."""
+        feed = feed or self.default
+        with self.lock:
+            eng = self.get(feed, create=create)
+            if eng is None:
+                raise KeyError(feed)
+            eng.last_used = time.time()
+            eng.uses += 1
+            if feed == self.active:
+                yield eng
+                return
+            anterior = self.active
+            self._switch(feed)
+            try:
+                yield eng
+            finally:
+                self._switch(anterior)
+
+    def drop(self, feed: str) -> bool:
+        if feed == self.default:
+            return False
+        with self.lock:
+            if feed == self.active:
+                return False
+            return self.engines.pop(feed, None) is not None
+
+    def prune_idle(self, max_idle: float, now: Optional[float] = None, keep: Sequence[str] = ()) -> List[str]:
+        now = time.time() if now is None else now
+        with self.lock:
+            velhos = [f for f, e in self.engines.items()
+                      if f != self.default and f != self.active and f not in keep
+                      and now - e.last_used > max_idle]
+            for f in velhos:
+                self.engines.pop(f, None)
+        return velhos
+
+    def feeds(self) -> List[dict]:
+        return [{"feed": e.feed, "default": e.feed == self.default, "created": e.created,
+                 "last_used": e.last_used, "uses": e.uses}
+                for e in list(self.engines.values())]
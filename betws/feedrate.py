@@ -0,0 +1,66 @@
+# betws/feedrate.py
+from __future__ import annotations
+import math
+from typing import Dict, Hashable, List, Optional
+
+# ============================================================
+# Taxa por chave com decaimento exponencial (EWMA contínua)
+#
+#   taxa <- taxa * exp(-dt/tau) + n/tau
+#
+# - O(1) por hit, sem janela/ring por chave
+# - lida com vários hits no mesmo segundo (dt = 0) sem dividir por zero
+# - rate(chave, agora) já aplica o decaimento até "agora": chave que
+#   parou de receber cai sozinha para ~0 em poucos tau
+# ============================================================
+
+
+class RateTracker:
+    __slots__ = ("tau", "_ent")
+
+    def __init__(self, tau: float = 10.0):
+        self.tau = float(tau)
+        self._ent: Dict[Hashable, List[float]] = {}  # chave -> [taxa, ultimo_ts, total]
+
+    def hit(self, key: Hashable, now: float, n: float = 1.0):
+        e = self._ent.get(key)
+        if e is None:
+            self._ent[key] = [n / self.tau, now, n]
+            return
+        dt = now - e[1]
+        if dt > 0:
+            e[0] *= math.exp(-dt / self.tau)
+            e[1] = now
+        e[0] += n / self.tau
+        e[2] += n
+
+    def rate(self, key: Hashable, now: float) -> float:
+        e = self._ent.get(key)
+        if e is None:
+            return 0.0
+        dt = now - e[1]
+        return e[0] * math.exp(-dt / self.tau) if dt > 0 else e[0]
+
+    def last(self, key: Hashable) -> Optional[float]:
+        e = self._ent.get(key)
+        return e[1] if e else None
+
+    def total(self, key: Hashable) -> float:
+        e = self._ent.get(key)
+        return e[2] if e else 0.0
+
+    def keys(self):
+        return list(self._ent.keys())
+
+    def forget(self, key: Hashable):
+        self._ent.pop(key, None)
+
+    def prune(self, now: float, max_idle: float) -> int:
+        """Remove chaves sem hit há mais de max_idle segundos."""
+        velhas = [k for k, e in self._ent.items() if now - e[1] > max_idle]
+        for k in velhas:
+            self._ent.pop(k, None)
+        return len(velhas)
+
+    def __len__(self):
+        return len(self._ent)
@@ -0,0 +1,116 @@
+# betws/flat.py
+from __future__ import annotations
+import math
+import struct
+from itertools import starmap
+from typing import Iterable, List, Tuple
+
+# ============================================================
+# Formato binário plano do /live e do /markets (Accept: CONTENT_TYPE)
+#
+# Para robôs que leem odds em alta frequência: sem dict aninhado por nome
+# de mercado, só tabelas de tamanho fixo + uma tabela de strings.
+#
+#   cabeçalho  <4sHHIIII  magic "BWF1", versão, 0, n_strings, n_events, n_markets, n_rows
+#   strings    (n_strings + 1) offsets u32 + blob utf-8 (string i = blob[off[i]:off[i+1]])
+#   events     n_events  x <IIIIII  c2, event, league, time, score, period
+#   markets    n_markets x <IIB     event_idx, nome, suspenso
+#   rows       n_rows    x <IIIdBII event_idx, market_idx, selection_id, od_dec, suspenso, linha, nome
+#
+# - campos de texto são índices na tabela de strings; NONE = sem valor
+# - od_dec sem valor = NaN; linha = linha_ha, ou linha_hd se não houver HA
+# - tudo little-endian e sem padding: numpy.frombuffer com dtype equivalente lê direto
+# ============================================================
+
+CONTENT_TYPE = "application/vnd.betws.flat"
+MAGIC = b"BWF1"
+VERSION = 1
+NONE = 0xFFFFFFFF
+
+HDR = struct.Struct("<4sHHIIII")
+EVENT = struct.Struct("<IIIIII")
+MARKET = struct.Struct("<IIB")
+ROW = struct.Struct("<IIIdBII")
+
+EVENT_FIELDS = ("event", "league", "time", "score", "period")
+
+
+class _Strings:
+    __slots__ = ("idx", "lst")
+
+    def __init__(self):
+        self.idx = {}
+        self.lst = []
+
+    def __call__(self, s) -> int:
+        if s is None:
+            return NONE
+        i = self.idx.get(s)
+        if i is None:
+            s = str(s)
+            i = self.idx.get(s)
+            if i is None:
+                i = self.idx[s] = len(self.lst)
+                self.lst.append(s)
+        return i
+
+    def pack(self) -> bytes:
+        blobs = [s.encode("utf-8") for s in self.lst]
+        offs = [0]
+        for b in blobs:
+            offs.append(offs[-1] + len(b))
+        return struct.pack(f"<{len(offs)}I", *offs) + b"".join(blobs)
+
+
+def encode(events: Iterable[Tuple[str, dict, dict]]) -> bytes:
+    """events: (c2, cabeçalho do evento, mercados por nome com "selecoes")."""
+    st = _Strings()
+    evs, mks, rows = [], [], []
+    nan = math.nan
+    for c2, cab, mercados in events:
+        ei = len(evs)
+        evs.append((st(c2),) + tuple(st(cab.get(f)) for f in EVENT_FIELDS))
+        for nome, mk in mercados.items():
+            if not isinstance(mk, dict):
+                continue
+            mi = len(mks)
+            mks.append((ei, st(nome), 1 if mk.get("suspenso") else 0))
+            for sel in mk.get("selecoes") or ():
+                od = sel.get("od_dec")
+                rows.append((ei, mi, st(sel.get("selection_id") or sel.get("selection_it")),
+                             nan if od is None else od, 1 if sel.get("suspenso") else 0,
+                             st(sel.get("linha_ha") or sel.get("linha_hd")), st(sel.get("nome"))))
+    partes = [HDR.pack(MAGIC, VERSION, 0, len(st.lst), len(evs), len(mks), len(rows)), st.pack()]
+    partes.extend(starmap(EVENT.pack, evs))
+    partes.extend(starmap(MARKET.pack, mks))
+    partes.extend(starmap(ROW.pack, rows))
+    return b"".join(partes)
+
+
+def decode(buf: bytes) -> dict:
+    """Volta para tabelas Python (para clientes em Python e para o benchmark)."""
+    magic, versao, _r, n_str, n_ev, n_mk, n_rows = HDR.unpack_from(buf, 0)
+    if magic != MAGIC or versao != VERSION:
+        raise ValueError("formato flat desconhecido")
+    pos = HDR.size
+    offs = struct.unpack_from(f"<{n_str + 1}I", buf, pos)
+    pos += 4 * (n_str + 1)
+    blob = bytes(buf[pos:pos + offs[-1]])
+    strings: List[str] = [blob[offs[i]:offs[i + 1]].decode("utf-8") for i in range(n_str)]
+    pos += offs[-1]
+
+    def s(i):
+        return None if i == NONE else strings[i]
+
+    def tabela(fmt: struct.Struct, n: int):
+        nonlocal pos
+        fim = pos + fmt.size * n
+        out = list(fmt.iter_unpack(buf[pos:fim])) if n else []
+        pos = fim
+        return out
+
+    events = [dict(zip(("c2",) + EVENT_FIELDS, map(s, e))) for e in tabela(EVENT, n_ev)]
+    markets = [(e, s(n), bool(su)) for e, n, su in tabela(MARKET, n_mk)]
+    rows = [(e, m, s(sid), None if od != od else od, bool(su), s(ln), s(nm))
+            for e, m, sid, od, su, ln, nm in tabela(ROW, n_rows)]
+    return {"events": events, "markets": markets, "rows": rows}
@@ -0,0 +1,319 @@
+# betws/goals.py
+from __future__ import annotations
+import os
+import queue
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# ============================================================
+# Captura do "antes/depois" do gol por referência
+#
+# - FrameRing: anel único com os frames crus que tocaram algum evento;
+#   cada frame ganha um id crescente (fid) e o slot é fid % capacidade
+# - cada evento guarda só os últimos fids (deque de int), não o texto:
+#   frame que toca N eventos fica uma vez só na memória
+# - o anel cresce (dobrando, até `ring_max`) para caber `antes` frames de
+#   cada evento com refs: com muitos jogos ao vivo os fids de antes do gol
+#   não são sobrescritos antes de o gol chegar
+# - no gol, a janela resolve os fids de antes no anel e fixa os frames
+#   (referência ao mesmo str, sem cópia); os de depois entram já fixados.
+#   Daí em diante o anel pode girar à vontade: fid que já tinha saído do
+#   anel na abertura conta como perdido
+# - fechou, a janela vai para a fila; um thread grava o dump no formato
+#   indexado ("--- ts=..." por bloco, o mesmo do /process_dump e do
+#   replay_bench)
+# ============================================================
+
+
+class FrameRing:
+    __slots__ = ("capacity", "next_fid", "_slots")
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = max(1, int(capacity))
+        self.next_fid = 1
+        self._slots: List[Optional[Tuple[int, int, str]]] = [None] * self.capacity
+
+    def append(self, raw: str, ts: int) -> int:
+        fid = self.next_fid
+        self.next_fid = fid + 1
+        self._slots[fid % self.capacity] = (fid, ts, raw)
+        return fid
+
+    def grow(self, capacity: int):
+        """Aumenta o anel sem perder nada: os fids vivos são consecutivos e cabem no novo."""
+        if capacity <= self.capacity:
+            return
+        slots: List[Optional[Tuple[int, int, str]]] = [None] * capacity
+        for ent in self._slots:
+            if ent is not None:
+                slots[ent[0] % capacity] = ent
+        self.capacity, self._slots = capacity, slots
+
+    def get(self, fid: int) -> Optional[Tuple[int, str]]:
+        """(ts, raw) ou None se o slot já foi reusado."""
+        ent = self._slots[fid % self.capacity]
+        if ent is None or ent[0] != fid:
+            return None
+        return ent[1], ent[2]
+
+    def oldest_fid(self) -> int:
+        return max(1, self.next_fid - self.capacity)
+
+    def entries(self) -> List[Optional[Tuple[int, int, str]]]:
+        """Slots crus [(fid, ts, raw) | None] (para o relatório de memória)."""
+        return self._slots
+
+
+class GoalWindow:
+    __slots__ = ("id", "c2", "score_before", "score_after", "ts", "frames",
+                 "n_antes", "after_left", "status", "perdidos", "arquivo", "bytes")
+
+    def __init__(self, wid: str, c2: str, score_before: str, score_after: str, ts: int,
+                 antes: List[Tuple[int, int, str]], depois: int, perdidos: int = 0):
+        self.id = wid
+        self.c2 = c2
+        self.score_before = score_before
+        self.score_after = score_after
+        self.ts = ts
+        self.frames = antes  # (fid, ts, raw) fixados: não dependem mais do anel
+        self.n_antes = len(antes)
+        self.after_left = depois
+        self.status = "capturando"
+        self.perdidos = perdidos
+        self.arquivo = None
+        self.bytes = 0
+
+    def add(self, fid: int, ts: int, raw: str):
+        self.frames.append((fid, ts, raw))
+        self.after_left -= 1
+
+    def resumo(self) -> dict:
+        return {
+            "id": self.id,
+            "c2": self.c2,
+            "score_before": self.score_before,
+            "score_after": self.score_after,
+            "ts": self.ts,
+            "frames_antes": self.n_antes,
+            "frames_depois": len(self.frames) - self.n_antes,
+            "perdidos": self.perdidos,
+            "status": self.status,
+            "arquivo": self.arquivo,
+            "bytes": self.bytes,
+        }
+
+
+# partes do id só com [0-9A-Za-z-]: o id vira nome de arquivo e volta pelo
+# /goals/replay?id=, então "/", "\" e ".." nunca passam
+_RE_ARQUIVO = re.compile(r"^goal_(?P<c2>[0-9A-Za-z-]+)_(?P<sb>[0-9A-Za-z-]*)_(?P<sa>[0-9A-Za-z-]*)_(?P<ts>\d+)\.txt$")
+_RE_FORA_DO_ID = re.compile(r"[^0-9A-Za-z-]")
+
+
+def _limpar_placar(s: str) -> str:
+    return _RE_FORA_DO_ID.sub("-", s or "")
+
+
+class GoalCapture:
+    def __init__(self, dump_dir: str, antes: int = 40, depois: int = 40,
+                 ring_frames: int = 4096, keep: int = 500, ring_max: int = 65536):
+        self.dump_dir = dump_dir
+        self.antes = antes
+        self.depois = depois
+        self.ring = FrameRing(ring_frames)
+        self.ring_max = max(self.ring.capacity, ring_max)
+        self.stats = {"frames": 0, "goals": 0, "dumps": 0, "lost_frames": 0, "errors": 0}
+        self._refs: Dict[str, deque] = {}          # c2 -> deque[fid]
+        self._abertas: Dict[str, GoalWindow] = {}  # c2 -> janela capturando
+        self._janelas: Dict[str, GoalWindow] = {}  # id -> janela (memória, mais novas no fim)
+        self._keep = keep
+        self._fila: "queue.Queue[Optional[GoalWindow]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- caminho do frame (escritor único) ----------
+    def frame(self, raw: str, ts: int, touched) -> int:
+        if not raw or not touched:
+            return 0
+        fid = self.ring.append(raw, ts)
+        self.stats["frames"] += 1
+        for c2 in touched:
+            refs = self._refs.get(c2)
+            if refs is None:
+                refs = self._refs[c2] = deque(maxlen=self.antes)
+                self._dimensionar()
+            refs.append(fid)
+            jan = self._abertas.get(c2)
+            if jan is not None:
+                jan.add(fid, ts, raw)
+                if jan.after_left <= 0:
+                    self._fechar(c2)
+        return fid
+
+    def _dimensionar(self):
+        """Anel com lugar para `antes` frames de cada evento com refs (dobra, até ring_max)."""
+        cap = self.ring.capacity
+        if len(self._refs) * self.antes > cap and cap < self.ring_max:
+            self.ring.grow(min(self.ring_max, max(2 * cap, len(self._refs) * self.antes)))
+
+    def goal(self, c2: str, score_before: str, score_after: str, ts: int):
+        """Abre a janela e fixa os frames de antes (os fids estão nos refs do evento)."""
+        if c2 in self._abertas:
+            self._fechar(c2)  # gol em cima de gol: grava o que já tem
+        antes, perdidos = [], 0
+        for fid in self._refs.get(c2, ()):
+            ent = self.ring.get(fid)
+            if ent is None:
+                perdidos += 1
+            else:
+                antes.append((fid, ent[0], ent[1]))
+        wid = f"goal_{_limpar_placar(c2)}_{_limpar_placar(score_before)}_{_limpar_placar(score_after)}_{ts}"
+        jan = GoalWindow(wid, c2, score_before, score_after, ts, antes, self.depois, perdidos)
+        self._abertas[c2] = jan
+        with self._lock:
+            self._janelas[wid] = jan
+            while len(self._janelas) > self._keep:
+                self._janelas.pop(next(iter(self._janelas)))
+        self.stats["goals"] += 1
+
+    def confirm(self, c2: str, score_after: str):
+        """Placar novo de um gol que abriu só pelo UC (janela ainda com o placar de antes)."""
+        jan = self._abertas.get(c2)
+        if jan is None or jan.score_after != jan.score_before:
+            return
+        with self._lock:
+            self._janelas.pop(jan.id, None)
+            jan.score_after = score_after
+            jan.id = f"goal_{_limpar_placar(c2)}_{_limpar_placar(jan.score_before)}_{_limpar_placar(score_after)}_{jan.ts}"
+            self._janelas[jan.id] = jan
+
+    def prune(self) -> int:
+        """Esquece eventos cujo último frame já saiu do anel (chamar do thread do frame)."""
+        corte = self.ring.oldest_fid()
+        velhos = [c2 for c2, refs in self._refs.items()
+                  if (not refs or refs[-1] < corte) and c2 not in self._abertas]
+        for c2 in velhos:
+            self._refs.pop(c2, None)
+        return len(velhos)
+
+    def _fechar(self, c2: str):
+        jan = self._abertas.pop(c2, None)
+        if jan is None:
+            return
+        jan.status = "pendente"
+        self._fila.put(jan)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="goal-dump", daemon=True)
+            self._thread.start()
+
+    # ---------- gravação (thread) ----------
+    def _loop(self):
+        while True:
+            jan = self._fila.get()
+            if jan is None:
+                return
+            self._gravar(jan)
+
+    def _gravar(self, jan: GoalWindow):
+        partes = [
+            "== GOAL DETECTED ==",
+            f"===== c2={jan.c2} score={jan.score_before} -> {jan.score_after} ts={jan.ts} "
+            f"antes={jan.n_antes} depois={len(jan.frames) - jan.n_antes}",
+        ]
+        for k, (fid, ts, raw) in enumerate(jan.frames):
+            partes.append(f"--- ts={ts} fid={fid} {'antes' if k < jan.n_antes else 'depois'}")
+            partes.append(raw)
+        dados = "\n".join(partes) + "\n"
+        try:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            path = os.path.join(self.dump_dir, jan.id + ".txt")
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(dados)
+            os.replace(tmp, path)
+            jan.arquivo = path
+            jan.bytes = len(dados)
+            jan.status = "gravado"
+            self.stats["dumps"] += 1
+        except OSError:
+            jan.status = "erro"
+            self.stats["errors"] += 1
+        self.stats["lost_frames"] += jan.perdidos
+
+    def stop(self, timeout: float = 5.0):
+        """Fecha as janelas abertas e espera a fila de dumps esvaziar."""
+        for c2 in list(self._abertas):
+            self._fechar(c2)
+        if self._thread is not None:
+            self._fila.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def pending(self) -> int:
+        return len(self._abertas) + self._fila.qsize()
+
+    # ---------- leitura ----------
+    def list(self) -> List[dict]:
+        """Janelas em memória + dumps já no disco (de antes do restart ou de outros shards)."""
+        with self._lock:
+            out = {wid: jan.resumo() for wid, jan in self._janelas.items()}
+        try:
+            nomes = os.listdir(self.dump_dir)
+        except OSError:
+            nomes = []
+        for nome in nomes:
+            m = _RE_ARQUIVO.match(nome)
+            if not m or nome[:-4] in out:
+                continue
+            path = os.path.join(self.dump_dir, nome)
+            try:
+                tamanho = os.path.getsize(path)
+            except OSError:
+                continue
+            out[nome[:-4]] = {
+                "id": nome[:-4],
+                "c2": m.group("c2"),
+                "score_before": m.group("sb"),
+                "score_after": m.group("sa"),
+                "ts": int(m.group("ts")),
+                "status": "gravado",
+                "arquivo": path,
+                "bytes": tamanho,
+            }
+        return sorted(out.values(), key=lambda d: (d["ts"], d["id"]), reverse=True)
+
+    def path(self, wid: str) -> Optional[str]:
+        if not _RE_ARQUIVO.match(wid + ".txt") or os.path.basename(wid) != wid:
+            return None
+        path = os.path.join(self.dump_dir, wid + ".txt")
+        return path if os.path.isfile(path) else None
+
+    def status(self, wid: str) -> Optional[str]:
+        with self._lock:
+            jan = self._janelas.get(wid)
+        if jan is not None:
+            return jan.status
+        return "gravado" if self.path(wid) else None
+
+
+def read_dump(path: str) -> Iterator[Tuple[int, Optional[int], str]]:
+    """(ts, fid, raw) de um dump no formato indexado, em ordem."""
+    ts = fid = None
+    cur: List[str] = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("--- ts="):
+                if cur and ts is not None:
+                    yield ts, fid, "\n".join(cur)
+                cur = []
+                campos = dict(p.split("=", 1) for p in line[4:].split() if "=" in p)
+                ts = int(campos.get("ts") or 0)
+                fid = int(campos["fid"]) if campos.get("fid", "").isdigit() else None
+                continue
+            if line.startswith("== GOAL DETECTED ==") or line.startswith("===== "):
+                continue
+            cur.append(line)
+    if cur and ts is not None:
+        yield ts, fid, "\n".join(cur)
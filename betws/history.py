@@ -0,0 +1,221 @@
+# betws/history.py
+from __future__ import annotations
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# ============================================================
+# Histórico em disco (SQLite) de odds por seleção e de placar
+#
+# - o parser chama tick()/score() no caminho do frame: só compara com o
+#   último valor visto e guarda uma tupla na fila pendente (deque: append e
+#   popleft são seguros entre threads sem lock)
+# - um thread grava a fila em lote (executemany numa transação) a cada
+#   `flush_s` segundos; WAL + synchronous=NORMAL
+# - UNIQUE(c2, sid, ts, od, su) / UNIQUE(c2, ts, score) + INSERT OR IGNORE:
+#   reaplicar frames (journal, shards recebendo o mesmo placar) não duplica
+# - leitura por (c2, sid, ts) e (c2, market, ts) sai do índice; o OHLC por
+#   intervalo é agregado no próprio SQLite, o cliente não puxa tick cru
+# ============================================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS odds (
+    c2 TEXT NOT NULL,
+    market TEXT NOT NULL,
+    sid TEXT NOT NULL,
+    selection TEXT,
+    ts INTEGER NOT NULL,
+    od REAL,
+    su INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (c2, sid, ts, od, su)
+);
+CREATE INDEX IF NOT EXISTS odds_c2_market_ts ON odds (c2, market, ts);
+CREATE TABLE IF NOT EXISTS scores (
+    c2 TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    score TEXT NOT NULL,
+    prev TEXT,
+    UNIQUE (c2, ts, score)
+);
+"""
+
+
+def _rotulo_selecao(sel: dict) -> str:
+    partes = [sel.get("nome"), sel.get("n2"), sel.get("linha_ha") or sel.get("linha_hd")]
+    return " ".join(str(p) for p in partes if p not in (None, ""))
+
+
+class HistoryStore:
+    def __init__(self, path: str, flush_s: float = 1.0, max_pending: int = 200000):
+        self.path = path
+        self.flush_s = flush_s
+        self.max_pending = max_pending
+        self.stats = {"ticks": 0, "scores": 0, "flushes": 0, "dropped": 0}
+        self._ultimo: Dict[Tuple[str, str], Tuple[Optional[float], bool, int]] = {}  # (c2, sid) -> (od, su, ts)
+        self._ticks: deque = deque()
+        self._scores: deque = deque()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._local = threading.local()
+        with self._conexao() as cx:
+            cx.executescript(_SCHEMA)
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não compartilha conexão entre threads)."""
+        cx = getattr(self._local, "cx", None)
+        if cx is None:
+            cx = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            cx.execute("PRAGMA journal_mode=WAL")
+            cx.execute("PRAGMA synchronous=NORMAL")
+            self._local.cx = cx
+        return cx
+
+    # ---------- escrita (caminho do frame) ----------
+    def tick(self, c2: str, mk: dict, sel: dict, ts: int):
+        sid = sel.get("selection_id") or sel.get("selection_it")
+        if not c2 or not sid:
+            return
+        od = sel.get("od_dec")
+        su = bool(sel.get("suspenso"))
+        chave = (c2, sid)
+        ant = self._ultimo.get(chave)
+        if ant is not None and ant[0] == od and ant[1] == su:
+            return
+        self._ultimo[chave] = (od, su, ts)
+        if len(self._ticks) >= self.max_pending:
+            self.stats["dropped"] += 1
+            return
+        self._ticks.append((c2, mk.get("nome_mercado") or "", sid, _rotulo_selecao(sel), ts, od, int(su)))
+
+    def score(self, c2: str, score: str, prev: str, ts: int):
+        if c2 and score:
+            self._scores.append((c2, ts, score, prev or None))
+
+    def forget_idle(self, now: int, max_idle: int) -> int:
+        """Esquece o último valor de seleções paradas (chamar do mesmo thread que faz tick)."""
+        velhas = [k for k, v in self._ultimo.items() if now - v[2] > max_idle]
+        for k in velhas:
+            self._ultimo.pop(k, None)
+        return len(velhas)
+
+    # ---------- gravação em lote ----------
+    def flush(self) -> int:
+        with self._lock:
+            ticks = [self._ticks.popleft() for _ in range(len(self._ticks))]
+            scores = [self._scores.popleft() for _ in range(len(self._scores))]
+            if not ticks and not scores:
+                return 0
+            cx = self._conexao()
+            cx.execute("BEGIN")
+            try:
+                if ticks:
+                    cx.executemany("INSERT OR IGNORE INTO odds VALUES (?, ?, ?, ?, ?, ?, ?)", ticks)
+                if scores:
+                    cx.executemany("INSERT OR IGNORE INTO scores VALUES (?, ?, ?, ?)", scores)
+                cx.execute("COMMIT")
+            except Exception:
+                cx.execute("ROLLBACK")
+                raise
+        self.stats["ticks"] += len(ticks)
+        self.stats["scores"] += len(scores)
+        self.stats["flushes"] += 1
+        return len(ticks) + len(scores)
+
+    def prune(self, antes_de: int) -> int:
+        with self._lock:
+            cx = self._conexao()
+            n = cx.execute("DELETE FROM odds WHERE ts < ?", (antes_de,)).rowcount
+            n += cx.execute("DELETE FROM scores WHERE ts < ?", (antes_de,)).rowcount
+        return n
+
+    def _loop(self, reter_s: float):
+        ultima_poda = 0.0
+        while not self._parar.wait(self.flush_s):
+            try:
+                self.flush()
+                agora = time.time()
+                if reter_s > 0 and agora - ultima_poda > 3600:
+                    ultima_poda = agora
+                    self.prune(int(agora - reter_s))
+            except sqlite3.Error:
+                pass
+
+    def start(self, reter_s: float = 0) -> "HistoryStore":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, args=(reter_s,), name="history-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+
+    # ---------- leitura ----------
+    @staticmethod
+    def _filtros(c2, market, selection, t0, t1) -> Tuple[str, list]:
+        sql = "c2 = ?"
+        args: list = [c2]
+        if market:
+            sql += " AND market = ?"
+            args.append(market)
+        if selection:
+            sql += " AND (sid = ? OR selection = ?)"
+            args += [selection, selection]
+        if t0 is not None:
+            sql += " AND ts >= ?"
+            args.append(t0)
+        if t1 is not None:
+            sql += " AND ts <= ?"
+            args.append(t1)
+        return sql, args
+
+    def ticks(self, c2: str, market: str = None, selection: str = None,
+              t0: int = None, t1: int = None, limit: int = 5000) -> List[tuple]:
+        """[(sid, selection, market, ts, od, su)] ordenado por seleção e ts."""
+        where, args = self._filtros(c2, market, selection, t0, t1)
+        sql = f"SELECT sid, selection, market, ts, od, su FROM odds WHERE {where} ORDER BY sid, ts LIMIT ?"
+        return self._conexao().execute(sql, args + [limit]).fetchall()
+
+    def ohlc(self, c2: str, intervalo: int, market: str = None, selection: str = None,
+             t0: int = None, t1: int = None) -> Dict[str, dict]:
+        """
+        Candles por seleção, agregados no SQLite (só os candles saem do banco):
+        sid -> {"selection", "market", "candles": [[t, open, high, low, close, n, suspenso], ...]}
+        Tick sem odd (od vazio) não entra no candle.
+        """
+        where, args = self._filtros(c2, market, selection, t0, t1)
+        sql = f"""
+            SELECT sid, selection, market, t, o, max(od), min(od), c, count(*), max(su) FROM (
+                SELECT sid, selection, market, od, su, ts / ? * ? AS t,
+                       first_value(od) OVER w AS o, last_value(od) OVER w AS c
+                FROM odds WHERE {where} AND od IS NOT NULL
+                WINDOW w AS (PARTITION BY sid, ts / ? ORDER BY ts
+                             ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+            ) GROUP BY sid, t ORDER BY sid, t
+        """
+        out: Dict[str, dict] = {}
+        for sid, sel, mk, t, o, h, lo, c, n, su in self._conexao().execute(sql, [intervalo, intervalo] + args + [intervalo]):
+            ent = out.get(sid)
+            if ent is None:
+                ent = out[sid] = {"selection": sel, "market": mk, "candles": []}
+            ent["candles"].append([t, o, h, lo, c, n, bool(su)])
+        return out
+
+    def scores(self, c2: str, t0: int = None, t1: int = None) -> List[tuple]:
+        sql = "SELECT ts, score, prev FROM scores WHERE c2 = ?"
+        args: list = [c2]
+        if t0 is not None:
+            sql += " AND ts >= ?"
+            args.append(t0)
+        if t1 is not None:
+            sql += " AND ts <= ?"
+            args.append(t1)
+        return self._conexao().execute(sql + " ORDER BY ts", args).fetchall()
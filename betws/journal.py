@@ -0,0 +1,250 @@
+# betws/journal.py
+from __future__ import annotations
+import os
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+# ============================================================
+# Journal (WAL) append-only em segmentos
+#
+# registro: tamanho(I) | crc32(I) | lsn(Q) | ts(I) | payload
+#   crc cobre o payload; lsn cresce de 1 em 1 (a leitura também para se a
+#   sequência pular dentro do segmento)
+# segmento: <pasta>/<primeiro_lsn:016d>.wal
+#
+# - append() só numera e guarda (lsn, ts, payload) no buffer (chamado pelo
+#   escritor único, dentro do lock do estado): encode/crc/I/O ficam com o
+#   thread de commit, fora do caminho do frame
+# - group commit: um thread grava o buffer e faz fsync a cada `commit_ms`
+#   (rajada que passa de `commit_bytes` grava na hora, no próprio append);
+#   a perda máxima num crash é a janela de um commit
+# - rotate() fecha o segmento e abre outro começando no próximo lsn;
+#   drop_before(lsn) apaga segmentos que só têm registros < lsn
+#   (usado depois que um snapshot cobre esses registros)
+# - leitura para no primeiro registro truncado/corrompido (cauda rasgada
+#   de um crash no meio da escrita) e open() corta essa cauda
+# - replay() também para no primeiro buraco de lsn entre segmentos (registro
+#   corrompido no meio de um segmento antigo): nada depois do buraco é aplicado
+# ============================================================
+
+_REC = struct.Struct("<IIQI")
+SUFIXO = ".wal"
+
+
+def _nome_segmento(lsn: int) -> str:
+    return f"{lsn:016d}{SUFIXO}"
+
+
+def list_segments(pasta: str) -> List[Tuple[int, str]]:
+    """[(primeiro_lsn, caminho)] em ordem."""
+    try:
+        nomes = os.listdir(pasta)
+    except FileNotFoundError:
+        return []
+    out = []
+    for n in nomes:
+        if n.endswith(SUFIXO) and n[:-len(SUFIXO)].isdigit():
+            out.append((int(n[:-len(SUFIXO)]), os.path.join(pasta, n)))
+    out.sort()
+    return out
+
+
+def read_segment(path: str) -> Tuple[List[Tuple[int, int, bytes]], int]:
+    """(registros [(lsn, ts, payload)], bytes_válidos). Para na cauda rasgada."""
+    with open(path, "rb") as f:
+        buf = f.read()
+    out = []
+    off = 0
+    n = len(buf)
+    anterior = None
+    while off + _REC.size <= n:
+        tamanho, crc, lsn, ts = _REC.unpack_from(buf, off)
+        ini = off + _REC.size
+        fim = ini + tamanho
+        if fim > n or (anterior is not None and lsn != anterior + 1):
+            break
+        payload = buf[ini:fim]
+        if zlib.crc32(payload) != crc:
+            break
+        out.append((lsn, ts, payload))
+        anterior = lsn
+        off = fim
+    return out, off
+
+
+def _empacotar(itens) -> bytes:
+    partes = []
+    for lsn, ts, payload in itens:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        partes.append(_REC.pack(len(payload), zlib.crc32(payload), lsn, ts & 0xFFFFFFFF))
+        partes.append(payload)
+    return b"".join(partes)
+
+
+class Journal:
+    def __init__(self, pasta: str, commit_ms: float = 10.0, commit_bytes: int = 1 << 20,
+                 segment_bytes: int = 64 << 20, fsync: bool = True):
+        self.pasta = pasta
+        self.commit_s = commit_ms / 1000.0
+        self.commit_bytes = commit_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.lsn = 0             # último lsn entregue por append()
+        self.lsn_duravel = 0     # último lsn com fsync feito
+        self.stats = {"records": 0, "bytes": 0, "commits": 0, "segments": 0}
+        self._buf: List[tuple] = []  # (lsn, ts, payload str|bytes)
+        self._buf_bytes = 0
+        self._lock = threading.Lock()      # buffer
+        self._io_lock = threading.Lock()   # arquivo
+        self._tem_dados = threading.Event()
+        self._parar = threading.Event()
+        self._f = None
+        self._seg_bytes = 0
+        self._thread = None
+
+    # ---------- abertura ----------
+    def open(self) -> "Journal":
+        os.makedirs(self.pasta, exist_ok=True)
+        segs = list_segments(self.pasta)
+        if segs:
+            _, ultimo = segs[-1]
+            regs, validos = read_segment(ultimo)
+            if os.path.getsize(ultimo) != validos:
+                with open(ultimo, "r+b") as f:  # corta a cauda rasgada
+                    f.truncate(validos)
+            if regs:
+                self.lsn = regs[-1][0]
+            else:
+                self.lsn = segs[-1][0] - 1
+        self.lsn_duravel = self.lsn
+        self._abrir_segmento()
+        self._thread = threading.Thread(target=self._loop, name="journal-commit", daemon=True)
+        self._thread.start()
+        return self
+
+    def _abrir_segmento(self):
+        # nome = próximo lsn a ir para o disco (appends já no buffer vão para este segmento)
+        path = os.path.join(self.pasta, _nome_segmento(self.lsn_duravel + 1))
+        self._f = open(path, "ab")
+        self._seg_bytes = self._f.tell()
+        self.stats["segments"] += 1
+
+    # ---------- escrita ----------
+    def append(self, payload, ts: int) -> int:
+        """payload: bytes ou str (str vira UTF-8 no commit)."""
+        with self._lock:
+            self.lsn += 1
+            lsn = self.lsn
+            primeiro = not self._buf
+            self._buf.append((lsn, ts, payload))
+            self._buf_bytes += len(payload)
+            cheio = self._buf_bytes >= self.commit_bytes
+        self.stats["records"] += 1
+        if cheio:
+            self.commit()  # rajada maior que a janela: grava aqui mesmo (backpressure)
+        elif primeiro:
+            self._tem_dados.set()  # só o 1º da janela acorda o commit
+        return lsn
+
+    def commit(self):
+        """Grava o buffer e faz fsync (group commit)."""
+        with self._io_lock:
+            with self._lock:
+                itens, self._buf = self._buf, []
+                self._buf_bytes = 0
+            if not itens:
+                return
+            dados = _empacotar(itens)
+            n = len(dados)
+            lsn = itens[-1][0]
+            self._f.write(dados)
+            self._f.flush()
+            if self.fsync:
+                os.fsync(self._f.fileno())
+            self._seg_bytes += n
+            self.stats["bytes"] += n
+            self.stats["commits"] += 1
+            self.lsn_duravel = lsn
+            if self._seg_bytes >= self.segment_bytes:
+                self._rotate_locked()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self._tem_dados.wait()
+            self._tem_dados.clear()
+            # junta o que chegar na janela do commit num write+fsync só
+            self._parar.wait(self.commit_s)
+            try:
+                self.commit()
+            except OSError:
+                pass
+
+    # ---------- segmentos ----------
+    def _rotate_locked(self):
+        self._f.close()
+        self._abrir_segmento()
+
+    def rotate(self) -> int:
+        """Grava o pendente e começa segmento novo. Retorna o primeiro lsn dele."""
+        self.commit()
+        with self._io_lock:
+            if self._seg_bytes:
+                self._rotate_locked()
+        return self.lsn + 1
+
+    def drop_before(self, lsn: int) -> int:
+        """Apaga segmentos cujo último registro é < lsn (nunca o segmento aberto)."""
+        segs = list_segments(self.pasta)
+        apagados = 0
+        for (ini, path), prox in zip(segs, segs[1:]):
+            if prox[0] <= lsn:
+                try:
+                    os.remove(path)
+                    apagados += 1
+                except OSError:
+                    pass
+        return apagados
+
+    def close(self):
+        self._parar.set()
+        self._tem_dados.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.commit()
+        with self._io_lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+    # ---------- leitura ----------
+    def replay(self, depois_de: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+        """(lsn, ts, payload) com lsn > depois_de, em ordem."""
+        return replay(self.pasta, depois_de)
+
+
+def replay(pasta: str, depois_de: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+    segs = list_segments(pasta)
+    anterior = None  # último lsn lido (aplicado ou já coberto)
+    for k, (ini, path) in enumerate(segs):
+        if k + 1 < len(segs) and segs[k + 1][0] <= depois_de + 1:
+            continue  # segmento inteiro já coberto
+        regs, _ = read_segment(path)
+        if regs and anterior is not None and regs[0][0] != anterior + 1:
+            print(f"[journal] buraco no journal (lsn {anterior} -> {regs[0][0]} em {os.path.basename(path)}): replay para aqui")
+            return
+        for lsn, ts, payload in regs:
+            if lsn > depois_de:
+                yield lsn, ts, payload
+        if regs:
+            anterior = regs[-1][0]
+
+
+def first_lsn(pasta: str) -> Optional[int]:
+    for _, path in list_segments(pasta):
+        regs, _ = read_segment(path)
+        if regs:
+            return regs[0][0]
+    return None
@@ -0,0 +1,65 @@
+# betws/markets.py
+from __future__ import annotations
+import re
+from collections import defaultdict
+
+# ============================================================
+# Mercados de um jogo com chave por nome (formato do /markets?c2=)
+#
+# Fica fora do local_api.py porque o read_server.py monta a mesma visão
+# a partir do /markets publicado na memória compartilhada, sem importar
+# a ingestão.
+# - nome normalizado (espaços colapsados); vazio = "Mercado Desconhecido"
+# - nome repetido ganha " [market_id]", " [market_it]" ou " (#n)"
+# ============================================================
+
+_RE_ESPACOS = re.compile(r"\s+")
+
+
+def _clean_str(x):
+    if x is None:
+        return None
+    s = str(x).strip()
+    return s if s != "" else None
+
+
+def normalize_name(nome) -> str:
+    nome = _clean_str(nome) or "Mercado Desconhecido"
+    return _RE_ESPACOS.sub(" ", nome.strip())
+
+
+def keyed_by_name(mercados: dict) -> dict:
+    if not isinstance(mercados, dict):
+        return {}
+
+    out = {}
+    contagem = defaultdict(int)
+
+    for _k, mk in mercados.items():
+        if not isinstance(mk, dict):
+            continue
+
+        nome = normalize_name(mk.get("nome_mercado"))
+        market_id = _clean_str(mk.get("market_id"))
+        market_it = _clean_str(mk.get("market_it"))
+
+        key_nome = nome
+
+        if key_nome in out:
+            if market_id:
+                key_nome = f"{nome} [{market_id}]"
+            elif market_it:
+                key_nome = f"{nome} [{market_it}]"
+            else:
+                contagem[nome] += 1
+                key_nome = f"{nome} (#{contagem[nome] + 1})"
+
+        i = 2
+        base = key_nome
+        while key_nome in out:
+            key_nome = f"{base} (#{i})"
+            i += 1
+
+        out[key_nome] = mk
+
+    return out
@@ -0,0 +1,263 @@
+# betws/metrics.py
+from __future__ import annotations
+import threading
+from time import perf_counter_ns
+from typing import Dict, List, Optional, Tuple
+
+# ============================================================
+# Histograma estilo HDR (log-linear)
+# - cada potência de 2 é dividida em 2**SUB_BITS sub-buckets
+# - erro relativo máximo ~ 1/2**SUB_BITS (12,5% com 3 bits)
+# - registrar() é O(1): bit_length + shift, sem busca binária
+# ============================================================
+SUB_BITS = 3
+SUB = 1 << SUB_BITS
+MAX_BITS = 48  # ~ 78 horas em ns; acima disso satura no último bucket
+N_BUCKETS = (MAX_BITS - SUB_BITS) * SUB + SUB
+
+# fronteiras exportadas no /metrics (fixas entre scrapes): 2x a partir de 256ns
+_LE_EXPORT_NS = [1 << b for b in range(8, 37)]  # 256ns .. ~68s
+QUANTIS_EXPORT = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(v: int) -> int:
+    if v < SUB:
+        return v if v > 0 else 0
+    shift = v.bit_length() - SUB_BITS - 1
+    idx = ((shift + 1) << SUB_BITS) + ((v >> shift) - SUB)
+    return idx if idx < N_BUCKETS else N_BUCKETS - 1
+
+
+def bucket_upper(idx: int) -> int:
+    """Maior valor (ns) que cai no bucket idx."""
+    if idx < SUB:
+        return idx
+    shift = (idx >> SUB_BITS) - 1
+    top = SUB + (idx & (SUB - 1))
+    return ((top + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    Contagens por bucket + soma/contagem.
+    Sem lock no caminho quente: sob o GIL um incremento perdido em corrida
+    é aceitável para métrica (o mesmo vale para os Counters).
+    """
+
+    __slots__ = ("counts", "total", "soma_ns", "max_ns")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * N_BUCKETS
+        self.total = 0
+        self.soma_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns: int):
+        self.counts[bucket_index(ns)] += 1
+        self.total += 1
+        self.soma_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def quantile(self, q: float) -> int:
+        if self.total <= 0:
+            return 0
+        alvo = q * self.total
+        acc = 0
+        for idx, c in enumerate(self.counts):
+            if not c:
+                continue
+            acc += c
+            if acc >= alvo:
+                return min(bucket_upper(idx), self.max_ns)
+        return self.max_ns
+
+    def cumulative_at(self, le_ns: List[int]) -> List[int]:
+        """Contagem acumulada para cada fronteira (valores <= le)."""
+        out = []
+        acc = 0
+        idx = 0
+        for le in le_ns:
+            while idx < N_BUCKETS and bucket_upper(idx) <= le:
+                acc += self.counts[idx]
+                idx += 1
+            out.append(acc)
+        return out
+
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    itens = list(labels)
+    if extra:
+        itens.append(extra)
+    if not itens:
+        return ""
+    corpo = ",".join(f'{k}="{_escape(v)}"' for k, v in itens)
+    return "{" + corpo + "}"
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_num(x) -> str:
+    if isinstance(x, float):
+        return repr(x)
+    return str(x)
+
+
+class StageTimer:
+    """
+    Timer de um estágio. Cada estágio tem seu próprio contador de amostragem,
+    então estágios chamados em sequência no mesmo frame não se "alinham"
+    (com um contador global, só o último estágio do frame seria amostrado).
+
+    Uso no caminho quente (t0 == 0 significa "não amostrado"):
+
+        t0 = ST_PARSE_ODDS.start()
+        ...
+        ST_PARSE_ODDS.stop(t0)
+    """
+
+    __slots__ = ("name", "hist", "enabled", "every", "tick")
+
+    def __init__(self, name: str, enabled: bool, every: int):
+        self.name = name
+        self.hist = Histogram()
+        self.enabled = enabled
+        self.every = every
+        self.tick = 0
+
+    def start(self) -> int:
+        if not self.enabled:
+            return 0
+        if self.every > 1:
+            self.tick += 1
+            if self.tick % self.every:
+                return 0
+        return perf_counter_ns()
+
+    def stop(self, t0: int):
+        if not t0:
+            return
+        dt = perf_counter_ns() - t0
+        # Histogram.record() inline: evita uma chamada extra no caminho quente
+        if dt < SUB:
+            idx = dt if dt > 0 else 0
+        else:
+            shift = dt.bit_length() - SUB_BITS - 1
+            idx = ((shift + 1) << SUB_BITS) + ((dt >> shift) - SUB)
+            if idx >= N_BUCKETS:
+                idx = N_BUCKETS - 1
+        h = self.hist
+        h.counts[idx] += 1
+        h.total += 1
+        h.soma_ns += dt
+        if dt > h.max_ns:
+            h.max_ns = dt
+
+
+class Metrics:
+    """
+    Registro de métricas do processo.
+    - stage(nome): timer por estágio (histograma HDR), amostrado 1 a cada N
+    - inc(nome, n, **labels): contadores, sempre exatos
+    - gauge(nome, fn): valor calculado na hora do scrape
+    """
+
+    def __init__(self, enabled: bool = True, sample_every: int = 1, prefix: str = "bet"):
+        self.enabled = enabled
+        self.sample_every = max(1, int(sample_every))
+        self.prefix = prefix
+        self._stages: Dict[str, StageTimer] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        self._help: Dict[str, str] = {}
+        self._gauges: Dict[str, object] = {}
+        self._lock = threading.Lock()  # só para criar séries novas
+
+    # ---------- timers ----------
+    def stage(self, name: str) -> StageTimer:
+        st = self._stages.get(name)
+        if st is None:
+            with self._lock:
+                st = self._stages.setdefault(name, StageTimer(name, self.enabled, self.sample_every))
+        return st
+
+    # ---------- counters ----------
+    def inc(self, name: str, n: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        try:
+            self._counters[key] += n
+        except KeyError:
+            with self._lock:
+                self._counters[key] = self._counters.get(key, 0) + n
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def gauge(self, name: str, fn, help_text: str = ""):
+        """Gauge calculado na hora do scrape (fn() -> número)."""
+        self._gauges[name] = fn
+        if help_text:
+            self._help[name] = help_text
+
+    def counter_value(self, name: str, **labels) -> int:
+        return self._counters.get((name, tuple(sorted(labels.items())) if labels else ()), 0)
+
+    def stage_names(self) -> List[str]:
+        return sorted(self._stages.keys())
+
+    def histogram(self, stage: str) -> Optional[Histogram]:
+        st = self._stages.get(stage)
+        return st.hist if st else None
+
+    # ---------- export ----------
+    def render_prometheus(self) -> str:
+        p = self.prefix
+        linhas: List[str] = []
+
+        # counters agrupados por nome
+        por_nome: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], int]]] = {}
+        for (name, labels), v in list(self._counters.items()):
+            por_nome.setdefault(name, []).append((labels, v))
+        for name in sorted(por_nome):
+            full = f"{p}_{name}"
+            if name in self._help:
+                linhas.append(f"# HELP {full} {self._help[name]}")
+            linhas.append(f"# TYPE {full} counter")
+            for labels, v in sorted(por_nome[name]):
+                linhas.append(f"{full}{_fmt_labels(labels)} {v}")
+
+        for name in sorted(self._gauges):
+            full = f"{p}_{name}"
+            try:
+                v = self._gauges[name]()
+            except Exception:
+                continue
+            if name in self._help:
+                linhas.append(f"# HELP {full} {self._help[name]}")
+            linhas.append(f"# TYPE {full} gauge")
+            linhas.append(f"{full} {_fmt_num(v)}")
+
+        hists = {nome: st.hist for nome, st in list(self._stages.items()) if st.hist.total}
+        if hists:
+            full = f"{p}_stage_seconds"
+            linhas.append(f"# HELP {full} Latência por estágio (amostrada 1/{self.sample_every}).")
+            linhas.append(f"# TYPE {full} histogram")
+            for stage in sorted(hists):
+                h = hists[stage]
+                lb = (("stage", stage),)
+                for le, acc in zip(_LE_EXPORT_NS, h.cumulative_at(_LE_EXPORT_NS)):
+                    linhas.append(f"{full}_bucket{_fmt_labels(lb, ('le', repr(le / 1e9)))} {acc}")
+                linhas.append(f"{full}_bucket{_fmt_labels(lb, ('le', '+Inf'))} {h.total}")
+                linhas.append(f"{full}_sum{_fmt_labels(lb)} {h.soma_ns / 1e9!r}")
+                linhas.append(f"{full}_count{_fmt_labels(lb)} {h.total}")
+
+            # quantis com a precisão fina do HDR (as fronteiras exportadas são 2x)
+            fq = f"{p}_stage_quantile_seconds"
+            linhas.append(f"# TYPE {fq} gauge")
+            for stage in sorted(hists):
+                h = hists[stage]
+                for q in QUANTIS_EXPORT:
+                    linhas.append(f"{fq}{_fmt_labels((('stage', stage),), ('quantile', repr(q)))} {h.quantile(q) / 1e9!r}")
+
+        return "\n".join(linhas) + "\n"
@@ -0,0 +1,98 @@
+# betws/oddsmoves.py
+from __future__ import annotations
+from typing import Callable, Dict, Optional, Tuple
+
+# ============================================================
+# Detector de movimento de odds (eventos tipados no caminho do parser)
+#
+# - o parser chama before(sel) antes de aplicar o patch na seleção e
+#   check(...) depois: compara só aquela seleção, O(1) por delta
+# - tipos: "odds_move" (odd andou pelo menos `min_abs` ou `min_pct`% desde
+#   a última odd publicada), "line_change" (linha HA/HD mudou) e
+#   "suspension" (suspenso ligou/desligou)
+# - a referência do odds_move é a última odd publicada, não a anterior:
+#   várias mudanças pequenas na mesma direção somam e disparam uma vez
+# - linha nova zera a referência (odd de outra linha não é comparável)
+# - min_abs = min_pct = 0: qualquer mudança de odd vira evento
+# - emit(tipo, payload) é de quem usa (no local_api: broker do /stream);
+#   wants(c2) = False pula a montagem do payload (ninguém assinando), mas
+#   a referência e o stats andam igual
+# - um detector por feed: c2/sid são os mesmos entre idiomas, então cada
+#   feed tem a sua referência e o payload diz de qual feed veio
+# ============================================================
+
+Antes = Tuple[Optional[float], object, object, bool]
+
+
+class MoveDetector:
+    def __init__(self, emit: Callable[[str, dict], None], min_abs: float = 0.0, min_pct: float = 0.0,
+                 wants: Optional[Callable[[str], bool]] = None, feed: Optional[str] = None):
+        self.emit = emit
+        self.feed = feed
+        self.wants = wants
+        self.min_abs = max(0.0, float(min_abs))
+        self.min_pct = max(0.0, float(min_pct))
+        self._ref: Dict[Tuple[str, str], Tuple[Optional[float], int]] = {}  # (c2, sid) -> (odd publicada, último ts)
+        self.stats = {"odds_move": 0, "line_change": 0, "suspension": 0}
+
+    @staticmethod
+    def before(sel: dict) -> Antes:
+        return sel.get("od_dec"), sel.get("linha_ha"), sel.get("linha_hd"), bool(sel.get("suspenso"))
+
+    def _passou(self, ref: float, od: float) -> bool:
+        d = abs(od - ref)
+        if not self.min_abs and not self.min_pct:
+            return d > 0
+        return (self.min_abs > 0 and d >= self.min_abs) or (self.min_pct > 0 and ref > 0 and d * 100.0 / ref >= self.min_pct)
+
+    def check(self, c2: str, mk: dict, sel: dict, antes: Optional[Antes], ts: int) -> int:
+        """Compara a seleção com o estado de antes do patch; devolve quantos eventos saíram."""
+        sid = sel.get("selection_id") or sel.get("selection_it")
+        if not c2 or not sid:
+            return 0
+        k = (c2, sid)
+        od = sel.get("od_dec")
+        if antes is None:
+            self._ref[k] = (od, ts)
+            return 0
+
+        od0, ha0, hd0, su0 = antes
+        ha, hd, su = sel.get("linha_ha"), sel.get("linha_hd"), bool(sel.get("suspenso"))
+        tipos = []
+
+        if ha != ha0 or hd != hd0:
+            tipos.append(("line_change", {"from": {"ha": ha0, "hd": hd0}, "to": {"ha": ha, "hd": hd}}))
+            self._ref[k] = (od, ts)
+        elif od is not None:
+            ref = self._ref.get(k)
+            ref_od = ref[0] if ref is not None else od0
+            if ref_od is not None and od != ref_od and self._passou(ref_od, od):
+                tipos.append(("odds_move", {"from": ref_od, "to": od, "change": round(od - ref_od, 4),
+                                            "pct": round((od - ref_od) * 100.0 / ref_od, 2) if ref_od else None}))
+                ref_od = od
+            self._ref[k] = (od if ref_od is None else ref_od, ts)
+
+        if su != su0:
+            tipos.append(("suspension", {"suspended": su}))
+        if not tipos:
+            return 0
+
+        quer = self.wants is None or self.wants(c2)
+        for tipo, extra in tipos:
+            self.stats[tipo] += 1
+            if quer:
+                ev = self._base(c2, mk, sel, sid, ts)
+                ev.update(extra)
+                self.emit(tipo, ev)
+        return len(tipos)
+
+    def _base(self, c2: str, mk: dict, sel: dict, sid: str, ts: int) -> dict:
+        return {"feed": self.feed, "c2": c2, "market": mk.get("nome_mercado"), "sid": sid,
+                "selection": sel.get("nome"), "od": sel.get("od_dec"), "ts": ts}
+
+    def forget_idle(self, now: int, max_idle: int):
+        for k in [k for k, (_od, ts) in self._ref.items() if now - ts > max_idle]:
+            del self._ref[k]
+
+    def __len__(self) -> int:
+        return len(self._ref)
@@ -0,0 +1,247 @@
+# betws/overround.py
+from __future__ import annotations
+import heapq
+from typing import Callable, Dict, List, Optional, Tuple
+
+# ============================================================
+# Overround por mercado, incremental, com as anomalias num heap top-K
+#
+#   overround = soma(1 / odd) das seleções de um grupo
+#
+# - grupo = o mercado inteiro (1X2, ambas marcam, ...) ou, nos mercados de
+#   linha (`by_line(nome)`: Over/Under de gols), cada linha separada;
+#   mercado com linha que não é de total (handicap) fica de fora
+# - grupo com seleção suspensa ou sem odd não tem overround (e fecha a
+#   anomalia que estiver aberta)
+# - mercado = chave dele no store (mk["_chave"]): dois mercados do jogo com
+#   o mesmo nome ("Nome" e "Nome [id]") são grupos separados; o nome só vai
+#   no registro de saída
+# - o parser só marca (touch) o mercado e a seleção que o delta mexeu;
+#   flush() no fim do frame recalcula só a linha dessas seleções. O
+#   agrupamento (linha -> seleções) fica guardado por mercado e só é refeito
+#   quando o mapa de seleções muda de tamanho, chega seleção nova, uma
+#   seleção troca de linha ou o mercado troca de nome
+# - fora da banda [low, high] = anomalia: abaixo de low é arbitragem
+#   (soma < 1 paga dos dois lados), acima de high é margem fora do normal;
+#   nota = distância até a banda
+# - heap com remoção preguiçosa: cada atualização empurra (-nota, seq);
+#   entrada com seq velho é lixo e sai quando chega ao topo. top(k) tira
+#   até k válidas e devolve ao heap
+# ============================================================
+
+Chave = Tuple[str, str, Optional[str]]  # (c2, chave do mercado, linha)
+
+
+def _linha(sel: dict) -> Optional[str]:
+    v = sel.get("linha_hd") or sel.get("linha_ha")
+    return str(v) if v not in (None, "") else None
+
+
+def market_key(mk: dict) -> Optional[str]:
+    """Chave do mercado no store (mercado de antes do _chave: o nome)."""
+    return mk.get("_chave") or mk.get("nome_mercado")
+
+
+class _Mercado:
+    __slots__ = ("nome", "por_total", "n_mapa", "grupos", "linha_de", "out", "ts")
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.por_total = False
+        self.n_mapa = -1
+        self.grupos: Dict[Optional[str], List[dict]] = {}  # linha -> seleções ({} = handicap)
+        self.linha_de: Dict[int, Tuple[dict, Optional[str]]] = {}  # id(seleção) -> (seleção, linha)
+        self.out: Dict[Optional[str], dict] = {}  # linha -> {"line", "overround", "n"}
+        self.ts = 0
+
+
+class OverroundScanner:
+    def __init__(self, low: float = 1.0, high: float = 1.2, top_k: int = 50,
+                 by_line: Optional[Callable[[str], bool]] = None,
+                 emit: Optional[Callable[[str, dict], None]] = None):
+        self.low = float(low)
+        self.high = float(high)
+        self.top_k = max(1, top_k)
+        self.by_line = by_line or (lambda _nome: False)
+        self._por_linha: Dict[str, bool] = {}  # nome do mercado -> by_line(nome)
+        self.emit = emit
+        self._sujos: Dict[Tuple[str, str], Tuple[dict, Optional[list]]] = {}  # (c2, chave) -> (mercado, seleções | None = tudo)
+        self._grupos: Dict[str, Dict[str, _Mercado]] = {}  # c2 -> chave -> mercado
+        self._abertas: Dict[Chave, Tuple[int, float, dict]] = {}  # chave -> (seq, nota, registro)
+        self._heap: List[Tuple[float, int, Chave]] = []
+        self._seq = 0
+        self.stats = {"flushes": 0, "markets": 0, "regroups": 0, "opened": 0, "closed": 0}
+
+    # ---------- caminho do frame ----------
+    def touch(self, c2: str, mk: dict, sel: Optional[dict] = None):
+        """Marca o mercado; `sel` = a seleção que mudou (sem ela, o mercado inteiro)."""
+        chave = market_key(mk) if isinstance(mk, dict) else None
+        if not (c2 and chave):
+            return
+        ant = self._sujos.get((c2, chave))
+        if ant is None:
+            self._sujos[(c2, chave)] = (mk, [sel] if sel is not None else None)
+        elif ant[1] is not None:
+            if sel is None:
+                self._sujos[(c2, chave)] = (mk, None)
+            else:
+                ant[1].append(sel)
+
+    def flush(self, now: int) -> int:
+        """Recalcula os mercados marcados desde o último flush; devolve quantos."""
+        if not self._sujos:
+            return 0
+        sujos, self._sujos = self._sujos, {}
+        for (c2, chave), (mk, sels) in sujos.items():
+            self._scan(c2, chave, mk, sels, now)
+        self.stats["flushes"] += 1
+        self.stats["markets"] += len(sujos)
+        return len(sujos)
+
+    def _agrupar(self, m: _Mercado, mapa: dict):
+        por_total = self._por_linha.get(m.nome)
+        if por_total is None:
+            if len(self._por_linha) > 10000:
+                self._por_linha.clear()
+            por_total = self._por_linha[m.nome] = bool(self.by_line(m.nome))
+        grupos: Dict[Optional[str], list] = {}
+        linha_de = {}
+        handicap = False
+        for sel in mapa.values():
+            # o mapa guarda a mesma seleção por chave e por selection_id
+            if not isinstance(sel, dict) or id(sel) in linha_de:
+                continue
+            ln = _linha(sel)
+            linha_de[id(sel)] = (sel, ln)
+            if ln is not None and not por_total:
+                handicap = True  # lados com linhas diferentes, soma não faz sentido
+            grupos.setdefault(ln if por_total else None, []).append(sel)
+        m.por_total = por_total
+        m.n_mapa = len(mapa)
+        m.linha_de = linha_de
+        m.grupos = {} if handicap else grupos
+        self.stats["regroups"] += 1
+
+    def _scan(self, c2: str, chave: str, mk: dict, sels: Optional[list], now: int):
+        por_mercado = self._grupos.setdefault(c2, {})
+        nome = mk.get("nome_mercado") or chave
+        m = por_mercado.get(chave)
+        if m is None:
+            m = por_mercado[chave] = _Mercado(nome)
+        mapa = mk.get("_selecoes_map") or {}
+        linhas = None
+        if sels is not None and m.nome == nome and m.n_mapa == len(mapa):
+            # caminho comum: seleções já agrupadas e na mesma linha
+            linhas = set()
+            for sel in sels:
+                ent = m.linha_de.get(id(sel))
+                if ent is None or ent[0] is not sel or ent[1] != _linha(sel):
+                    linhas = None
+                    break
+                linhas.add(ent[1] if m.por_total else None)
+        if linhas is None:
+            m.nome = nome
+            self._agrupar(m, mapa)
+            linhas = list(m.grupos) + [ln for ln in m.out if ln not in m.grupos]
+        for ln in linhas:
+            self._recalcular(c2, chave, m, ln, now)
+        m.ts = now
+
+    def _recalcular(self, c2: str, chave: str, m: _Mercado, ln: Optional[str], now: int):
+        sels = m.grupos.get(ln)
+        if not sels or len(sels) < 2:
+            if m.out.pop(ln, None) is not None:
+                self._fechar((c2, chave, ln), now)
+            return
+        soma = 0.0
+        for sel in sels:
+            od = sel.get("od_dec")
+            if not od or od <= 1.0 or sel.get("suspenso"):
+                soma = None
+                break
+            soma += 1.0 / od
+        ovr = None if soma is None else round(soma, 4)
+        m.out[ln] = {"line": ln, "overround": ovr, "n": len(sels)}
+        if ovr is None or self.low <= ovr <= self.high:
+            if self._abertas:
+                self._fechar((c2, chave, ln), now)
+        else:
+            self._abrir((c2, chave, ln), m.nome, ovr, sels, now)
+
+    def _abrir(self, chave: Chave, nome: str, ovr: float, sels: list, now: int):
+        tipo = "arbitrage" if ovr < self.low else "margin"
+        nota = round(self.low - ovr if ovr < self.low else ovr - self.high, 4)
+        ant = self._abertas.get(chave)
+        rec = {"c2": chave[0], "market": nome, "line": chave[2], "kind": tipo, "overround": ovr,
+               "score": nota, "selections": [{"nome": s.get("nome"), "od": s.get("od_dec")} for s in sels],
+               "since": ant[2]["since"] if ant and ant[2]["kind"] == tipo else now, "ts": now}
+        if ant is not None and ant[1] == nota:
+            self._abertas[chave] = (ant[0], nota, rec)  # mesma nota: a entrada do heap continua valendo
+            if ant[2]["kind"] == tipo:
+                return
+        else:
+            self._seq += 1
+            self._abertas[chave] = (self._seq, nota, rec)
+            heapq.heappush(self._heap, (-nota, self._seq, chave))
+        if len(self._heap) > 4 * len(self._abertas) + 1024:
+            self._heap = [(-n, s, k) for k, (s, n, _r) in self._abertas.items()]
+            heapq.heapify(self._heap)
+        if ant is None or ant[2]["kind"] != tipo:
+            self.stats["opened"] += 1
+            if self.emit is not None:
+                self.emit("anomaly_open", rec)
+
+    def forget(self, c2: str, chave: str, now: int):
+        """Mercado (chave do store) saiu do store (podado no gol / parado): some do scanner junto."""
+        self._sujos.pop((c2, chave), None)
+        mercados = self._grupos.get(c2)
+        m = mercados.pop(chave, None) if mercados else None
+        if m is not None:
+            for ln in m.out:
+                self._fechar((c2, chave, ln), now)
+
+    def _fechar(self, chave: Chave, now: int):
+        ant = self._abertas.pop(chave, None)
+        if ant is None:
+            return
+        self.stats["closed"] += 1
+        if self.emit is not None:
+            self.emit("anomaly_close", {"c2": chave[0], "market": ant[2]["market"], "line": chave[2],
+                                        "kind": ant[2]["kind"], "since": ant[2]["since"], "ts": now})
+
+    # ---------- leitura ----------
+    def top(self, k: Optional[int] = None, alive: Optional[Callable[[str, str], bool]] = None) -> List[dict]:
+        """As k piores anomalias abertas; alive(c2, chave do mercado) = False fecha a que sumiu do estado."""
+        k = k or self.top_k
+        validas = []
+        while self._heap and len(validas) < k:
+            e = heapq.heappop(self._heap)
+            ent = self._abertas.get(e[2])
+            if ent is None or ent[0] != e[1]:
+                continue
+            if alive is not None and not alive(e[2][0], e[2][1]):
+                self._fechar(e[2], ent[2]["ts"])
+                continue
+            validas.append(e)
+        for e in validas:
+            heapq.heappush(self._heap, e)
+        return [self._abertas[e[2]][2] for e in validas]
+
+    def event(self, c2: str) -> Dict[str, List[dict]]:
+        """Overround de cada mercado/linha do jogo (último valor calculado), por chave do mercado."""
+        return {chave: list(m.out.values()) for chave, m in self._grupos.get(c2, {}).items()}
+
+    def anomalies(self, c2: str) -> List[dict]:
+        return [rec for (cc, _n, _l), (_s, _nota, rec) in self._abertas.items() if cc == c2]
+
+    def open_count(self) -> int:
+        return len(self._abertas)
+
+    def forget_idle(self, now: int, max_idle: int):
+        for c2 in list(self._grupos):
+            mercados = self._grupos[c2]
+            for chave in [k for k, m in mercados.items() if now - m.ts > max_idle]:
+                for ln in mercados.pop(chave).out:
+                    self._fechar((c2, chave, ln), now)
+            if not mercados:
+                del self._grupos[c2]
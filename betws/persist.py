@@ -0,0 +1,77 @@
+# betws/persist.py
+from __future__ import annotations
+import os
+import pickle
+import struct
+import time
+from typing import Any, Optional, Tuple
+
+# ============================================================
+# Snapshot do estado em disco (binário, pickle)
+#
+# arquivo: magic(8) | ts_ms(Q) | tamanho(Q) | payload (pickle)
+#
+# - escrita atômica: grava em <arquivo>.tmp, fsync, os.replace
+#   (quem cai no meio deixa o snapshot anterior intacto)
+# - leitura confere magic/tamanho e a idade (ts do cabeçalho) antes de
+#   desserializar: snapshot velho demais é ignorado sem custo de unpickle
+# ============================================================
+
+MAGIC = b"BETSNAP1"
+_HDR = struct.Struct("<8sQQ")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class SnapshotStale(SnapshotError):
+    pass
+
+
+def dump_state(state: Any) -> bytes:
+    """Serializa (rápido; chamar com o lock do estado, gravar fora dele)."""
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_snapshot(path: str, payload: bytes, ts: Optional[float] = None) -> int:
+    ts = time.time() if ts is None else ts
+    pasta = os.path.dirname(os.path.abspath(path))
+    os.makedirs(pasta, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HDR.pack(MAGIC, int(ts * 1000), len(payload)))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return _HDR.size + len(payload)
+
+
+def read_snapshot(path: str, max_age: Optional[float] = None, now: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+    """
+    Retorna (estado, ts) ou None se o arquivo não existe.
+    SnapshotStale se for mais velho que max_age segundos; SnapshotError se corrompido.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        hdr = f.read(_HDR.size)
+        if len(hdr) != _HDR.size:
+            raise SnapshotError("cabeçalho truncado")
+        magic, ts_ms, tamanho = _HDR.unpack(hdr)
+        if magic != MAGIC:
+            raise SnapshotError("magic inválido")
+        ts = ts_ms / 1000.0
+        now = time.time() if now is None else now
+        if max_age is not None and now - ts > max_age:
+            raise SnapshotStale(f"snapshot com {now - ts:.0f}s (máx {max_age:.0f}s)")
+        payload = f.read(tamanho)
+        if len(payload) != tamanho:
+            raise SnapshotError("payload truncado")
+    try:
+        return pickle.loads(payload), ts
+    except Exception as e:
+        raise SnapshotError(f"unpickle falhou: {e}") from e
@@ -0,0 +1,215 @@
+# betws/profiler.py
+from __future__ import annotations
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Callable, Dict, List, Tuple
+
+# ============================================================
+# Profiler por amostragem (sem sys.setprofile / settrace)
+# - cpu: uma thread lê sys._current_frames() a cada intervalo
+# - alloc: tracemalloc entre o início e o fim da janela
+# Saída em "collapsed stacks" (formato do flamegraph.pl / speedscope):
+#   thread;mod:func:linha;mod:func:linha <peso>
+# ============================================================
+
+MAX_SEGUNDOS = 120
+MAX_PROFUNDIDADE = 64
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+_LOCK = threading.Lock()
+
+
+def _nome_frame(co_filename: str, co_name: str, lineno: int) -> str:
+    mod = os.path.splitext(os.path.basename(co_filename))[0]
+    return f"{mod}:{co_name}:{lineno}"
+
+
+def _nome_linha(filename: str, lineno: int) -> str:
+    # tracemalloc só guarda arquivo/linha (sem nome da função)
+    mod = os.path.splitext(os.path.basename(filename))[0]
+    return f"{mod}:{lineno}"
+
+
+def _stack_de_frame(frame) -> List[str]:
+    pilha = []
+    while frame is not None and len(pilha) < MAX_PROFUNDIDADE:
+        co = frame.f_code
+        pilha.append(_nome_frame(co.co_filename, co.co_name, frame.f_lineno))
+        frame = frame.f_back
+    pilha.reverse()  # raiz -> folha
+    return pilha
+
+
+_FOLHAS_OCIOSAS = ("wait", "select", "poll", "accept", "sleep", "_recv_into", "readinto", "serve_forever")
+
+
+def _folha_ociosa(folha: str) -> bool:
+    partes = folha.split(":")
+    return len(partes) >= 2 and partes[1] in _FOLHAS_OCIOSAS
+
+
+def sample_cpu(seconds: float, interval: float = 0.005, include_idle: bool = False) -> Tuple[Counter, int]:
+    """
+    Amostra as pilhas de todas as threads (menos a própria) por `seconds`.
+    Retorna (Counter stack->amostras, nº de ticks).
+
+    Threads paradas em wait/select/accept aparecem como "idle" e são descartadas
+    por padrão (senão o servidor ocioso domina o flamegraph).
+    """
+    seconds = max(0.0, min(float(seconds), MAX_SEGUNDOS))
+    interval = max(0.0005, float(interval))
+
+    if not _LOCK.acquire(blocking=False):
+        raise ProfilerBusy("já existe um profile rodando")
+    try:
+        eu = threading.get_ident()
+        nomes = {}
+        amostras: Counter = Counter()
+        ticks = 0
+        fim = time.perf_counter() + seconds
+        while time.perf_counter() < fim:
+            frames = sys._current_frames()
+            if len(nomes) != len(frames):
+                nomes = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in frames.items():
+                if tid == eu:
+                    continue
+                pilha = _stack_de_frame(frame)
+                if not include_idle and pilha and _folha_ociosa(pilha[-1]):
+                    continue
+                pilha.insert(0, nomes.get(tid, f"thread-{tid}"))
+                amostras[";".join(pilha)] += 1
+            ticks += 1
+            time.sleep(interval)
+        return amostras, ticks
+    finally:
+        _LOCK.release()
+
+
+def sample_alloc(seconds: float, frames: int = 25) -> Tuple[Counter, int]:
+    """
+    Liga o tracemalloc (se ainda não estiver ligado) por `seconds` e retorna
+    (Counter stack->bytes alocados e ainda vivos no fim da janela, total de bytes).
+    """
+    seconds = max(0.0, min(float(seconds), MAX_SEGUNDOS))
+
+    if not _LOCK.acquire(blocking=False):
+        raise ProfilerBusy("já existe um profile rodando")
+    ligou_aqui = False
+    try:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, int(frames)))
+            ligou_aqui = True
+        antes = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        depois = tracemalloc.take_snapshot()
+
+        filtros = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        antes = antes.filter_traces(filtros)
+        depois = depois.filter_traces(filtros)
+
+        pesos: Counter = Counter()
+        total = 0
+        for st in depois.compare_to(antes, "traceback"):
+            if st.size_diff <= 0:
+                continue
+            # tracemalloc guarda folha -> raiz; collapsed quer raiz -> folha
+            pilha = [_nome_linha(fr.filename, fr.lineno) for fr in reversed(st.traceback)]
+            pesos[";".join(pilha)] += st.size_diff
+            total += st.size_diff
+        return pesos, total
+    finally:
+        if ligou_aqui:
+            tracemalloc.stop()
+        _LOCK.release()
+
+
+def render_collapsed(pesos: Counter) -> str:
+    linhas = [f"{stack} {n}" for stack, n in pesos.most_common()]
+    return "\n".join(linhas) + ("\n" if linhas else "")
+
+
+# ============================================================
+# Relatório de memória das estruturas do store (top-N, rolante)
+# ============================================================
+def deep_sizeof(obj, limite: int = 200_000) -> int:
+    """
+    Soma sys.getsizeof recursivamente (dict/list/tuple/set/deque), sem repetir
+    objetos. `limite` corta a visita em estruturas gigantes (resultado vira
+    estimativa por baixo). Roda sem o lock do estado: container que muda
+    durante a cópia é tentado de novo e, se continuar mudando, fica só com
+    o próprio tamanho.
+    """
+    vistos = set()
+    pilha = [obj]
+    total = 0
+    visitados = 0
+    while pilha and visitados < limite:
+        o = pilha.pop()
+        oid = id(o)
+        if oid in vistos:
+            continue
+        vistos.add(oid)
+        visitados += 1
+        try:
+            total += sys.getsizeof(o)
+        except Exception:
+            continue
+        if isinstance(o, (dict, list, tuple, set, frozenset, deque)):
+            pilha.extend(_filhos(o))
+    return total
+
+
+def _filhos(o, tentativas: int = 3) -> list:
+    for _ in range(tentativas):
+        try:
+            if isinstance(o, dict):
+                return [x for kv in list(o.items()) for x in kv]
+            return list(o)
+        except RuntimeError:  # "changed size during iteration" / "deque mutated"
+            continue
+    return []
+
+
+class StoreReport:
+    """
+    Mantém os últimos `keep` relatórios de tamanho das estruturas registradas.
+    Cada relatório traz o tamanho total de cada estrutura e as N maiores
+    entradas (ex: os N eventos c2 que mais ocupam DADOS_MERCADO_POR_EVENTO).
+    """
+
+    def __init__(self, structures: Callable[[], Dict[str, object]], keep: int = 20):
+        self._structures = structures
+        self.history: deque = deque(maxlen=keep)
+
+    def take(self, top: int = 10) -> dict:
+        t0 = time.perf_counter()
+        estruturas = []
+        for nome, obj in self._structures().items():
+            try:
+                itens = list(obj.items()) if isinstance(obj, dict) else []
+            except Exception:
+                itens = []
+            por_chave = sorted(((str(k), deep_sizeof(v)) for k, v in itens), key=lambda x: -x[1])
+            estruturas.append({
+                "nome": nome,
+                "entradas": len(obj) if hasattr(obj, "__len__") else None,
+                "bytes": deep_sizeof(obj),
+                "top": [{"chave": k, "bytes": b} for k, b in por_chave[:top]],
+            })
+        estruturas.sort(key=lambda x: -x["bytes"])
+        rel = {
+            "ts": int(time.time()),
+            "ms": round((time.perf_counter() - t0) * 1000, 2),
+            "estruturas": estruturas,
+        }
+        self.history.append(rel)
+        return rel
@@ -0,0 +1,147 @@
+# betws/pubsub.py
+from __future__ import annotations
+import json
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+# ============================================================
+# Pub/sub em memória para push (SSE) a partir do processo da API
+# - publish() roda no escritor (thread): serializa o payload uma vez só
+# - cada assinante tem fila limitada; cheia -> descarta a mais antiga e
+#   conta em `dropped` (assinante lento nunca segura o escritor)
+# - get() bloqueante para Flask (thread por cliente) e aget() para asyncio
+# - sse_bytes(): todos os assinantes recebem a mesma tupla, então o texto
+#   SSE (e o encode) sai de um cache pequeno em vez de um por assinante
+# ============================================================
+
+# (seq, topico, evento, payload_json)
+Message = Tuple[int, str, str, str]
+
+
+def format_sse(msg: Message) -> str:
+    seq, _topico, evento, payload = msg
+    return f"id: {seq}\nevent: {evento}\ndata: {payload}\n\n"
+
+
+SSE_PING = ": ping\n\n"
+
+
+@lru_cache(maxsize=32)
+def sse_bytes(msg: Message) -> bytes:
+    """format_sse já em utf-8; a mesma mensagem vai para N assinantes e é formatada uma vez."""
+    return format_sse(msg).encode("utf-8")
+
+
+SSE_PING_BYTES = SSE_PING.encode("utf-8")
+
+
+class Subscription:
+    def __init__(self, broker: "Broker", topics: Set[str], maxlen: int):
+        self.broker = broker
+        self.topics = topics
+        self.fila: Deque[Message] = deque(maxlen=maxlen)
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._wakers: List[Callable[[], None]] = []
+        self.closed = False
+
+    def _push(self, msg: Message):
+        with self._cond:
+            if len(self.fila) == self.fila.maxlen:
+                self.dropped += 1
+            self.fila.append(msg)
+            self._cond.notify()
+            wakers = list(self._wakers)
+        for w in wakers:
+            try:
+                w()
+            except Exception:
+                pass
+
+    def get(self, timeout: float = 15.0) -> Optional[Message]:
+        """Próxima mensagem ou None no timeout (hora de mandar ping)."""
+        with self._cond:
+            if not self.fila and not self.closed:
+                self._cond.wait(timeout)
+            return self.fila.popleft() if self.fila else None
+
+    def drain(self) -> List[Message]:
+        with self._cond:
+            out = list(self.fila)
+            self.fila.clear()
+            return out
+
+    async def aget(self, timeout: float = 15.0) -> Optional[Message]:
+        import asyncio
+
+        with self._cond:
+            if self.fila:
+                return self.fila.popleft()
+        loop = asyncio.get_running_loop()
+        ev = asyncio.Event()
+        waker = lambda: loop.call_soon_threadsafe(ev.set)
+        with self._cond:
+            if self.fila:
+                return self.fila.popleft()
+            self._wakers.append(waker)
+        try:
+            await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                if waker in self._wakers:
+                    self._wakers.remove(waker)
+        with self._cond:
+            return self.fila.popleft() if self.fila else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, maxlen: int = 1000):
+        self.maxlen = maxlen
+        self.seq = 0
+        self._subs: Dict[str, List[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics: Iterable[str], maxlen: Optional[int] = None) -> Subscription:
+        sub = Subscription(self, set(topics), maxlen or self.maxlen)
+        with self._lock:
+            for t in sub.topics:
+                self._subs.setdefault(t, []).append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            for t in sub.topics:
+                lst = self._subs.get(t)
+                if lst and sub in lst:
+                    lst.remove(sub)
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self._subs.get(topic))
+
+    def subscribers(self, topic: Optional[str] = None) -> int:
+        if topic is not None:
+            return len(self._subs.get(topic, ()))
+        return sum(len(v) for v in self._subs.values())
+
+    def publish(self, topic: str, event: str, data) -> int:
+        subs = self._subs.get(topic)
+        if not subs:
+            return 0
+        payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self.seq += 1
+            msg = (self.seq, topic, event, payload)
+            subs = list(subs)
+        for s in subs:
+            s._push(msg)
+        return len(subs)
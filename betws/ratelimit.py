@@ -0,0 +1,59 @@
+# betws/ratelimit.py
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+# ============================================================
+# Limite por cliente nas leituras (token bucket)
+#
+# - cada cliente tem um balde de `burst` fichas que enche a `rate` por
+#   segundo; cada leitura gasta uma. Balde vazio -> recusa, com o tempo
+#   até a próxima ficha (vira o Retry-After do 429)
+# - rate <= 0 desliga o limite (allow sempre True)
+# - no máximo `max_clients` baldes, o menos recente sai primeiro (IP
+#   novo chegando o dia todo não cresce a memória); balde descartado
+#   volta cheio, que é o mesmo que um cliente parado há muito tempo
+# - `exempt`: clientes sem limite (ex: o robô da casa em 127.0.0.1)
+# ============================================================
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: Optional[float] = None, max_clients: int = 10000,
+                 exempt: Iterable[str] = ()):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, 2 * self.rate)
+        self.max_clients = max(1, max_clients)
+        self.exempt = frozenset(exempt)
+        self._b: "OrderedDict[str, list]" = OrderedDict()  # cliente -> [fichas, último ts]
+        self._lock = threading.Lock()
+        self.refused = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def allow(self, client: str, now: Optional[float] = None, cost: float = 1.0) -> Tuple[bool, float]:
+        """(liberado, segundos até ter `cost` fichas)."""
+        if self.rate <= 0 or client in self.exempt:
+            return True, 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            b = self._b.get(client)
+            if b is None:
+                if len(self._b) >= self.max_clients:
+                    self._b.popitem(last=False)
+                b = self._b[client] = [self.burst, now]
+            else:
+                self._b.move_to_end(client)
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+            if b[0] >= cost:
+                b[0] -= cost
+                return True, 0.0
+            self.refused += 1
+            return False, (cost - b[0]) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._b)
@@ -0,0 +1,139 @@
+# betws/sequencer.py
+from __future__ import annotations
+from typing import Any, Dict, Hashable, List, Tuple
+
+# ============================================================
+# Reordenação por fluxo (uma aba = um fluxo) com número de sequência
+#
+# - o hook.js numera os frames de cada carregamento de página (sid novo a
+#   cada reload, seq começando em 1)
+# - frame no seq esperado: sai na hora (e puxa os seguintes já guardados)
+# - frame adiantado: fica guardado até `window` segundos esperando o buraco
+# - estourou a janela (ou o buffer): buraco vira "gap", pula para o menor
+#   seq guardado e avisa quem chamou (-> pedir resync da aba)
+# - seq repetido/atrasado (já passou): descartado
+# - fluxo novo que não começa no seq 1 (frames iniciais fora de ordem, ou
+#   backend subiu com a aba já no meio): os primeiros frames ficam guardados
+#   pela janela e o fluxo começa do menor seq que chegou nela (sem contar gap)
+# ============================================================
+
+PRIMEIRO_SEQ = 1
+
+
+class StreamState:
+    __slots__ = ("sid", "next_seq", "held", "last_seen", "aberto")
+
+    def __init__(self, sid, next_seq: int, now: float):
+        self.sid = sid
+        self.next_seq = next_seq
+        self.held: Dict[int, Tuple[Any, float]] = {}  # seq -> (item, chegada)
+        self.last_seen = now
+        self.aberto = False  # True = início ainda não fixado (next_seq = menor visto)
+
+
+class Sequencer:
+    def __init__(self, window: float = 0.25, max_held: int = 64, idle: float = 600.0):
+        self.window = window
+        self.max_held = max_held
+        self.idle = idle
+        self.streams: Dict[Hashable, StreamState] = {}
+        self.stats = {
+            "frames": 0,
+            "in_order": 0,
+            "reordered": 0,
+            "duplicates": 0,
+            "gaps": 0,
+            "lost": 0,
+            "resets": 0,
+        }
+
+    def _drain(self, st: StreamState, out: List[Any]):
+        while st.next_seq in st.held:
+            out.append(st.held.pop(st.next_seq)[0])
+            st.next_seq += 1
+
+    def _fixar_inicio(self, st: StreamState, out: List[Any]):
+        st.aberto = False
+        self._drain(st, out)
+
+    def _skip_gap(self, st: StreamState, out: List[Any]):
+        menor = min(st.held)
+        self.stats["gaps"] += 1
+        self.stats["lost"] += menor - st.next_seq
+        st.next_seq = menor
+        self._drain(st, out)
+
+    def receive(self, key: Hashable, sid, seq: int, item, now: float) -> Tuple[List[Any], bool]:
+        """
+        Retorna (itens liberados em ordem, houve_gap).
+        Os liberados podem incluir frames guardados de antes.
+        """
+        self.stats["frames"] += 1
+        out: List[Any] = []
+        st = self.streams.get(key)
+        if st is None or st.sid != sid:
+            if st is not None:
+                # aba recarregou: o que sobrou do fluxo antigo sai na ordem que tiver
+                self.stats["resets"] += 1
+                for s in sorted(st.held):
+                    out.append(st.held[s][0])
+            st = StreamState(sid, seq, now)
+            st.aberto = seq != PRIMEIRO_SEQ
+            self.streams[key] = st
+        st.last_seen = now
+
+        if st.aberto:
+            if seq in st.held:
+                self.stats["duplicates"] += 1
+                return out, False
+            self.stats["reordered"] += 1
+            st.held[seq] = (item, now)
+            st.next_seq = min(st.next_seq, seq)
+            if st.next_seq == PRIMEIRO_SEQ or len(st.held) > self.max_held:
+                self._fixar_inicio(st, out)
+                if st.held and len(st.held) > self.max_held:
+                    self._skip_gap(st, out)
+                    return out, True
+            return out, False
+
+        if seq < st.next_seq or seq in st.held:
+            self.stats["duplicates"] += 1
+            return out, False
+
+        if seq == st.next_seq:
+            self.stats["in_order"] += 1
+            out.append(item)
+            st.next_seq += 1
+            self._drain(st, out)
+            return out, False
+
+        self.stats["reordered"] += 1
+        st.held[seq] = (item, now)
+        if len(st.held) > self.max_held:
+            self._skip_gap(st, out)
+            return out, True
+        return out, False
+
+    def expire(self, now: float) -> Tuple[List[Any], List[Hashable]]:
+        """Fecha buracos mais velhos que a janela. Retorna (liberados, chaves com gap)."""
+        out: List[Any] = []
+        com_gap: List[Hashable] = []
+        for key, st in list(self.streams.items()):
+            if not st.held:
+                if now - st.last_seen > self.idle:
+                    self.streams.pop(key, None)
+                continue
+            if st.aberto:
+                if now - min(c for _, c in st.held.values()) < self.window:
+                    continue
+                self._fixar_inicio(st, out)
+            gap = False
+            while st.held and now - min(c for _, c in st.held.values()) >= self.window:
+                self._skip_gap(st, out)
+                gap = True
+            if gap:
+                com_gap.append(key)
+        return out, com_gap
+
+    def held_count(self) -> int:
+        return sum(len(st.held) for st in list(self.streams.values()))
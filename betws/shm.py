@@ -0,0 +1,271 @@
+# betws/shm.py
+from __future__ import annotations
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+# ============================================================
+# Snapshot versionado em memória compartilhada (double buffer + seqlock)
+#
+# Layout do segmento:
+#   [header 64 bytes][slot 0: capacidade][slot 1: capacidade]
+#
+# header: magic(4) | seq(Q) | versao(Q) | slot(I) | tamanho(I) | ts_ms(Q) | capacidade(Q)
+#
+# Escritor (um só processo):
+#   seq += 1 (ímpar) -> escreve no slot inativo -> atualiza header -> seq += 1 (par)
+# Leitor:
+#   lê seq (par) -> copia o slot indicado -> relê seq; a cópia vale se seq
+#   andou no máximo 2 (no máximo uma publicação terminou, e ela escreveu no
+#   outro slot). Senão tenta de novo.
+#
+# O conteúdo do slot é um pacote de documentos já serializados (nome -> bytes),
+# então quem lê só copia bytes; não há parse de JSON no caminho de leitura.
+#
+# Documento objeto (pack_object): {"chave": valor, ...} montado de pedaços já
+# serializados, mais "<nome>#idx" com chave -> (offset, tamanho) de cada
+# valor. O leitor recorta um valor sem tocar no resto (member) e guarda
+# o que montar em cima dele até a próxima publicação (derived).
+# ============================================================
+
+MAGIC = b"BSNP"
+_HDR = struct.Struct("<4sQQIIQQ")
+HEADER_SIZE = 64
+
+_N = struct.Struct("<I")
+_ENT = struct.Struct("<HI")
+_MEMB = struct.Struct("<HII")
+
+
+class SnapshotTooLarge(ValueError):
+    pass
+
+
+def pack_docs(docs: Dict[str, bytes]) -> bytes:
+    """[n][(len_nome, len_doc, nome, doc) ...]"""
+    partes = [_N.pack(len(docs))]
+    for nome, doc in docs.items():
+        nb = nome.encode("utf-8")
+        partes.append(_ENT.pack(len(nb), len(doc)))
+        partes.append(nb)
+        partes.append(doc)
+    return b"".join(partes)
+
+
+def unpack_index(buf) -> Dict[str, Tuple[int, int]]:
+    """nome -> (offset, tamanho) dentro de buf (sem copiar os documentos)."""
+    (n,) = _N.unpack_from(buf, 0)
+    off = _N.size
+    idx = {}
+    for _ in range(n):
+        ln, ld = _ENT.unpack_from(buf, off)
+        off += _ENT.size
+        nome = bytes(buf[off:off + ln]).decode("utf-8")
+        off += ln
+        idx[nome] = (off, ld)
+        off += ld
+    return idx
+
+
+def pack_object(partes: Dict[str, bytes], chave_json) -> Tuple[bytes, bytes]:
+    """
+    (doc, índice) de {chave: valor} com os valores já serializados, em ordem
+    de chave e com os separadores do json.dumps padrão: o mesmo texto de
+    serializar o dict inteiro com sort_keys. chave_json(str) -> bytes.
+    """
+    doc = [b"{"]
+    idx = [_N.pack(len(partes))]
+    off = 1
+    for i, chave in enumerate(sorted(partes)):
+        valor = partes[chave]
+        pre = (b", " if i else b"") + chave_json(chave) + b": "
+        off += len(pre)
+        kb = chave.encode("utf-8")
+        idx.append(_MEMB.pack(len(kb), off, len(valor)))
+        idx.append(kb)
+        doc.append(pre)
+        doc.append(valor)
+        off += len(valor)
+    doc.append(b"}")
+    return b"".join(doc), b"".join(idx)
+
+
+def unpack_members(buf) -> Dict[str, Tuple[int, int]]:
+    (n,) = _N.unpack_from(buf, 0)
+    off = _N.size
+    idx = {}
+    for _ in range(n):
+        ln, voff, vlen = _MEMB.unpack_from(buf, off)
+        off += _MEMB.size
+        idx[bytes(buf[off:off + ln]).decode("utf-8")] = (voff, vlen)
+        off += ln
+    return idx
+
+
+class SnapshotPublisher:
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = int(capacity)
+        total = HEADER_SIZE + 2 * self.capacity
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        except FileExistsError:
+            # sobra de um processo anterior: reaproveita se couber
+            self.shm = shared_memory.SharedMemory(name=name, create=False)
+            if self.shm.size < total:
+                self.shm.close()
+                self.shm.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        self.seq = 0
+        self.slot = 1  # a primeira publicação vai no slot 0
+        self.version = 0
+        self._write_header(0, 0, 0)
+
+    def _write_header(self, slot: int, tamanho: int, ts_ms: int):
+        _HDR.pack_into(self.shm.buf, 0, MAGIC, self.seq, self.version, slot, tamanho, ts_ms, self.capacity)
+
+    def publish(self, version: int, docs: Dict[str, bytes]) -> int:
+        payload = pack_docs(docs)
+        if len(payload) > self.capacity:
+            raise SnapshotTooLarge(f"snapshot de {len(payload)} bytes > capacidade {self.capacity}")
+
+        novo = 1 - self.slot
+        buf = self.shm.buf
+
+        self.seq += 1  # ímpar: escrita em andamento
+        struct.pack_into("<Q", buf, 4, self.seq)
+
+        ini = HEADER_SIZE + novo * self.capacity
+        buf[ini:ini + len(payload)] = payload
+
+        self.slot = novo
+        self.version = int(version)
+        self._write_header(novo, len(payload), int(time.time() * 1000))  # ainda com seq ímpar
+        self.seq += 1  # par: publicado (seq por último, senão o leitor pode ver seq novo com slot velho)
+        struct.pack_into("<Q", buf, 4, self.seq)
+        return len(payload)
+
+    def close(self, unlink: bool = True):
+        try:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+        except Exception:
+            pass
+
+
+def _nao_rastrear(shm: shared_memory.SharedMemory):
+    """
+    Até o Python 3.12 o resource_tracker do leitor faz unlink do segmento
+    quando o processo leitor sai, derrubando o buffer do escritor.
+    """
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class SnapshotReader:
+    """
+    Leitor (outro processo). Guarda a última cópia: se o seq não mudou,
+    devolve os mesmos bytes sem tocar no buffer.
+    """
+
+    def __init__(self, name: str):
+        self.shm = shared_memory.SharedMemory(name=name, create=False)
+        _nao_rastrear(self.shm)
+        self._seq = -1
+        self._data: Optional[bytes] = None
+        self._idx: Dict[str, Tuple[int, int]] = {}
+        self._docs: Dict[str, bytes] = {}
+        self._membros: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self._derivados: Dict[Tuple[str, str], bytes] = {}
+        self.version = 0
+        self.ts_ms = 0
+
+    def _header(self):
+        magic, seq, versao, slot, tamanho, ts_ms, cap = _HDR.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC:
+            raise RuntimeError("segmento de memória compartilhada inválido")
+        return seq, versao, slot, tamanho, ts_ms, cap
+
+    def refresh(self, tentativas: int = 50) -> bool:
+        """Atualiza a cópia local se houver publicação nova. Retorna True se mudou."""
+        for _ in range(tentativas):
+            seq, versao, slot, tamanho, ts_ms, cap = self._header()
+            if seq == self._seq:
+                return False
+            if seq & 1 or tamanho == 0:
+                time.sleep(0)
+                continue
+            ini = HEADER_SIZE + slot * cap
+            data = bytes(self.shm.buf[ini:ini + tamanho])
+            seq2 = self._header()[0]
+            if seq2 - seq > 2:
+                continue  # slot pode ter sido reescrito durante a cópia
+            self._seq = seq
+            self._data = data
+            self._idx = unpack_index(data)
+            self._docs = {}
+            self._membros = {}
+            self._derivados = {}
+            self.version = versao
+            self.ts_ms = ts_ms
+            return True
+        return False
+
+    def get(self, nome: str) -> Optional[bytes]:
+        self.refresh()
+        doc = self._docs.get(nome)
+        if doc is not None:
+            return doc
+        ent = self._idx.get(nome)
+        if not ent or self._data is None:
+            return None
+        off, ln = ent
+        doc = self._data[off:off + ln]
+        self._docs[nome] = doc
+        return doc
+
+    def _member(self, data, idx, membros, nome: str, chave: str) -> Optional[bytes]:
+        m = membros.get(nome)
+        if m is None:
+            ent = idx.get(nome + "#idx")
+            m = membros[nome] = unpack_members(memoryview(data)[ent[0]:ent[0] + ent[1]]) if ent else {}
+        ent, val = idx.get(nome), m.get(chave)
+        if not ent or not val:
+            return None
+        off = ent[0] + val[0]
+        return data[off:off + val[1]]
+
+    def member(self, nome: str, chave: str) -> Optional[bytes]:
+        """Valor de `chave` no documento objeto `nome` (só os bytes dele)."""
+        self.refresh()
+        return self._member(self._data, self._idx, self._membros, nome, chave)
+
+    def derived(self, nome: str, chave: str, montar) -> Optional[bytes]:
+        """
+        montar(valor) -> bytes sobre member(nome, chave), uma vez por
+        publicação. Tudo sai da mesma cópia: um refresh no meio não mistura.
+        """
+        self.refresh()
+        data, idx, membros, derivados = self._data, self._idx, self._membros, self._derivados
+        doc = derivados.get((nome, chave))
+        if doc is None and data is not None:
+            val = self._member(data, idx, membros, nome, chave)
+            if val is None:
+                return None
+            doc = derivados[(nome, chave)] = montar(val)
+        return doc
+
+    def names(self):
+        self.refresh()
+        return list(self._idx.keys())
+
+    def close(self):
+        try:
+            self.shm.close()
+        except Exception:
+            pass
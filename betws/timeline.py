@@ -0,0 +1,159 @@
+# betws/timeline.py
+from __future__ import annotations
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# ============================================================
+# Linha do tempo de placar por jogo (gols e correções)
+#
+# - uma entrada por troca de placar vista no delta: segundo de jogo,
+#   período (MD), placar depois da troca, código UC e ts do frame
+# - cada jogo tem arrays pré-alocados (`cap` entradas, dobra se encher):
+#   gravar é escrever no índice n, ler o último gol é olhar n-1
+# - UC vira um código pequeno (tabela compartilhada); UC que chega antes
+#   do SS (ex: "Goal" num frame, placar no seguinte) fica pendente e vai
+#   junto na próxima troca do jogo
+# - `base` = placar antes da primeira troca vista (jogo que entrou no
+#   meio: os gols de antes não estão na linha)
+# ============================================================
+
+
+class EventTimeline:
+    __slots__ = ("n", "base", "seen", "secs", "period", "home", "away", "uc", "ts")
+
+    def __init__(self, cap: int, base: str = ""):
+        self.n = 0
+        self.base = base
+        self.seen = 0
+        self.secs = array("i", bytes(4 * cap))
+        self.period = array("b", bytes(cap))
+        self.home = array("h", bytes(2 * cap))
+        self.away = array("h", bytes(2 * cap))
+        self.uc = array("h", bytes(2 * cap))
+        self.ts = array("q", bytes(8 * cap))
+
+    def _crescer(self):
+        for nome in ("secs", "period", "home", "away", "uc", "ts"):
+            a = getattr(self, nome)
+            a.extend(a)  # dobra; o conteúdo novo é sobrescrito antes de ser lido
+
+    def add(self, secs: int, period: int, home: int, away: int, uc: int, ts: int) -> int:
+        i = self.n
+        if i == len(self.secs):
+            self._crescer()
+        self.secs[i], self.period[i], self.home[i], self.away[i], self.uc[i], self.ts[i] = \
+            secs, period, home, away, uc, ts
+        self.n = i + 1
+        return i
+
+
+def parse_score(ss: str) -> Optional[Tuple[int, int]]:
+    try:
+        a, b = str(ss).split("-", 1)
+        return int(a), int(b)
+    except (ValueError, AttributeError):
+        return None
+
+
+class ScoreTimeline:
+    def __init__(self, cap: int = 16):
+        self.cap = max(1, cap)
+        self._ev: Dict[str, EventTimeline] = {}  # c2 -> linha do jogo
+        self._uc_pend: Dict[str, Tuple[int, int]] = {}  # c2 -> (UC visto antes da troca de placar, ts)
+        self._uc_cod: Dict[str, int] = {"": 0}
+        self._uc_txt: List[str] = [""]
+        self.stats = {"changes": 0, "corrections": 0}
+
+    def _codigo(self, uc: str) -> int:
+        cod = self._uc_cod.get(uc)
+        if cod is None:
+            if len(self._uc_txt) >= 32767:
+                return 0
+            cod = self._uc_cod[uc] = len(self._uc_txt)
+            self._uc_txt.append(uc)
+        return cod
+
+    # ---------- caminho do delta ----------
+    def seen(self, c2: str, ts: int):
+        tl = self._ev.get(c2)
+        if tl is not None:
+            tl.seen = ts
+
+    def mark_uc(self, c2: str, uc: str, ts: int):
+        self._uc_pend[c2] = (self._codigo(uc), ts)
+
+    def record(self, c2: str, before: str, after: str, secs: int, period: int, uc: str, ts: int) -> int:
+        """Troca de placar before -> after; devolve o índice da entrada (-1 = placar ilegível)."""
+        sc = parse_score(after)
+        if sc is None:
+            return -1
+        tl = self._ev.get(c2)
+        if tl is None:
+            tl = self._ev[c2] = EventTimeline(self.cap, before)
+        pend = self._uc_pend.pop(c2, None)
+        cod = self._codigo(uc) if uc else (pend[0] if pend else 0)
+        ant = (tl.home[tl.n - 1], tl.away[tl.n - 1]) if tl.n else parse_score(before)
+        if ant is not None and (sc[0] < ant[0] or sc[1] < ant[1]):
+            self.stats["corrections"] += 1
+        self.stats["changes"] += 1
+        tl.seen = ts
+        return tl.add(max(0, secs), period, sc[0], sc[1], cod, ts)
+
+    # ---------- leitura ----------
+    def get(self, c2: str) -> Optional[EventTimeline]:
+        return self._ev.get(c2)
+
+    def __contains__(self, c2: str) -> bool:
+        return c2 in self._ev
+
+    def compact(self, c2: str) -> Optional[dict]:
+        """Colunas paralelas (o que vai no /live): t, period, score, uc."""
+        tl = self._ev.get(c2)
+        if tl is None or not tl.n:
+            return None
+        n = tl.n
+        return {"t": tl.secs[:n].tolist(), "period": tl.period[:n].tolist(),
+                "score": [f"{h}-{a}" for h, a in zip(tl.home[:n], tl.away[:n])],
+                "uc": [self._uc_txt[c] for c in tl.uc[:n]]}
+
+    def entries(self, c2: str) -> List[dict]:
+        tl = self._ev.get(c2)
+        if tl is None:
+            return []
+        out = []
+        ph, pa = parse_score(tl.base) or (None, None)
+        for i in range(tl.n):
+            h, a = tl.home[i], tl.away[i]
+            if ph is None:
+                lado = None
+            elif h < ph or a < pa:
+                lado = "correction"
+            else:
+                lado = "home" if h > ph else ("away" if a > pa else None)
+            out.append({"t": tl.secs[i], "minute": f"{tl.secs[i] // 60}:{tl.secs[i] % 60:02d}",
+                        "period": tl.period[i], "score": f"{h}-{a}", "side": lado,
+                        "uc": self._uc_txt[tl.uc[i]], "ts": tl.ts[i]})
+            ph, pa = h, a
+        return out
+
+    def __len__(self) -> int:
+        return len(self._ev)
+
+    # ---------- snapshot ----------
+    def state(self) -> dict:
+        return {"ev": self._ev, "uc": self._uc_txt}
+
+    def load(self, st: Optional[dict]):
+        self._ev.clear()
+        self._uc_pend.clear()
+        if not st:
+            return
+        self._uc_txt = list(st.get("uc") or [""])
+        self._uc_cod = {t: i for i, t in enumerate(self._uc_txt)}
+        self._ev.update(st.get("ev") or {})
+
+    def forget_idle(self, now: int, max_idle: int):
+        for c2 in [c2 for c2, tl in self._ev.items() if now - tl.seen > max_idle]:
+            del self._ev[c2]
+        for c2 in [c2 for c2, (_cod, ts) in self._uc_pend.items() if now - ts > max_idle]:
+            del self._uc_pend[c2]
@@ -2,6 +2,13 @@
 
 var cachedApiUrl = "http://127.0.0.1:8485/data";
 
+// Identifica este navegador no /data (vários navegadores/hosts no mesmo backend)
+var cachedSourceId = "";
+
+function gerarSourceId() {
+  return "browser-" + Math.random().toString(36).slice(2, 8);
+}
+
 chrome.runtime.onInstalled.addListener(() => {
   chrome.storage.local.get("apiUrl", (result) => {
     if (!result.apiUrl) {
@@ -14,17 +21,88 @@ chrome.runtime.onInstalled.addListener(() => {
   });
 });
 
+// service worker reinicia sozinho: recarrega a config do storage a cada subida
+chrome.storage.local.get(["apiUrl", "sourceId"], (result) => {
+  if (result.apiUrl) {
+    cachedApiUrl = result.apiUrl;
+  }
+  if (result.sourceId) {
+    cachedSourceId = result.sourceId;
+  } else {
+    cachedSourceId = gerarSourceId();
+    chrome.storage.local.set({ sourceId: cachedSourceId });
+  }
+});
+
+// Reenvio: API ocupada (503) ou fora do ar tenta de novo com espera crescente
+// (25, 50, 100 ms). O backend só segura os frames seguintes da aba por
+// BET_REORDER_MS (padrão 250 ms) esperando o que falta: reenvio que chega
+// depois disso já virou buraco (frame perdido + resync da aba). Por isso a
+// soma das esperas (175 ms) fica dentro da janela; mudou BET_REORDER_MS,
+// ajuste REENVIO_BASE_MS junto.
+var MAX_TENTATIVAS = 4;
+var REENVIO_BASE_MS = 25;
+
+// "resync" do backend = buraco na sequência da aba => recarrega a aba
+// (no máximo uma vez a cada 30s por aba)
+var RESYNC_MIN_MS = 30000;
+var ultimoResync = {};
+
+function pedirResync(tabId) {
+  if (tabId == null) return;
+  var agora = Date.now();
+  if (ultimoResync[tabId] && agora - ultimoResync[tabId] < RESYNC_MIN_MS) return;
+  ultimoResync[tabId] = agora;
+  console.warn("API pediu resync, recarregando aba", tabId);
+  chrome.tabs.reload(tabId);
+}
+
+function enviarFrame(corpo, tabId, tentativa) {
+  fetch(cachedApiUrl, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: corpo
+  })
+    .then(r => {
+      if (r.status === 503) throw new Error("API ocupada (503)");
+      return r.text();
+    })
+    .then(txt => {
+      if (txt === "resync") pedirResync(tabId);
+    })
+    .catch(err => {
+      if (tentativa + 1 < MAX_TENTATIVAS) {
+        setTimeout(() => enviarFrame(corpo, tabId, tentativa + 1), REENVIO_BASE_MS * Math.pow(2, tentativa));
+      } else {
+        console.error("Error during API request:", err);
+      }
+    });
+}
+
 chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
   // Envia dados interceptados para a API Flask
   if (message.type === "SEND_HTTP") {
-    fetch(cachedApiUrl, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ data: message.data })
-    })
-      .then(r => r.text())
-      .then(txt => console.log("Response from API:", txt))
-      .catch(err => console.error("Error during API request:", err));
+    var tabId = sender.tab ? sender.tab.id : null;
+    var corpo = JSON.stringify({
+      data: message.data,
+      source: cachedSourceId,
+      tab: tabId,
+      seq: message.seq,
+      sid: message.sid
+    });
+    enviarFrame(corpo, tabId, 0);
+
+    return true;
+  }
+
+  // Atualiza o nome desta fonte
+  if (message.type === "SET_SOURCE_ID") {
+    cachedSourceId = message.sourceId || gerarSourceId();
+
+    chrome.storage.local.set({ sourceId: cachedSourceId }, () => {
+      console.log("sourceId updated to:", cachedSourceId);
+      sendResponse({ success: true });
+    });
 
     return true;
   }
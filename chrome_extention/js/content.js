@@ -13,7 +13,9 @@ window.addEventListener("sendToAPI", (event) => {
   try {
     chrome.runtime.sendMessage({
       type: "SEND_HTTP",
-      data: event.detail
+      data: event.detail.data,
+      seq: event.detail.seq,
+      sid: event.detail.sid
     });
   } catch (e) {
     console.error("content.js sendMessage error:", e);
@@ -1,11 +1,19 @@
 // js/hook.js
 
+// Sequência por carregamento da página: o backend reordena/detecta buraco
+// por (aba, sid). Reload => sid novo e seq volta para 1.
+var frameSid = Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 8);
+var frameSeq = 0;
+
 function wrap(obj, meth) {
   var orig = obj[meth];
 
   obj[meth] = function wrapper() {
     // arguments[0] contém os dados da mensagem WebSocket
-    window.dispatchEvent(new CustomEvent("sendToAPI", { detail: arguments[0] }));
+    frameSeq += 1;
+    window.dispatchEvent(new CustomEvent("sendToAPI", {
+      detail: { data: arguments[0], seq: frameSeq, sid: frameSid }
+    }));
     return orig.apply(this, arguments);
   };
 }
@@ -11,9 +11,11 @@
  *   1. Carrega a URL atual da API do storage ao abrir o popup
  *   2. Permite ao usuário editar e salvar uma nova URL
  *   3. Envia a nova URL para o background script persistir
+ *   4. Idem para o nome da fonte (source) que vai junto de cada frame
  * 
  * INTERFACE:
  *   - Campo de texto: Exibe/edita a URL da API
+ *   - Campo de texto: Exibe/edita o nome da fonte (um por navegador/host)
  *   - Botão Save: Salva a nova URL
  * 
  * COMUNICAÇÃO:
@@ -34,6 +36,7 @@
  */
 document.addEventListener("DOMContentLoaded", () => {
   const apiUrlInput = document.getElementById("apiUrl");
+  const sourceIdInput = document.getElementById("sourceId");
 
   // -------------------------------------------------------------------------
   // CARREGA URL ATUAL DO STORAGE
@@ -42,10 +45,13 @@ document.addEventListener("DOMContentLoaded", () => {
    * Obtém a URL da API salva no chrome.storage.local.
    * Se existir, preenche o campo de texto.
    */
-  chrome.storage.local.get(["apiUrl"], (result) => {
+  chrome.storage.local.get(["apiUrl", "sourceId"], (result) => {
     if (result.apiUrl) {
       apiUrlInput.value = result.apiUrl;
     }
+    if (result.sourceId) {
+      sourceIdInput.value = result.sourceId;
+    }
   });
 
   // -------------------------------------------------------------------------
@@ -68,6 +74,9 @@ document.addEventListener("DOMContentLoaded", () => {
       return;
     }
     
+    // Nome da fonte (vazio = background gera um)
+    chrome.runtime.sendMessage({ type: "SET_SOURCE_ID", sourceId: sourceIdInput.value.trim() });
+
     // Envia mensagem para o background script atualizar a URL
     chrome.runtime.sendMessage(
           { type: "SET_API_URL", apiUrl: newApiUrl },
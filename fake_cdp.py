@@ -0,0 +1,319 @@
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from typing import Dict, Set
+
+from websockets.asyncio.server import serve
+from websockets.datastructures import Headers
+from websockets.http11 import Response
+
+# ============================================================
+# FAKE CDP (browser-level) para testar o tab_manager sem abrir o Brave
+# - GET /json/version -> webSocketDebuggerUrl
+# - WS /devtools/browser/fake: Target.setDiscoverTargets, getTargets,
+#   createTarget, closeTarget (+ eventos targetCreated/targetDestroyed),
+#   attachToTarget/detachFromTarget e Page.reload na sessão (flatten),
+#   SystemInfo.getProcessInfo (cpuTime cresce com o nº de abas)
+# - destroyed_delay: targetDestroyed do closeTarget sai depois da resposta
+#   (o Chrome não garante a ordem entre os dois)
+# - latência configurável por comando para ver o paralelismo das aberturas
+#   (max_em_voo = pico de comandos atendidos ao mesmo tempo)
+# - --smoke: roda o TabManager contra o fake e confere abrir/fechar em
+#   paralelo, targetCreated/targetDestroyed e início/fim de jogo (sai com
+#   código != 0 se algo falhar)
+#
+# Ex:
+#   python fake_cdp.py --port 9333 --delay 0.3
+#   python tab_manager.py --cdp http://127.0.0.1:9333
+#   python fake_cdp.py --smoke
+#
+# Em código:
+#   async with FakeCDP(delay=0.2) as cdp:
+#       ... cdp.url / cdp.targets ...
+# ============================================================
+
+WS_PATH = "/devtools/browser/fake"
+
+
+class FakeCDP:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0, destroyed_delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.destroyed_delay = destroyed_delay
+        self.targets: Dict[str, dict] = {}
+        self.discover: Set = set()  # conexões que pediram eventos
+        self.log = []  # (método, params) na ordem em que chegaram
+        self.sessions: Dict[str, str] = {}  # sessionId -> targetId
+        self.reloads: Dict[str, int] = {}  # targetId -> nº de Page.reload
+        self.cpu_por_aba = 0.05  # núcleos que cada aba "gasta" (SystemInfo.getProcessInfo)
+        self._cpu_total = 0.0
+        self._cpu_ts = time.monotonic()
+        self._ids = itertools.count(1)
+        self._server = None
+        self.em_voo = 0
+        self.max_em_voo = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # ---------- HTTP (/json/version) ----------
+    def _http(self, conn, request):
+        if request.path.startswith("/json/version"):
+            corpo = json.dumps({
+                "Browser": "FakeCDP/1.0",
+                "Protocol-Version": "1.3",
+                "webSocketDebuggerUrl": f"ws://{self.host}:{self.port}{WS_PATH}",
+            }).encode()
+            return Response(200, "OK", Headers({"Content-Type": "application/json", "Content-Length": str(len(corpo))}), corpo)
+        if request.path.startswith("/json/list") or request.path.rstrip("/") == "/json":
+            corpo = json.dumps(list(self.targets.values())).encode()
+            return Response(200, "OK", Headers({"Content-Type": "application/json", "Content-Length": str(len(corpo))}), corpo)
+        if request.path != WS_PATH:
+            return conn.respond(404, "not found\n")
+        return None
+
+    # ---------- CDP ----------
+    async def _emitir(self, method: str, params: dict):
+        msg = json.dumps({"method": method, "params": params})
+        for ws in list(self.discover):
+            try:
+                await ws.send(msg)
+            except Exception:
+                self.discover.discard(ws)
+
+    async def _emitir_depois(self, atraso: float, method: str, params: dict):
+        await asyncio.sleep(atraso)
+        await self._emitir(method, params)
+
+    async def _comando(self, ws, method: str, params: dict, session_id: str = None) -> dict:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        if session_id is not None:
+            tid = self.sessions.get(session_id)
+            if tid is None or tid not in self.targets:
+                raise KeyError(f"Session with given id not found: {session_id}")
+            if method == "Page.reload":
+                self.reloads[tid] = self.reloads.get(tid, 0) + 1
+                return {}
+            raise NotImplementedError(f"'{method}' wasn't found")
+
+        if method == "Target.attachToTarget":
+            tid = params.get("targetId")
+            if tid not in self.targets:
+                raise KeyError(f"No target with given id found: {tid}")
+            sid = f"SESS{next(self._ids):06d}"
+            self.sessions[sid] = tid
+            return {"sessionId": sid}
+
+        if method == "Target.detachFromTarget":
+            self.sessions.pop(params.get("sessionId"), None)
+            return {}
+
+        if method == "SystemInfo.getProcessInfo":
+            agora = time.monotonic()
+            self._cpu_total += (agora - self._cpu_ts) * (0.02 + self.cpu_por_aba * len(self.targets))
+            self._cpu_ts = agora
+            return {"processInfo": [{"type": "browser", "id": 1, "cpuTime": self._cpu_total}]}
+
+        if method == "Target.setDiscoverTargets":
+            if params.get("discover"):
+                self.discover.add(ws)
+                for info in list(self.targets.values()):
+                    await ws.send(json.dumps({"method": "Target.targetCreated", "params": {"targetInfo": info}}))
+            else:
+                self.discover.discard(ws)
+            return {}
+
+        if method == "Target.getTargets":
+            return {"targetInfos": list(self.targets.values())}
+
+        if method == "Target.createTarget":
+            tid = f"FAKE{next(self._ids):06d}"
+            info = {"targetId": tid, "type": "page", "title": "", "url": params.get("url", "about:blank"), "attached": False}
+            self.targets[tid] = info
+            await self._emitir("Target.targetCreated", {"targetInfo": info})
+            return {"targetId": tid}
+
+        if method == "Target.closeTarget":
+            tid = params.get("targetId")
+            if tid not in self.targets:
+                raise KeyError(f"No target with given id found: {tid}")
+            self.targets.pop(tid)
+            if self.destroyed_delay:
+                asyncio.create_task(self._emitir_depois(self.destroyed_delay, "Target.targetDestroyed", {"targetId": tid}))
+            else:
+                await self._emitir("Target.targetDestroyed", {"targetId": tid})
+            return {"success": True}
+
+        raise NotImplementedError(f"'{method}' wasn't found")
+
+    async def _tratar(self, ws, msg: dict):
+        mid = msg.get("id")
+        method = msg.get("method", "")
+        params = msg.get("params") or {}
+        self.log.append((method, params))
+        sid = msg.get("sessionId")
+        self.em_voo += 1
+        self.max_em_voo = max(self.max_em_voo, self.em_voo)
+        try:
+            res = await self._comando(ws, method, params, sid)
+            resp = {"id": mid, "result": res}
+        except NotImplementedError as e:
+            resp = {"id": mid, "error": {"code": -32601, "message": str(e)}}
+        except Exception as e:
+            resp = {"id": mid, "error": {"code": -32000, "message": str(e)}}
+        finally:
+            self.em_voo -= 1
+        if sid is not None:
+            resp["sessionId"] = sid
+        try:
+            await ws.send(json.dumps(resp))
+        except Exception:
+            pass
+
+    async def _conexao(self, ws):
+        # cada comando numa task: respostas podem voltar fora de ordem, igual ao Chrome
+        tarefas = set()
+        try:
+            async for raw in ws:
+                t = asyncio.create_task(self._tratar(ws, json.loads(raw)))
+                tarefas.add(t)
+                t.add_done_callback(tarefas.discard)
+        finally:
+            self.discover.discard(ws)
+
+    # ---------- ciclo de vida ----------
+    async def start(self):
+        self._server = await serve(self._conexao, self.host, self.port, process_request=self._http, max_size=None)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        """Derruba o "navegador": fecha conexões e some com as abas."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self.targets.clear()
+        self.sessions.clear()
+
+    async def close_tab_externally(self, tid: str):
+        """Simula o usuário fechando a aba na mão."""
+        if self.targets.pop(tid, None) is not None:
+            await self._emitir("Target.targetDestroyed", {"targetId": tid})
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+# ============================================================
+# SMOKE: TabManager de verdade contra o fake (python fake_cdp.py --smoke)
+# ============================================================
+def _url_jogo(c2: str) -> str:
+    return f"https://www.bet365.bet.br/#/IP/EV15{c2}2C1"
+
+
+async def _esperar(cond, timeout: float, oque: str):
+    fim = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > fim:
+            raise AssertionError(f"timeout ({timeout:.1f}s) esperando: {oque}")
+        await asyncio.sleep(0.02)
+
+
+async def smoke(delay: float = 0.2, cap: int = 4) -> dict:
+    from tab_manager import Endpoint, TabManager, extract_c2
+
+    cdp = await FakeCDP(delay=delay, destroyed_delay=delay).start()
+    ep = Endpoint(cdp.url, cap, nome="fake")
+    # cooldown longo: toda reabertura rápida abaixo vem de evento, não do timeout do loop
+    mgr = TabManager([ep], max_tabs=cap, max_parallel=cap, reopen_cooldown=30.0)
+    tarefas = [asyncio.create_task(mgr.manter_endpoint(ep)), asyncio.create_task(mgr.loop_reconciliar())]
+
+    def abas():
+        return {extract_c2(t["url"]): tid for tid, t in cdp.targets.items()}
+
+    try:
+        await _esperar(lambda: ep.vivo, 5.0, "conexão com o fake")
+        jogos = [f"{100000 + i}" for i in range(cap + 2)]
+        mgr.aplicar_evento("snapshot", {"ids": [], "urls": {}})
+
+        # início de jogo: abre até a capacidade, em paralelo
+        t0 = time.monotonic()
+        for c2 in jogos:
+            mgr.aplicar_evento("event_start", {"c2": c2, "url": _url_jogo(c2)})
+        await _esperar(lambda: len(abas()) == cap and len(mgr.open_tabs) == cap, 5.0, f"{cap} abas abertas")
+        t_abrir = time.monotonic() - t0
+        assert cdp.max_em_voo > 1 and t_abrir < delay * cap, f"aberturas saíram em série ({t_abrir:.2f}s)"
+        assert set(abas()) == set(mgr.open_tabs), (abas(), mgr.open_tabs)
+
+        # aba fechada fora do manager (targetDestroyed): o jogo em espera ocupa a vaga
+        fechado = jogos[0]
+        await cdp.close_tab_externally(abas()[fechado])
+        await _esperar(lambda: fechado not in mgr.open_tabs, 2.0, "targetDestroyed da aba fechada à mão")
+        await _esperar(lambda: len(abas()) == cap and fechado not in abas(), 2.0, "vaga reocupada depois do targetDestroyed")
+
+        # aba aberta fora do manager (targetCreated): adotada, sem duplicar
+        fora = jogos[-1] if jogos[-1] not in abas() else jogos[-2]
+        await cdp._comando(None, "Target.createTarget", {"url": _url_jogo(fora)})
+        await _esperar(lambda: fora in mgr.open_tabs, 2.0, "adoção da aba aberta por fora")
+
+        # jogo novo com tudo cheio fica esperando vaga
+        novo = "100099"
+        mgr.aplicar_evento("event_start", {"c2": novo, "url": _url_jogo(novo)})
+        await asyncio.sleep(2 * delay)
+        assert novo not in abas(), "abriu acima da capacidade"
+
+        # fim de jogo: a aba fecha e o jogo em espera entra logo (targetDestroyed
+        # chega depois da resposta do closeTarget: o fechamento acorda o loop)
+        fim = [c2 for c2 in jogos if c2 in abas()][:2]
+        for c2 in fim:
+            mgr.aplicar_evento("event_end", {"c2": c2})
+        await _esperar(lambda: not set(fim) & set(abas()), 2.0, f"abas de {fim} fechadas no event_end")
+        await _esperar(lambda: novo in abas(), 4 * delay + 0.5, "jogo em espera na vaga liberada")
+        jogos.append(novo)
+
+        for c2 in jogos:
+            mgr.aplicar_evento("event_end", {"c2": c2})
+        await _esperar(lambda: not cdp.targets and not mgr.open_tabs, 3.0, "todas as abas fechadas")
+        return {"abrir_s": round(t_abrir, 3), "max_em_voo": cdp.max_em_voo,
+                "comandos": len(cdp.log), "delay": delay, "cap": cap}
+    finally:
+        for t in tarefas:
+            t.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        await cdp.stop()
+
+
+async def _main(args):
+    cdp = await FakeCDP(args.host, args.port, args.delay).start()
+    print(f"fake CDP em {cdp.url} (ws {WS_PATH})")
+    while True:
+        await asyncio.sleep(5)
+        print(f"[fake] abas abertas: {len(cdp.targets)}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9333)
+    ap.add_argument("--delay", type=float, default=0.0, help="latência (s) de cada comando CDP")
+    ap.add_argument("--smoke", action="store_true", help="roda o TabManager contra o fake e confere abrir/fechar")
+    args = ap.parse_args()
+    if args.smoke:
+        res = asyncio.run(smoke(delay=args.delay or 0.2))
+        print(f"[SMOKE] ok {res}")
+        return
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
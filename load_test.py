@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from urllib.parse import urlparse
+
+from replay_bench import frames_sinteticos
+
+# ============================================================
+# LOAD TEST LOCAL (Flask x ASGI)
+# Sobe os dois backends (ou usa URLs já rodando), semeia o estado com
+# frames sintéticos via POST /data e mede req/s e p50/p99 de GETs com
+# 1, 10 e 100 clientes concorrentes (conexões keep-alive quando o
+# servidor aceita). Opcionalmente mantém um escritor postando frames
+# durante a medição (--write-rate).
+#
+# Ex:
+#   pip install uvicorn
+#   python load_test.py --seconds 5 --clients 1,10,100
+#   python load_test.py --flask http://127.0.0.1:8485 --asgi http://127.0.0.1:8490
+# ============================================================
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+TMP = os.path.join(PASTA, ".bench_tmp")
+
+_FLASK_BOOT = (
+    "import sys, local_api as api; api.CAPTURA_GOL_ATIVA = False; "
+    "api.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True, debug=False)"
+)
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _env_servidor() -> dict:
+    env = dict(os.environ)
+    env.setdefault("BET_RAW_LOG_DIR", TMP)
+    env.setdefault("BET_GOL_DUMP_DIR", os.path.join(TMP, "gol"))
+    env.setdefault("BET_METRICS_ENABLED", "0")
+    return env
+
+
+def subir_flask(porta: int) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", _FLASK_BOOT, str(porta)], cwd=PASTA, env=_env_servidor(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def subir_asgi(porta: int) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1",
+                             "--port", str(porta), "--no-access-log", "--log-level", "warning"],
+                            cwd=PASTA, env=_env_servidor(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def esperar_porta(porta: int, timeout: float = 20.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with socket.create_connection(("127.0.0.1", porta), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"servidor não subiu na porta {porta}")
+
+
+# ------------------------------------------------------------
+# Cliente HTTP/1.1 mínimo (asyncio puro, reusa a conexão)
+# ------------------------------------------------------------
+class Conexao:
+    def __init__(self, host: str, porta: int):
+        self.host = host
+        self.porta = porta
+        self.r = None
+        self.w = None
+
+    async def _abrir(self):
+        self.r, self.w = await asyncio.open_connection(self.host, self.porta)
+
+    def fechar(self):
+        if self.w is not None:
+            self.w.close()
+        self.r = self.w = None
+
+    async def req(self, metodo: str, path: str, corpo: bytes = b"") -> int:
+        if self.w is None:
+            await self._abrir()
+        cab = f"{metodo} {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n"
+        if corpo:
+            cab += f"Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n"
+        self.w.write(cab.encode() + b"\r\n" + corpo)
+        await self.w.drain()
+
+        linha = await self.r.readline()
+        if not linha:
+            self.fechar()
+            raise ConnectionError("conexão fechada pelo servidor")
+        versao, status = linha.split(b" ", 2)[:2]
+        tamanho = None
+        fecha = versao == b"HTTP/1.0"
+        while True:
+            h = await self.r.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = h.decode("latin-1").partition(":")
+            k = k.strip().lower()
+            v = v.strip().lower()
+            if k == "content-length":
+                tamanho = int(v)
+            elif k == "connection" and v in ("close", "keep-alive"):
+                fecha = v == "close"
+        if tamanho is None:
+            await self.r.read()
+            fecha = True
+        else:
+            await self.r.readexactly(tamanho)
+        if fecha:
+            self.fechar()
+        return int(status)
+
+
+async def semear(host: str, porta: int, frames: list):
+    c = Conexao(host, porta)
+    for raw in frames:
+        await c.req("POST", "/data", json.dumps({"data": raw}).encode())
+    c.fechar()
+
+
+async def _cliente(host, porta, paths, fim, lat, erros):
+    c = Conexao(host, porta)
+    i = 0
+    while time.perf_counter() < fim:
+        path = paths[i % len(paths)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            st = await c.req("GET", path)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            c.fechar()
+            erros[0] += 1
+            continue
+        lat.append(time.perf_counter() - t0)
+        if st != 200:
+            erros[0] += 1
+    c.fechar()
+
+
+async def _escritor(host, porta, frames, fim, rate):
+    c = Conexao(host, porta)
+    i = 0
+    intervalo = 1.0 / rate
+    while time.perf_counter() < fim:
+        try:
+            await c.req("POST", "/data", json.dumps({"data": frames[i % len(frames)]}).encode())
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            c.fechar()
+        i += 1
+        await asyncio.sleep(intervalo)
+    c.fechar()
+
+
+def _quantil(ordenado: list, q: float) -> float:
+    if not ordenado:
+        return 0.0
+    return ordenado[min(len(ordenado) - 1, int(q * len(ordenado)))]
+
+
+async def medir(host, porta, paths, clientes, segundos, frames_escrita, write_rate) -> dict:
+    lat, erros = [], [0]
+    fim = time.perf_counter() + segundos
+    t0 = time.perf_counter()
+    tarefas = [_cliente(host, porta, paths, fim, lat, erros) for _ in range(clientes)]
+    if write_rate > 0:
+        tarefas.append(_escritor(host, porta, frames_escrita, fim, write_rate))
+    await asyncio.gather(*tarefas)
+    dt = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "req_s": len(lat) / dt if dt else 0.0,
+        "p50_ms": _quantil(lat, 0.50) * 1000,
+        "p99_ms": _quantil(lat, 0.99) * 1000,
+        "erros": erros[0],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--flask", default="", help="URL de um Flask já rodando (senão sobe um)")
+    ap.add_argument("--asgi", default="", help="URL de um ASGI já rodando (senão sobe com uvicorn)")
+    ap.add_argument("--clients", default="1,10,100")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--paths", default="/live,/active_ids,/markets", help="GETs em rodízio")
+    ap.add_argument("--events", type=int, default=40)
+    ap.add_argument("--seed-frames", type=int, default=2000)
+    ap.add_argument("--write-rate", type=float, default=50.0, help="frames/s postados durante a medição (0 = só leitura)")
+    args = ap.parse_args()
+
+    os.makedirs(os.path.join(TMP, "gol"), exist_ok=True)
+    frames = frames_sinteticos(args.events, args.seed_frames)
+    frames_escrita = frames_sinteticos(args.events, 5000, seed=2)[args.events + 1:]
+    paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    niveis = [int(x) for x in args.clients.split(",") if x.strip()]
+
+    procs = []
+    alvos = []
+    try:
+        for nome, url, subir in (("flask", args.flask, subir_flask), ("asgi", args.asgi, subir_asgi)):
+            if url:
+                u = urlparse(url)
+                alvos.append((nome, u.hostname, u.port))
+                continue
+            porta = porta_livre()
+            procs.append(subir(porta))
+            esperar_porta(porta)
+            alvos.append((nome, "127.0.0.1", porta))
+
+        print(f"{'backend':8} {'clientes':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'erros':>6}")
+        for nome, host, porta in alvos:
+            asyncio.run(semear(host, porta, frames))
+            time.sleep(0.5)  # escritor único do ASGI drena a fila
+            for n in niveis:
+                r = asyncio.run(medir(host, porta, paths, n, args.seconds, frames_escrita, args.write_rate))
+                print(f"{nome:8} {n:>8} {r['req_s']:>10.1f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['erros']:>6}")
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,108 @@
 import os
 import re
+import pickle
+import json
+import time
 import traceback
 import atexit
+import queue
+import threading
+import multiprocessing
+import zlib
+import fnmatch
 from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import urlencode, parse_qsl
 from collections import defaultdict, deque
 
 from flask_cors import CORS
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, g
+
+from betws.metrics import Metrics
+from betws.profiler import ProfilerBusy, StoreReport, render_collapsed, sample_alloc, sample_cpu
+from betws.shm import SnapshotPublisher, SnapshotTooLarge, pack_object
+from betws.pubsub import Broker, format_sse, sse_bytes, SSE_PING_BYTES
+from betws.feedrate import RateTracker
+from betws.sequencer import Sequencer
+from betws.persist import SnapshotError, SnapshotStale, dump_state, read_snapshot, write_snapshot
+from betws.journal import Journal, first_lsn, list_segments, read_segment, replay as replay_journal
+from betws.history import HistoryStore
+from betws.goals import GoalCapture, read_dump
+from betws.dumpjob import DumpJob
+from betws.engine import EngineLimit, EngineSet, StringTable
+from betws.delta import DeltaTracker
+from betws.ratelimit import TokenBuckets
+from betws.oddsmoves import MoveDetector
+from betws.overround import OverroundScanner
+from betws.timeline import ScoreTimeline
+from betws.markets import keyed_by_name
+from betws import flat
 
 app = Flask(__name__)
 CORS(app)
 
 # ============================================================
 # CONFIGURAÇÃO (idioma / sufixo do feed)
+# - BET_LANGS=en,cn: idiomas servidos ao mesmo tempo no mesmo processo;
+#   o primeiro é o feed padrão, os outros viram feeds com o id do idioma
 # ============================================================
-idioma = "en"
+SUFIXO_POR_IDIOMA = {"cn": "_10_0", "en": "_1_3", "gr": "_20_0"}
+IDIOMAS = [i for i in (x.strip().lower() for x in os.environ.get("BET_LANGS", "en").split(","))
+           if i in SUFIXO_POR_IDIOMA] or ["en"]
+idioma = IDIOMAS[0]
 
-if idioma == "cn":
-    DATA = {"C1A_10_0": [], "C18A_10_0": []}
-    SUFIXO = "_10_0"
-elif idioma == "en":
-    DATA = {"C1A_1_3": [], "C18A_1_3": []}
-    SUFIXO = "_1_3"
-elif idioma == "gr":
-    DATA = {"C1A_20_0": [], "C18A_20_0": []}
-    SUFIXO = "_20_0"
-else:
-    DATA = {"C1A_1_3": [], "C18A_1_3": []}
-    SUFIXO = "_1_3"
+SUFIXO = SUFIXO_POR_IDIOMA.get(idioma, "_1_3")
+DATA = {f"C1A{SUFIXO}": [], f"C18A{SUFIXO}": []}
 
 # ============================================================
 # DEBUG RÁPIDO (pra não ficar "cego")
 # ============================================================
-DEBUG_PRINT_RAW_LEN = os.environ.get("BET_DEBUG_PRINT_RAW_LEN", "1") == "1"
+DEBUG_PRINT_RAW_LEN = os.environ.get("BET_DEBUG_PRINT_RAW_LEN", "0") == "1"
 DEBUG_RAW_PREVIEW_MAX = int(os.environ.get("BET_DEBUG_RAW_PREVIEW_MAX", "20"))
 DEBUG_RAW_PREVIEW_CHARS = int(os.environ.get("BET_DEBUG_RAW_PREVIEW_CHARS", "4000"))
 ULTIMOS_RAW = deque(maxlen=DEBUG_RAW_PREVIEW_MAX)
 
+# ============================================================
+# MÉTRICAS (/metrics em formato texto do Prometheus)
+# - timers por estágio (histograma HDR) amostrados 1 a cada N frames
+# - contadores sempre exatos (frames, bytes, ignorados, exceções engolidas)
+# ============================================================
+METRICAS = Metrics(
+    enabled=os.environ.get("BET_METRICS_ENABLED", "1") == "1",
+    sample_every=int(os.environ.get("BET_METRICS_SAMPLE", "8")),
+)
+METRICAS.describe("frames_total", "Frames recebidos em /data.")
+METRICAS.describe("frame_bytes_total", "Bytes (len do raw) recebidos em /data.")
+METRICAS.describe("ignored_total", "Segmentos MG/PA ignorados pelo parser (resumo stats).")
+METRICAS.describe("exceptions_swallowed_total", "Exceções capturadas por except genérico, por estágio.")
+
+ST_FI_LEARN = METRICAS.stage("fi_learn")
+ST_PARSE_PLACAR = METRICAS.stage("parse_placar")
+ST_PARSE_ODDS = METRICAS.stage("parse_odds")
+ST_GOAL_RING = METRICAS.stage("goal_ring")
+ST_OVERROUND = METRICAS.stage("overround_scan")
+ST_BUILD_LIVE = METRICAS.stage("build_live")
+ST_BUILD_LIVE_NO_ODDS = METRICAS.stage("build_live_no_odds")
+ST_BUILD_LIVE_FILTRADO = METRICAS.stage("build_live_filtered")
+ST_BUILD_MARKETS = METRICAS.stage("build_markets")
+ST_BUILD_EXPLICAR_FRAME = METRICAS.stage("build_explicar_frame")
+ST_BUILD_TARGETS = METRICAS.stage("build_targets")
+ST_BUILD_ACTIVE_IDS = METRICAS.stage("build_active_ids")
+ST_BUILD_ACTIVE_MAP = METRICAS.stage("build_active_map")
+
+
+def contar_excecao(estagio: str):
+    METRICAS.inc("exceptions_swallowed_total", estagio=estagio)
+
+
+def no_motor_padrao(fn):
+    """Leitura fora do caminho do frame (gauge) de globais trocadas por feed
+    (MOTOR_NOMES): dentro do LOCK_ESTADO elas são sempre as do feed padrão."""
+    def ler():
+        with LOCK_ESTADO:
+            return fn()
+    return ler
+
 # ============================================================
 # LOG LEVE DO RAW (ligado)
 # ============================================================
@@ -77,6 +143,7 @@ def salvar_raw_websocket_leve(dado: str):
             f.write("\n\n")
         _BUFFER_RAW.clear()
     except:
+        contar_excecao("raw_log")
         _BUFFER_RAW.clear()
 
 
@@ -149,10 +216,149 @@ CAPTURA_GOL_ATIVA = True
 GOL_FRAMES_ANTES = int(os.environ.get("BET_GOL_FRAMES_ANTES", "40"))
 GOL_FRAMES_DEPOIS = int(os.environ.get("BET_GOL_FRAMES_DEPOIS", "40"))
 GOL_DUMP_DIR = os.environ.get("BET_GOL_DUMP_DIR", "C:/workspace/bet365-scraper/gol_dumps")
-
-RAW_RING_BY_C2 = defaultdict(lambda: deque(maxlen=GOL_FRAMES_ANTES))
-PENDING_GOAL = {}  # c2 -> {"after_left": int, "score_before": str, "score_after": str, "ts": int}
+GOL_RING_FRAMES = int(os.environ.get("BET_GOL_RING_FRAMES", "4096"))
+GOL_RING_MAX = int(os.environ.get("BET_GOL_RING_MAX", "65536"))
+
+# anel único de frames + janelas por referência (fid); dump em thread próprio
+CAPTURA_GOL = GoalCapture(GOL_DUMP_DIR, antes=GOL_FRAMES_ANTES, depois=GOL_FRAMES_DEPOIS,
+                          ring_frames=GOL_RING_FRAMES, ring_max=GOL_RING_MAX)
+atexit.register(CAPTURA_GOL.stop)
+METRICAS.gauge("goal_dumps", lambda: CAPTURA_GOL.stats["dumps"], "Janelas de gol gravadas em disco.")
+METRICAS.gauge("goal_lost_frames", lambda: CAPTURA_GOL.stats["lost_frames"],
+               "Frames de antes do gol que o anel já tinha sobrescrito quando a janela abriu.")
+METRICAS.gauge("goal_pending_windows", lambda: CAPTURA_GOL.pending(), "Janelas de gol capturando ou esperando o dump.")
 LAST_SCORE_BY_C2 = {}  # c2 -> "x-y"
+GOL_UC_PENDENTE = {}  # c2 -> ts do UC=Goal que ainda não trouxe o placar novo
+GOL_UC_ESPERA_SEG = int(os.environ.get("BET_GOAL_UC_WAIT_S", "30"))
+# worker de shard: os c2 que ele serve (None = sem shards, dono de todos).
+# Frame de placar sem dono vai para todos os shards; só o dono do jogo
+# poda, captura o gol e grava o placar no histórico
+DONOS_SHARD = None
+
+# linha do tempo de placar por jogo, montada no delta do placar
+# (segundo de jogo, placar depois, UC); /timeline e campo "timeline" do /live
+TIMELINE_CAP = int(os.environ.get("BET_TIMELINE_CAP", "16"))
+LINHA_DO_TEMPO = ScoreTimeline(TIMELINE_CAP)
+METRICAS.gauge("timeline_events", no_motor_padrao(lambda: len(LINHA_DO_TEMPO)), "Jogos com linha do tempo de placar em memória.")
+METRICAS.gauge("timeline_changes", no_motor_padrao(lambda: LINHA_DO_TEMPO.stats["changes"]), "Trocas de placar gravadas na linha do tempo.")
+
+# ============================================================
+# HISTÓRICO EM DISCO (odds por seleção + placar, SQLite)
+# o parser anota cada mudança de odd/suspenso e cada troca de placar;
+# um thread grava em lote. Leitura: /history e /history/score
+# ============================================================
+HISTORICO_ATIVO = os.environ.get("BET_HISTORY", "1") == "1"
+HISTORICO_DB = os.environ.get("BET_HISTORY_DB", os.path.join(PASTA_LOG_RAW, "historico.sqlite3"))
+HISTORICO_RETER_DIAS = float(os.environ.get("BET_HISTORY_DAYS", "7"))
+HISTORICO = None
+
+
+def iniciar_historico():
+    """Cada processo que roda processar_frame (front ou shard) grava no mesmo arquivo."""
+    global HISTORICO
+    if HISTORICO_ATIVO and HISTORICO is None:
+        os.makedirs(os.path.dirname(os.path.abspath(HISTORICO_DB)), exist_ok=True)
+        HISTORICO = HistoryStore(HISTORICO_DB).start(reter_s=HISTORICO_RETER_DIAS * 86400)
+        atexit.register(HISTORICO.stop)
+    return HISTORICO
+
+
+# ============================================================
+# MOVIMENTO DE ODDS (eventos no /stream, tópicos "odds" e "odds:<c2>")
+# o parser compara cada seleção com ela mesma antes do patch (O(1)):
+# odd que andou BET_ODDS_MOVE_ABS / BET_ODDS_MOVE_PCT% desde o último
+# evento, linha HA/HD nova, suspenso ligando/desligando
+# ============================================================
+ODDS_MOVE_ABS = float(os.environ.get("BET_ODDS_MOVE_ABS", "0"))
+ODDS_MOVE_PCT = float(os.environ.get("BET_ODDS_MOVE_PCT", "5"))
+
+
+def assinantes_odds(c2: str) -> bool:
+    return BROKER.has_subscribers("odds") or BROKER.has_subscribers(f"odds:{c2}")
+
+
+def publicar_mudanca_odds(tipo: str, evento: dict):
+    evento["type"] = tipo
+    BROKER.publish("odds", tipo, evento)
+    topico = f"odds:{evento['c2']}"
+    if BROKER.has_subscribers(topico):
+        BROKER.publish(topico, tipo, evento)
+
+
+def novo_detector_movimentos(feed: str) -> MoveDetector:
+    return MoveDetector(publicar_mudanca_odds, ODDS_MOVE_ABS, ODDS_MOVE_PCT, wants=assinantes_odds, feed=feed)
+
+
+MOVIMENTOS = novo_detector_movimentos(idioma)
+METRICAS.gauge("odds_move_tracked", no_motor_padrao(lambda: len(MOVIMENTOS)), "Seleções com odd de referência no detector de movimento.")
+for _tipo in MOVIMENTOS.stats:
+    METRICAS.gauge(f"odds_{_tipo}_events", no_motor_padrao(lambda t=_tipo: MOVIMENTOS.stats[t]),
+                   f"Eventos {_tipo} detectados no parser (com ou sem assinante).")
+
+
+# ============================================================
+# OVERROUND / ARBITRAGEM (incremental; /anomalies e tópico "anomalies")
+# o parser marca o mercado que o delta mexeu; no fim do frame só os
+# marcados são recalculados. Fora de [BET_OVERROUND_MIN, BET_OVERROUND_MAX]
+# vira anomalia (abaixo do mínimo = arbitragem); as piores ficam num heap
+# ============================================================
+OVERROUND_MIN = float(os.environ.get("BET_OVERROUND_MIN", "1.0"))
+OVERROUND_MAX = float(os.environ.get("BET_OVERROUND_MAX", "1.2"))
+OVERROUND_TOP_K = int(os.environ.get("BET_ANOMALIES_TOP", "50"))
+
+
+def novo_scanner_overround(emit=None) -> OverroundScanner:
+    # _is_totals_market é do parser (definido mais abaixo); só roda no flush
+    return OverroundScanner(OVERROUND_MIN, OVERROUND_MAX, OVERROUND_TOP_K,
+                            by_line=lambda nome: _is_totals_market(nome), emit=emit)
+
+
+OVERROUND = novo_scanner_overround(lambda tipo, rec: BROKER.publish("anomalies", tipo, rec))
+METRICAS.gauge("anomalies_open", no_motor_padrao(lambda: OVERROUND.open_count()), "Grupos de mercado com overround fora da banda.")
+
+# ============================================================
+# VERSÃO DO ESTADO
+# contador monotônico: +1 a cada frame aplicado (caches/snapshots comparam por ele)
+# - VERSAO_ESTADO é do motor ativo (trocada com o feed, ver MOTORES);
+#   VERSAO_PADRAO é a do feed padrão e nunca é trocada: quem lê sem o
+#   LOCK_ESTADO (cache de leitura, snapshot, vigia) compara com ela
+# - MOTOR_PADRAO: True nas globais do feed padrão, False nos motores extras
+# - MOTOR_PERSISTIDO: feed que entra no snapshot/journal (o padrão e os
+#   idiomas do BET_LANGS); VERSAO_PERSISTIDA anda com qualquer um deles e
+#   é o que o gravador do snapshot compara
+# ============================================================
+VERSAO_ESTADO = 0
+VERSAO_PADRAO = 0
+VERSAO_PERSISTIDA = 0
+MOTOR_PADRAO = True
+MOTOR_PERSISTIDO = True
+DELTA_MAX_LAPIDES = int(os.environ.get("BET_DELTA_TOMBSTONES", "50000"))
+
+
+def novos_deltas() -> dict:
+    """Um DeltaTracker por documento do /live (cursor do ?since= e do push)."""
+    return {
+        "live": DeltaTracker(DELTA_MAX_LAPIDES),
+        "live_sem_odds": DeltaTracker(DELTA_MAX_LAPIDES),
+    }
+
+
+DELTAS = novos_deltas()
+
+
+# escritor único segura este lock enquanto aplica frames; quem monta
+# snapshot/cache segura o mesmo lock para não ler o store pela metade
+LOCK_ESTADO = threading.RLock()
+
+
+def bump_versao_estado() -> int:
+    global VERSAO_ESTADO, VERSAO_PADRAO, VERSAO_PERSISTIDA
+    VERSAO_ESTADO += 1
+    if MOTOR_PADRAO:
+        VERSAO_PADRAO = VERSAO_ESTADO
+    if MOTOR_PERSISTIDO:
+        VERSAO_PERSISTIDA += 1
+    return VERSAO_ESTADO
 
 # ============================================================
 # TEMPO
@@ -161,6 +367,7 @@ def ts_agora_utc() -> int:
     return int(datetime.now(timezone.utc).timestamp())
 
 
+@lru_cache(maxsize=4096)
 def tu_para_ts_utc(tu: str):
     if not tu:
         return None
@@ -225,7 +432,16 @@ def _clean_line(x):
     if s is None:
         return None
     s = s.replace(" ", "")
-    return s if s != "" else None
+    return TEXTOS(s) if s != "" else None
+
+
+# Strings que se repetem em milhares de seleções e entre os feeds de idioma
+# (ids, IT, odds, linhas): um objeto só no processo inteiro
+TEXTOS = StringTable(int(os.environ.get("BET_INTERN_MAX", "500000")))
+
+
+def _clean_id(x):
+    return TEXTOS(_clean_str(x))
 
 
 def resolver_c2_por_fi(fi: str):
@@ -319,6 +535,7 @@ def inserir_evento_na_lista(it, obj, chave_categoria):
             DATA[it] = obj
 
 
+@lru_cache(maxsize=8192)
 def odds_para_decimal(od: str):
     if not od:
         return None
@@ -371,27 +588,6 @@ def _garantir_store_evento(c2: str, nome_evento: str = None):
     return st
 
 
-def dump_goal_file(c2: str):
-    try:
-        os.makedirs(GOL_DUMP_DIR, exist_ok=True)
-        pend = PENDING_GOAL.get(c2)
-        if not pend:
-            return
-
-        sb = (pend.get("score_before") or "").replace(":", "-")
-        sa = (pend.get("score_after") or "").replace(":", "-")
-        ts = str(pend.get("ts") or ts_agora_utc())
-
-        fname = f"goal_{c2}_{sb}_{sa}_{ts}.txt"
-        path = os.path.join(GOL_DUMP_DIR, fname)
-
-        buf = list(RAW_RING_BY_C2.get(c2, []))
-        with open(path, "w", encoding="utf-8") as f:
-            f.write("\n\n".join(buf))
-    except:
-        pass
-
-
 def _touch_market(mk: dict, now_ts: int):
     if isinstance(mk, dict):
         mk["_last_seen_ts"] = now_ts
@@ -440,6 +636,7 @@ def purge_goal_markets(c2: str, now_ts: int, reason: str = "goal_detected"):
         mk = mercados.pop(k, None)
         if mk:
             removed.append(k)
+            OVERROUND.forget(c2, k, now_ts)
 
     if removed:
         FRAME_LOG_POR_C2[c2].append({
@@ -608,8 +805,9 @@ def _atualizar_selecao_no_evento_por_sid(c2: str, sid: str, patch: dict, now_ts:
             if not old:
                 continue
 
+            antes = MOVIMENTOS.before(old)
             if "od_frac" in patch and _clean_str(patch.get("od_frac")):
-                old["od_frac"] = _clean_str(patch["od_frac"])
+                old["od_frac"] = _clean_id(patch["od_frac"])
                 old["od_dec"] = odds_para_decimal(old["od_frac"])
 
             if "linha_ha" in patch and patch.get("linha_ha") is not None:
@@ -623,27 +821,32 @@ def _atualizar_selecao_no_evento_por_sid(c2: str, sid: str, patch: dict, now_ts:
                 old["suspenso"] = bool(patch.get("suspenso"))
 
             if "ordem" in patch and _clean_str(patch.get("ordem")):
-                old["ordem"] = _clean_str(patch.get("ordem"))
+                old["ordem"] = _clean_id(patch.get("ordem"))
 
             if "nome" in patch and _clean_str(patch.get("nome")):
                 old["nome"] = _clean_str(patch.get("nome"))
 
             if "n2" in patch and _clean_str(patch.get("n2")):
-                old["n2"] = _clean_str(patch.get("n2"))
+                old["n2"] = _clean_id(patch.get("n2"))
 
             old["selection_id"] = sid
             if _clean_str(patch.get("selection_it")):
-                old["selection_it"] = _clean_str(patch.get("selection_it"))
+                old["selection_it"] = _clean_id(patch.get("selection_it"))
 
             if key_found != sid:
                 mp[sid] = old
 
             _touch_market(mk, now_ts)
             _touch_selection(old, now_ts)
+            if HISTORICO is not None and MOTOR_PADRAO:
+                HISTORICO.tick(c2, mk, old, now_ts)
+            MOVIMENTOS.check(c2, mk, old, antes, now_ts)
+            OVERROUND.touch(c2, mk, old)
             applied = True
 
         return applied
     except:
+        contar_excecao("delta_selecao")
         return False
 
 
@@ -660,6 +863,7 @@ def aplicar_delta_mercados_u(chave: str, kv: dict, now_ts: int):
         fi, sid = _extrair_fi_e_sid_da_chave(chave)
         if not fi or not sid:
             return None
+        sid = TEXTOS(sid)
 
         c2 = resolver_c2_por_fi(fi)
         if not c2:
@@ -700,9 +904,10 @@ def aplicar_delta_mercados_u(chave: str, kv: dict, now_ts: int):
             meta = MARKET_META_POR_FI.get(fi, {}) if fi else {}
             mk = {
                 "nome_mercado": (meta.get("market_name") or key_mk),
-                "market_id": _clean_str(meta.get("market_id")),
-                "market_it": _clean_str(meta.get("market_it")),
+                "market_id": _clean_id(meta.get("market_id")),
+                "market_it": _clean_id(meta.get("market_it")),
                 "suspenso": False,
+                "_chave": key_mk,
                 "_selecoes_map": {}
             }
             store["mercados"][key_mk] = mk
@@ -712,25 +917,30 @@ def aplicar_delta_mercados_u(chave: str, kv: dict, now_ts: int):
             mp = {}
             mk["_selecoes_map"] = mp
 
-        od_frac = _clean_str(patch.get("od_frac"))
+        od_frac = _clean_id(patch.get("od_frac"))
         sel = {
             "nome": _clean_str(patch.get("nome")),
             "od_frac": od_frac,
             "od_dec": odds_para_decimal(od_frac) if od_frac else None,
             "linha_ha": _clean_line(patch.get("linha_ha")),
             "linha_hd": _clean_line(patch.get("linha_hd")),
-            "selection_it": _clean_str(patch.get("selection_it")),
+            "selection_it": _clean_id(patch.get("selection_it")),
             "selection_id": sid,
             "suspenso": (bool(patch.get("suspenso")) if ("suspenso" in patch) else False),
-            "ordem": _clean_str(patch.get("ordem")),
-            "n2": _clean_str(patch.get("n2")),
+            "ordem": _clean_id(patch.get("ordem")),
+            "n2": _clean_id(patch.get("n2")),
         }
 
         mp[sid] = sel
         _touch_market(mk, now_ts)
         _touch_selection(sel, now_ts)
+        if HISTORICO is not None and MOTOR_PADRAO:
+            HISTORICO.tick(c2, mk, sel, now_ts)
+        MOVIMENTOS.check(c2, mk, sel, None, now_ts)
+        OVERROUND.touch(c2, mk, sel)
         return c2
     except:
+        contar_excecao("delta_mercados")
         return None
 
 
@@ -748,31 +958,52 @@ def aplicar_delta_placar(target_key, txt, touched_c2: set, now_ts: int):
         try:
             info_evt = DATA.get(target_key, {}) if isinstance(DATA.get(target_key), dict) else {}
             c2_evt = str(info_evt.get("C2", "")).strip()
-            ss_before = (LAST_SCORE_BY_C2.get(c2_evt) or "").strip() if c2_evt else ""
-            ss_now = str(info_evt.get("SS", "")).strip()
+            # placar anterior: o último visto no delta ou, no primeiro delta do
+            # jogo, o do snapshot (OVInPlay); o deste delta vem do dit (o DATA
+            # só recebe o dit mais abaixo)
+            ss_before = str((LAST_SCORE_BY_C2.get(c2_evt) if c2_evt else "") or info_evt.get("SS", "")).strip()
+            ss_now = str(dit.get("SS") or info_evt.get("SS", "")).strip()
             uc = str(dit.get("UC", "")).strip()
 
-            is_goal = False
-            if uc.lower() == "goal":
-                is_goal = True
-            elif ss_before and ss_now and ss_now != ss_before:
-                is_goal = True
+            mudou = bool(ss_before and ss_now and ss_now != ss_before)
+
+            # UC=Goal sem o placar novo já conta como gol; o SS que chega
+            # depois (até GOL_UC_ESPERA_SEG) é o mesmo gol, não outro
+            pend = GOL_UC_PENDENTE.get(c2_evt) if c2_evt else None
+            if pend is not None and (mudou or now_ts - pend > GOL_UC_ESPERA_SEG):
+                del GOL_UC_PENDENTE[c2_evt]
+                if now_ts - pend > GOL_UC_ESPERA_SEG:
+                    pend = None
+            is_goal = (uc.lower() == "goal" or mudou) and pend is None
+            dono = DONOS_SHARD is None or c2_evt in DONOS_SHARD
+            if c2_evt and is_goal and not mudou:
+                GOL_UC_PENDENTE[c2_evt] = now_ts
+            elif c2_evt and mudou and pend is not None and CAPTURA_GOL_ATIVA and dono:
+                CAPTURA_GOL.confirm(c2_evt, ss_now)
 
             if c2_evt and ss_now:
                 LAST_SCORE_BY_C2[c2_evt] = ss_now
+                if HISTORICO is not None and MOTOR_PADRAO and dono and ss_now != ss_before:
+                    HISTORICO.score(c2_evt, ss_now, ss_before, now_ts)
+
+            if c2_evt:
+                if ss_before and ss_now and ss_now != ss_before:
+                    info_pos = dict(info_evt)
+                    info_pos.update(dit)
+                    LINHA_DO_TEMPO.record(c2_evt, ss_before, ss_now, segundos_de_jogo(info_pos, now_ts),
+                                          _int_ou_zero(info_pos.get("MD")), uc, now_ts)
+                else:
+                    if uc:
+                        LINHA_DO_TEMPO.mark_uc(c2_evt, uc, now_ts)
+                    LINHA_DO_TEMPO.seen(c2_evt, now_ts)
 
-            if c2_evt and is_goal:
+            if c2_evt and is_goal and dono:
                 purge_goal_markets(c2_evt, now_ts, reason="score_change")
 
                 if CAPTURA_GOL_ATIVA:
-                    PENDING_GOAL[c2_evt] = {
-                        "after_left": GOL_FRAMES_DEPOIS,
-                        "score_before": ss_before,
-                        "score_after": ss_now,
-                        "ts": now_ts
-                    }
+                    CAPTURA_GOL.goal(c2_evt, ss_before, ss_now, now_ts)
         except:
-            pass
+            contar_excecao("deteccao_gol")
 
         if isinstance(DATA.get(target_key), dict):
             DATA[target_key].update(dit)
@@ -876,15 +1107,12 @@ def _remover_chars_controle(s: str) -> str:
 
 
 def _sanitizar_mercados(obj):
+    # só desce em dict/list: escalar (a maior parte das chaves de uma seleção) não paga chamada
     if isinstance(obj, dict):
-        novo = {}
-        for k, v in obj.items():
-            if isinstance(k, str) and k.startswith("_"):
-                continue
-            novo[k] = _sanitizar_mercados(v)
-        return novo
+        return {k: (_sanitizar_mercados(v) if isinstance(v, (dict, list)) else v)
+                for k, v in obj.items() if not (isinstance(k, str) and k.startswith("_"))}
     if isinstance(obj, list):
-        return [_sanitizar_mercados(x) for x in obj]
+        return [_sanitizar_mercados(x) if isinstance(x, (dict, list)) else x for x in obj]
     return obj
 
 
@@ -893,53 +1121,10 @@ def _mk_key(market_it: str, market_id: str, market_name: str):
     return nome
 
 
-def _normalizar_nome_mercado(nome: str) -> str:
-    nome = _clean_str(nome) or "Mercado Desconhecido"
-    nome = re.sub(r"\s+", " ", nome.strip())
-    return nome
-
-
-def _mercados_com_chave_por_nome(mercados: dict) -> dict:
-    if not isinstance(mercados, dict):
-        return {}
-
-    out = {}
-    contagem = defaultdict(int)
-
-    for _k, mk in mercados.items():
-        if not isinstance(mk, dict):
-            continue
-
-        nome = _normalizar_nome_mercado(mk.get("nome_mercado"))
-        market_id = _clean_str(mk.get("market_id"))
-        market_it = _clean_str(mk.get("market_it"))
-
-        key_nome = nome
-
-        if key_nome in out:
-            if market_id:
-                key_nome = f"{nome} [{market_id}]"
-            elif market_it:
-                key_nome = f"{nome} [{market_it}]"
-            else:
-                contagem[nome] += 1
-                key_nome = f"{nome} (#{contagem[nome] + 1})"
-
-        i = 2
-        base = key_nome
-        while key_nome in out:
-            key_nome = f"{base} (#{i})"
-            i += 1
-
-        out[key_nome] = mk
-
-    return out
-
-
 def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
     resumo = {
         "applied": {"c2": None, "event": None, "fi": None, "market_key": None},
-        "stats": {"ev": 0, "mg": 0, "pa": 0, "ignored": 0, "upserts": 0},
+        "stats": {"ev": 0, "mg": 0, "pa": 0, "ignored": 0, "ignored_mg": 0, "ignored_pa": 0, "upserts": 0},
         "notes": [],
     }
 
@@ -976,9 +1161,10 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
         if not mk:
             mk = {
                 "nome_mercado": (nome_mercado or "Mercado Desconhecido").strip(),
-                "market_id": _clean_str(market_id),
-                "market_it": _clean_str(market_it),
+                "market_id": _clean_id(market_id),
+                "market_it": _clean_id(market_it),
                 "suspenso": False,
+                "_chave": key_mk,  # chave no store (o scanner de overround agrupa por ela)
                 "_selecoes_map": {}
             }
             store["mercados"][key_mk] = mk
@@ -986,9 +1172,9 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
             if nome_mercado:
                 mk["nome_mercado"] = (nome_mercado or mk.get("nome_mercado") or "Mercado Desconhecido").strip()
             if market_id:
-                mk["market_id"] = _clean_str(market_id)
+                mk["market_id"] = _clean_id(market_id)
             if market_it:
-                mk["market_it"] = _clean_str(market_it)
+                mk["market_it"] = _clean_id(market_it)
             if "_selecoes_map" not in mk:
                 mk["_selecoes_map"] = {}
         return mk
@@ -1008,6 +1194,7 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
 
         mp = mk["_selecoes_map"]
         old = mp.get(key)
+        antes = MOVIMENTOS.before(old) if old else None
 
         if not old:
             mp[key] = selecao
@@ -1016,8 +1203,8 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
             resumo["stats"]["upserts"] += 1
             old = selecao
         else:
-            if _clean_str(selecao.get("od_frac")):
-                old["od_frac"] = _clean_str(selecao["od_frac"])
+            if selecao.get("od_frac"):
+                old["od_frac"] = selecao["od_frac"]
                 old["od_dec"] = odds_para_decimal(old["od_frac"])
 
             if selecao.get("linha_ha") is not None:
@@ -1034,10 +1221,10 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
 
             if _clean_str(selecao.get("nome")):
                 old["nome"] = _clean_str(selecao["nome"])
-            if _clean_str(selecao.get("n2")):
-                old["n2"] = _clean_str(selecao["n2"])
-            if _clean_str(selecao.get("ordem")):
-                old["ordem"] = _clean_str(selecao.get("ordem"))
+            if selecao.get("n2"):
+                old["n2"] = selecao["n2"]
+            if selecao.get("ordem"):
+                old["ordem"] = selecao["ordem"]
 
             if sid:
                 old["selection_id"] = sid
@@ -1048,6 +1235,10 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
             resumo["stats"]["upserts"] += 1
 
         _touch_selection(old, now_ts)
+        if HISTORICO is not None and MOTOR_PADRAO:
+            HISTORICO.tick(c2_do_evento, mk, old, now_ts)
+        MOVIMENTOS.check(c2_do_evento, mk, old, antes, now_ts)
+        OVERROUND.touch(c2_do_evento, mk, old)
 
     for p in parts:
         p = p.strip()
@@ -1096,6 +1287,7 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
                         nome_evento = NOME_EVENTO_POR_FI.get(fi_corrente)
             if not c2_evento:
                 resumo["stats"]["ignored"] += 1
+                resumo["stats"]["ignored_mg"] += 1
                 continue
 
             if fi_corrente:
@@ -1156,6 +1348,7 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
 
             if not c2_evento:
                 resumo["stats"]["ignored"] += 1
+                resumo["stats"]["ignored_pa"] += 1
                 continue
 
             if fi_corrente:
@@ -1180,30 +1373,33 @@ def parse_odds_e_linhas_do_raw(raw: str, now_ts: int):
 
             if mercado_atual is None:
                 resumo["stats"]["ignored"] += 1
+                resumo["stats"]["ignored_pa"] += 1
                 continue
 
             _touch_market(mercado_atual, now_ts)
 
-            od_frac = _clean_str(d.get("OD"))
+            od_frac = _clean_id(d.get("OD"))
             selecao = {
                 "nome": _clean_str(d.get("NA")),
                 "od_frac": od_frac,
                 "od_dec": odds_para_decimal(od_frac) if od_frac else None,
                 "linha_ha": _clean_line(d.get("HA")),
                 "linha_hd": _clean_line(d.get("HD")),
-                "selection_it": _clean_str(d.get("IT")),
-                "selection_id": _clean_str(d.get("ID")),
+                "selection_it": _clean_id(d.get("IT")),
+                "selection_id": _clean_id(d.get("ID")),
                 "suspenso": (str(d.get("SU", "")).strip() == "1"),
-                "ordem": _clean_str(d.get("OR")),
-                "n2": _clean_str(d.get("N2")),
+                "ordem": _clean_id(d.get("OR")),
+                "n2": _clean_id(d.get("N2")),
             }
 
             if _is_placeholder_selection(selecao):
                 resumo["stats"]["ignored"] += 1
+                resumo["stats"]["ignored_pa"] += 1
                 continue
 
             if not (selecao["nome"] or selecao["od_frac"] or selecao["linha_ha"] or selecao["linha_hd"] or selecao["selection_id"]):
                 resumo["stats"]["ignored"] += 1
+                resumo["stats"]["ignored_pa"] += 1
                 continue
 
             upsert_selecao(mercado_atual, selecao, c2_evento, fi_corrente)
@@ -1239,6 +1435,7 @@ def gc_stale_for_event(c2: str, now_ts: int):
         if mk_last and (now_ts - mk_last) >= STALE_REMOVE_AFTER_SEC:
             mercados.pop(mk_key, None)
             removed_mk.append(mk_key)
+            OVERROUND.forget(c2, mk_key, now_ts)
 
     if removed_mk:
         FRAME_LOG_POR_C2[c2].append({
@@ -1377,7 +1574,119 @@ def _sintetizar_nome_selecao(market_name: str, event_name: str, sel: dict, pos:
 # ============================================================
 # BUILDER DO /live
 # ============================================================
-def dados_soccer_ao_vivo(incluir_odds: bool = True):
+def duracao_minutos_liga(liga: str) -> int:
+    """'Esoccer Battle - 8 mins play' -> 8; sem a marca, 90."""
+    if "mins play" in liga:
+        try:
+            return int(liga.split(" - ")[1].split(" ")[0])
+        except:
+            return 90
+    return 90
+
+
+def _agregar_selecoes_mercado(mk: dict, event_name: str):
+    """Monta mk["selecoes"] (ordenadas, nomes sintéticos) a partir do _selecoes_map e espelha o suspenso."""
+    if not isinstance(mk, dict):
+        return
+    mp = mk.get("_selecoes_map", {})
+    if not isinstance(mp, dict):
+        return
+    vistos = set()
+    lst = []
+    for ssel in mp.values():
+        if not isinstance(ssel, dict):
+            continue
+        sid = _clean_str(ssel.get("selection_id")) or _clean_str(ssel.get("selection_it")) or ""
+        if sid and sid in vistos:
+            continue
+        if sid:
+            vistos.add(sid)
+
+        ssel["nome"] = _clean_str(ssel.get("nome"))
+        ssel["linha_ha"] = _clean_line(ssel.get("linha_ha"))
+        ssel["linha_hd"] = _clean_line(ssel.get("linha_hd"))
+        ssel["od_frac"] = _clean_str(ssel.get("od_frac"))
+        if ssel.get("od_frac"):
+            ssel["od_dec"] = odds_para_decimal(ssel["od_frac"])
+
+        ssel["selection_id"] = _clean_str(ssel.get("selection_id"))
+        ssel["selection_it"] = _clean_str(ssel.get("selection_it"))
+        ssel["ordem"] = _clean_str(ssel.get("ordem"))
+        ssel["n2"] = _clean_str(ssel.get("n2"))
+
+        if _is_placeholder_selection(ssel):
+            continue
+
+        if not (ssel.get("selection_id") or ssel.get("selection_it") or ssel.get("od_frac") or ssel.get("nome") or ssel.get("linha_ha") or ssel.get("linha_hd")):
+            continue
+
+        lst.append(ssel)
+
+    def ordem_int(x):
+        try:
+            return int(str(x.get("ordem", "")).strip())
+        except:
+            return 999999
+
+    lst.sort(key=lambda x: (ordem_int(x), str(x.get("nome") or "")))
+
+    # >>> AJUSTE: nomes sintéticos quando nome==null
+    mk_nome = mk.get("nome_mercado")
+    total = len(lst)
+    for i, sel in enumerate(lst):
+        _sintetizar_nome_selecao(mk_nome, event_name, sel, i, total)
+
+    mk["selecoes"] = lst
+    mk["suspenso"] = (len(lst) > 0 and all(bool(x.get("suspenso")) for x in lst))
+
+
+def _next_goal_do_evento(mercados_by_name: dict, score, event_name: str = None, agregados=()) -> dict:
+    """
+    "Próximo gol" (ex: 12th Goal) com odds oficiais.
+    event_name: mercados ainda não agregados (leitura filtrada); agrega só o
+    achado, se ele não estiver em `agregados`.
+    """
+    total_goals = _parse_total_goals_from_score(score)
+    if total_goals is None:
+        return {
+            "expected_market": None,
+            "market_name_found": None,
+            "selecoes": [],
+            "reason": "invalid_score",
+        }
+    out = _find_next_goal_market(mercados_by_name, total_goals + 1)  # ex: 11 -> 12
+    achado = out.get("market_name_found")
+    if event_name is not None and achado in mercados_by_name and achado not in agregados:
+        mk = mercados_by_name[achado]
+        _agregar_selecoes_mercado(mk, event_name)
+        out["selecoes"] = mk.get("selecoes", [])
+    return out
+
+
+def _mercado_no_filtro(nome: str, filtro: dict) -> bool:
+    padroes = filtro["padroes"]
+    return padroes is None or any(p.match(nome) for p in padroes)
+
+
+def _int_ou_zero(v) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+
+def segundos_de_jogo(info: dict, agora_ts: int) -> int:
+    """Relógio do jogo em segundos: TM:TS e, com o relógio andando (TT=1), o tempo desde TU."""
+    base = max(0, _int_ou_zero(info.get("TM"))) * 60 + max(0, _int_ou_zero(info.get("TS")))
+    if _int_ou_zero(info.get("TT")) == 1:
+        inicio_ts = tu_para_ts_utc(info.get("TU", ""))
+        if inicio_ts is not None:
+            base += max(0, agora_ts - inicio_ts)
+    return base
+
+
+def dados_soccer_ao_vivo(incluir_odds: bool = True, filtro: dict = None):
+    """filtro: ver parse_filtro_leitura (None = /live inteiro)."""
     lista = []
     ev_lst = DATA.get(f"C1A{SUFIXO}", [])
     if not isinstance(ev_lst, list):
@@ -1394,34 +1703,24 @@ def dados_soccer_ao_vivo(incluir_odds: bool = True):
             liga = info.get("CT", "")
             if "Esoccer" not in liga:
                 continue
+            if filtro is not None and filtro["c2"] is not None and str(info.get("C2", "")).strip() not in filtro["c2"]:
+                continue
 
-            TU = info.get("TU", "")
             TT = int(info.get("TT", 0))
             TS = int(info.get("TS", 0))
             TM = int(info.get("TM", 0))
             MD = info.get("MD", "")
 
             indexar_ids_evento_se_existirem(info)
-            inicio_ts = tu_para_ts_utc(TU)
 
             if TM == 0 and TT == 0:
                 tempo_rel = "00:00"
             else:
-                if TT == 1 and inicio_ts is not None:
-                    elapsed = max(0, agora_ts - inicio_ts)
-                    base = max(0, TM) * 60 + max(0, TS)
-                    total = base + elapsed
-                    tempo_rel = f"{int(total // 60)}:{int(total % 60):02d}"
-                else:
-                    tempo_rel = f"{TM}:{TS:02d}"
+                # mesmo relógio da linha do tempo de placar
+                total = segundos_de_jogo(info, agora_ts)
+                tempo_rel = f"{total // 60}:{total % 60:02d}"
 
-            if "mins play" in liga:
-                try:
-                    total_mins = int(liga.split(" - ")[1].split(" ")[0])
-                except:
-                    total_mins = 90
-            else:
-                total_mins = 90
+            total_mins = duracao_minutos_liga(liga)
 
             if TM == total_mins / 2 and TS == 0 and TT == 0 and MD == "1":
                 periodo = "Intervalo"
@@ -1460,133 +1759,123 @@ def dados_soccer_ao_vivo(incluir_odds: bool = True):
             }
             if c2:
                 evento["match_url"] = montar_url_partida_por_c2(c2)
+                linha = LINHA_DO_TEMPO.compact(c2)
+                if linha is not None:
+                    evento["timeline"] = linha
 
-            if incluir_odds and c2 and c2 in DADOS_MERCADO_POR_EVENTO:
+            if c2 and c2 in DADOS_MERCADO_POR_EVENTO and (incluir_odds if filtro is None else filtro["odds"]):
                 if STALE_ENABLED:
                     gc_stale_for_event(c2, agora_ts)
 
                 mercados_internos = DADOS_MERCADO_POR_EVENTO[c2].get("mercados", {})
-
-                # monta selecoes e espelha suspenso (apenas agregação)
-                for mk in (mercados_internos or {}).values():
-                    if not isinstance(mk, dict):
-                        continue
-                    mp = mk.get("_selecoes_map", {})
-                    if not isinstance(mp, dict):
-                        continue
-
-                    vistos = set()
-                    lst = []
-                    for ssel in mp.values():
-                        if not isinstance(ssel, dict):
-                            continue
-                        sid = _clean_str(ssel.get("selection_id")) or _clean_str(ssel.get("selection_it")) or ""
-                        if sid and sid in vistos:
-                            continue
-                        if sid:
-                            vistos.add(sid)
-
-                        ssel["nome"] = _clean_str(ssel.get("nome"))
-                        ssel["linha_ha"] = _clean_line(ssel.get("linha_ha"))
-                        ssel["linha_hd"] = _clean_line(ssel.get("linha_hd"))
-                        ssel["od_frac"] = _clean_str(ssel.get("od_frac"))
-                        if ssel.get("od_frac"):
-                            ssel["od_dec"] = odds_para_decimal(ssel["od_frac"])
-
-                        ssel["selection_id"] = _clean_str(ssel.get("selection_id"))
-                        ssel["selection_it"] = _clean_str(ssel.get("selection_it"))
-                        ssel["ordem"] = _clean_str(ssel.get("ordem"))
-                        ssel["n2"] = _clean_str(ssel.get("n2"))
-
-                        if _is_placeholder_selection(ssel):
-                            continue
-
-                        if not (ssel.get("selection_id") or ssel.get("selection_it") or ssel.get("od_frac") or ssel.get("nome") or ssel.get("linha_ha") or ssel.get("linha_hd")):
-                            continue
-
-                        lst.append(ssel)
-
-                    def ordem_int(x):
-                        try:
-                            return int(str(x.get("ordem", "")).strip())
-                        except:
-                            return 999999
-
-                    lst.sort(key=lambda x: (ordem_int(x), str(x.get("nome") or "")))
-
-                    # >>> AJUSTE: nomes sintéticos quando nome==null
-                    mk_nome = mk.get("nome_mercado")
-                    total = len(lst)
-                    for i, sel in enumerate(lst):
-                        _sintetizar_nome_selecao(mk_nome, event_name, sel, i, total)
-
-                    mk["selecoes"] = lst
-                    mk["suspenso"] = (len(lst) > 0 and all(bool(x.get("suspenso")) for x in lst))
-
-                mercados_by_name = _mercados_com_chave_por_nome(mercados_internos)
-                evento["mercados"] = mercados_by_name
-
-                # =========================
-                # NOVO: extrair "próximo gol" (ex: 12th Goal) com odds oficiais
-                # =========================
-                total_goals = _parse_total_goals_from_score(evento.get("score"))
-                if total_goals is not None:
-                    next_n = total_goals + 1  # ex: 11 -> 12
-                    evento["next_goal"] = _find_next_goal_market(mercados_by_name, next_n)
+                if filtro is None:
+                    # monta selecoes e espelha suspenso (apenas agregação)
+                    for mk in (mercados_internos or {}).values():
+                        _agregar_selecoes_mercado(mk, event_name)
+                    mercados_by_name = keyed_by_name(mercados_internos)
+                    evento["mercados"] = mercados_by_name
+                    evento["next_goal"] = _next_goal_do_evento(mercados_by_name, evento.get("score"))
                 else:
-                    evento["next_goal"] = {
-                        "expected_market": None,
-                        "market_name_found": None,
-                        "selecoes": [],
-                        "reason": "invalid_score",
-                    }
+                    # só agrega os mercados que vão sair na resposta
+                    mercados_by_name = keyed_by_name(mercados_internos)
+                    escolhidos = {}
+                    if filtro["mercados"]:
+                        escolhidos = {n: mk for n, mk in mercados_by_name.items() if _mercado_no_filtro(n, filtro)}
+                        for mk in escolhidos.values():
+                            _agregar_selecoes_mercado(mk, event_name)
+                        evento["mercados"] = escolhidos
+                    if filtro["next_goal"]:
+                        evento["next_goal"] = _next_goal_do_evento(mercados_by_name, evento.get("score"), event_name, escolhidos)
+
+            if filtro is not None and filtro["campos"]:
+                evento = {k: v for k, v in evento.items() if k in filtro["campos"] or k == "event_id"}
 
             lista.append(evento)
 
         except Exception:
+            contar_excecao("live_evento")
             continue
 
     return _sanitizar_mercados(lista)
 
 
 # ============================================================
-# ROTAS
+# TAXA DE FEED POR EVENTO (frames/s e bytes/s por c2)
+# uma aba aberta = um c2, então é a taxa por aba que o tab_manager usa
+# para decidir quais abas valem a vaga
 # ============================================================
-@app.route("/data", methods=["POST"])
-def handle_data():
-    data = request.json or {}
-    raw = data.get("data", "")
-    now_ts = ts_agora_utc()
+FEED_RATE_TAU = float(os.environ.get("BET_FEED_RATE_TAU", "10"))
+TAXA_FRAMES_POR_C2 = RateTracker(FEED_RATE_TAU)
+TAXA_BYTES_POR_C2 = RateTracker(FEED_RATE_TAU)
 
-    try:
-        if DEBUG_PRINT_RAW_LEN:
-            print("RAW len:", len(raw))
-    except:
-        pass
 
-    try:
-        if raw:
-            ULTIMOS_RAW.append({
-                "ts": now_ts,
-                "len": len(raw),
-                "preview": raw[:DEBUG_RAW_PREVIEW_CHARS]
-            })
-    except:
-        pass
+# sem frame de mercado há mais que isso (aba aberta) = feed parado
+FEED_STALL_SEG = int(os.environ.get("BET_FEED_STALL_S", "30"))
+
+
+def registrar_taxa_feed(touched: set, raw: str, now_ts: int):
+    if not touched:
+        return
+    # frame com vários eventos (overview) divide o tamanho entre eles
+    n_bytes = len(raw) / len(touched)
+    for c2 in touched:
+        TAXA_FRAMES_POR_C2.hit(c2, now_ts)
+        TAXA_BYTES_POR_C2.hit(c2, now_ts, n_bytes)
+
+
+def taxas_feed_local(c2s=None) -> dict:
+    agora_ts = ts_agora_utc()
+    out = {}
+    for c2 in (TAXA_FRAMES_POR_C2.keys() if c2s is None else c2s):
+        st = DADOS_MERCADO_POR_EVENTO.get(c2)
+        out[c2] = {
+            "frames_s": round(TAXA_FRAMES_POR_C2.rate(c2, agora_ts), 3),
+            "bytes_s": round(TAXA_BYTES_POR_C2.rate(c2, agora_ts), 1),
+            "frames_total": int(TAXA_FRAMES_POR_C2.total(c2)),
+            "ultimo_ts": TAXA_FRAMES_POR_C2.last(c2),
+            "mercados": len(st.get("mercados", {})) if isinstance(st, dict) else 0,
+        }
+    return out
+
+
+def podar_taxas_feed(max_idle: int = 1800):
+    agora_ts = ts_agora_utc()
+    TAXA_FRAMES_POR_C2.prune(agora_ts, max_idle)
+    TAXA_BYTES_POR_C2.prune(agora_ts, max_idle)
+    if HISTORICO is not None and MOTOR_PADRAO:
+        HISTORICO.forget_idle(agora_ts, max_idle)
+    MOVIMENTOS.forget_idle(agora_ts, max_idle)
+    OVERROUND.forget_idle(agora_ts, max_idle)
+    LINHA_DO_TEMPO.forget_idle(agora_ts, max_idle)
+    CAPTURA_GOL.prune()
+    podar_fontes(agora_ts, max_idle)
+
 
+# ============================================================
+# INGESTÃO DE UM FRAME (usado pelo /data, pelos shards e pelo replay)
+# ============================================================
+def processar_frame(raw: str, now_ts: int, salvar_raw: bool = True) -> set:
+    """
+    Aplica um frame raw do WS em todos os stores e devolve o set de c2 tocados.
+    """
     touched_events = set()
 
     # aprende FI_inplay <-> FI_delta em todo frame recebido
+    t0 = ST_FI_LEARN.start()
     try:
         if raw:
             aprender_fi_para_c2_no_mesmo_frame(raw)
     except:
-        pass
+        contar_excecao("fi_learn")
+    ST_FI_LEARN.stop(t0)
 
     try:
-        salvar_raw_websocket_leve(raw)
+        if salvar_raw:
+            salvar_raw_websocket_leve(raw)
 
+        t0 = ST_PARSE_PLACAR.start()
         touched = parse_frames_placar_ao_vivo(raw, now_ts)
+        ST_PARSE_PLACAR.stop(t0)
         for c2 in (touched or set()):
             touched_events.add(c2)
             FRAME_LOG_POR_C2[c2].append({
@@ -1594,11 +1883,19 @@ def handle_data():
                 "summary": {"type": "U_delta_applied", "c2": c2}
             })
     except Exception as e:
+        contar_excecao("parse_placar")
         print("ERRO handle_data (deltas):", repr(e))
         traceback.print_exc()
 
     try:
+        t0 = ST_PARSE_ODDS.start()
         resumo = parse_odds_e_linhas_do_raw(raw, now_ts)
+        ST_PARSE_ODDS.stop(t0)
+        stats = (resumo or {}).get("stats", {})
+        if stats.get("ignored_mg"):
+            METRICAS.inc("ignored_total", stats["ignored_mg"], tag="MG")
+        if stats.get("ignored_pa"):
+            METRICAS.inc("ignored_total", stats["ignored_pa"], tag="PA")
         c2 = (resumo or {}).get("applied", {}).get("c2")
         if c2:
             touched_events.add(c2)
@@ -1607,125 +1904,1431 @@ def handle_data():
                 "summary": resumo,
             })
     except:
-        pass
+        contar_excecao("parse_odds")
 
-    # ring buffer para dump de gol
+    # anel de frames para o dump de gol (o evento guarda só o fid)
+    if CAPTURA_GOL_ATIVA:
+        t0 = ST_GOAL_RING.start()
+        try:
+            CAPTURA_GOL.frame(raw, now_ts, touched_events)
+        except:
+            contar_excecao("goal_ring")
+        ST_GOAL_RING.stop(t0)
+
+    t0 = ST_OVERROUND.start()
     try:
-        if raw and touched_events:
-            for c2x in touched_events:
-                RAW_RING_BY_C2[c2x].append(raw)
-
-                pend = PENDING_GOAL.get(c2x)
-                if pend:
-                    pend["after_left"] = int(pend.get("after_left") or 0) - 1
-                    if pend["after_left"] <= 0:
-                        dump_goal_file(c2x)
-                        PENDING_GOAL.pop(c2x, None)
-    except:
-        pass
+        OVERROUND.flush(now_ts)
+    except Exception:
+        contar_excecao("overround")
+    ST_OVERROUND.stop(t0)
 
-    return "1"
+    registrar_taxa_feed(touched_events, raw, now_ts)
+    bump_versao_estado()
+    return touched_events
 
 
-@app.route("/debug_raw", methods=["GET"])
-def debug_raw():
-    return jsonify(list(ULTIMOS_RAW)), 200
+# ============================================================
+# MODO SHARDED (BET_SHARDS=N > 0)
+# - este processo vira só "front": aprende FI->shard e roteia cada frame
+# - N processos worker rodam processar_frame() com stores próprios
+# - /live (e demais leituras) juntam as saídas cacheadas de cada shard
+#
+# Roteamento:
+# - snapshot OVInPlay e frames de placar de eventos sem dono -> todos os shards
+#   (o placar é barato e todo shard precisa de DATA para montar /live e
+#   detectar gol; o caro é MG/PA/delta de odds, que vai só pro dono).
+#   Todos detectam o gol, mas só o shard dono do c2 poda os mercados,
+#   grava o dump e o histórico (DONOS_SHARD)
+# - frames com mercado (MG/PA/delta OV<FI>-<SID>) -> shard dono do grupo de FIs
+#   (FIs que aparecem no mesmo frame ficam no mesmo shard, como em
+#   aprender_fi_para_c2_no_mesmo_frame)
+# ============================================================
+SHARDS = int(os.environ.get("BET_SHARDS", "0"))
+
+_RE_FI_SEGMENTO = re.compile(r"[;|]FI=(\d{6,})")
+
+
+class ShardRouter:
+    def __init__(self, n: int):
+        self.n = n
+        self.dono_por_fi = {}  # FI -> índice do shard
+
+    def rotear(self, raw: str):
+        """
+        Retorna (shards_destino, shards_dono). shards_dono recebem o frame
+        marcado como "dono" (os c2 tocados passam a ser servidos por eles).
+        """
+        todos = range(self.n)
+        if "OVInPlay" in raw:
+            return todos, ()
+
+        s = _remover_chars_controle(raw)
+        fis_delta = set(m.group(1) for m in _RE_FI_IN_DELTAKEY.finditer(s))
+        fis_inplay = set(m.group(1) for m in _RE_FI_INPLAY_KEY.finditer(s))
+        fis_seg = set(_RE_FI_SEGMENTO.findall(s))
+        fis = fis_delta | fis_inplay | fis_seg
+        if not fis:
+            return todos, ()
+
+        tem_mercado = bool(fis_delta) or ("PA;" in s) or ("MG;" in s)
+        donos = {self.dono_por_fi[fi] for fi in fis if fi in self.dono_por_fi}
+        sem_dono = [fi for fi in fis if fi not in self.dono_por_fi]
+
+        if tem_mercado:
+            if sem_dono:
+                alvo = min(donos) if donos else (zlib.crc32(min(sem_dono).encode()) % self.n)
+                for fi in sem_dono:
+                    self.dono_por_fi[fi] = alvo
+                donos.add(alvo)
+            return donos, donos
+
+        # só placar/tempo: dono recebe; FI sem dono ainda -> todos
+        if sem_dono:
+            return todos, donos
+        return donos, donos
+
+
+def _shard_worker_main(idx: int, q_in, q_out, isolado: bool = False):
+    """
+    Loop do processo worker. Frames e leituras chegam pela mesma fila, então
+    uma leitura sempre enxerga todos os frames enviados antes dela.
+    isolado=True: estado separado do ao vivo (job do /process_dump), sem
+    histórico nem captura de gol.
+    """
+    global CAPTURA_GOL_ATIVA, DONOS_SHARD
+    donos = DONOS_SHARD = set()  # c2 servidos por este shard
+    versao = 0
+    if isolado:
+        CAPTURA_GOL_ATIVA = False
+    else:
+        iniciar_historico()
+    cache_live = {}  # incluir_odds -> (versao, agora_ts, lista)
 
+    while True:
+        msg = q_in.get()
+        tipo = msg[0]
 
-@app.route("/live", methods=["GET"])
-def live_event():
-    incluir_odds = request.args.get("odds", "1") != "0"
-    lista = dados_soccer_ao_vivo(incluir_odds=incluir_odds)
-    return jsonify(lista), 200
+        if tipo == "frames":
+            for raw, now_ts, dono in msg[1]:
+                try:
+                    touched = processar_frame(raw, now_ts, salvar_raw=False)
+                except Exception:
+                    contar_excecao("shard_frame")
+                    continue
+                if dono and touched:
+                    donos.update(touched)
+                versao += 1
+            continue
 
+        if tipo == "live":
+            incluir_odds, versao_cliente, filtro = msg[1], msg[2], msg[3]
+            agora_ts = ts_agora_utc()
+            chave = (incluir_odds, filtro["chave"] if filtro else None)
+            ent = cache_live.get(chave)
+            if not ent or ent[0] != versao or ent[1] != agora_ts:
+                ent = (versao, agora_ts, dados_soccer_ao_vivo(incluir_odds=incluir_odds, filtro=filtro))
+                if len(cache_live) >= 64:
+                    cache_live.clear()
+                cache_live[chave] = ent
+            if versao_cliente == (versao, agora_ts):
+                q_out.put(((versao, agora_ts), None, None))
+            else:
+                q_out.put(((versao, agora_ts), ent[2], list(donos)))
+            continue
 
-@app.route("/markets", methods=["GET"])
-def markets():
-    c2 = (request.args.get("c2") or "").strip()
-    if c2:
-        st = DADOS_MERCADO_POR_EVENTO.get(c2, {})
-        if isinstance(st, dict) and "mercados" in st:
-            st = dict(st)
-            st["mercados"] = _mercados_com_chave_por_nome(st.get("mercados", {}))
-        return jsonify(_sanitizar_mercados(st)), 200
-    return jsonify(_sanitizar_mercados(DADOS_MERCADO_POR_EVENTO)), 200
+        if tipo == "markets":
+            c2 = msg[1]
+            if c2:
+                st = DADOS_MERCADO_POR_EVENTO.get(c2, {})
+                if isinstance(st, dict) and "mercados" in st:
+                    st = dict(st)
+                    st["mercados"] = keyed_by_name(st.get("mercados", {}))
+                q_out.put((c2 in donos, _sanitizar_mercados(st)))
+            else:
+                q_out.put((None, _sanitizar_mercados({k: v for k, v in DADOS_MERCADO_POR_EVENTO.items() if k in donos})))
+            continue
 
+        if tipo == "feed":
+            q_out.put(taxas_feed_local([c2 for c2 in donos if TAXA_FRAMES_POR_C2.last(c2) is not None]))
+            continue
 
-@app.route("/explicar_frame", methods=["GET"])
-def explicar_frame():
-    c2 = (request.args.get("c2") or "").strip()
-    if not c2:
-        return jsonify({"erro": "Informe o parâmetro ?c2=ID_DO_EVENTO"}), 400
+        if tipo == "anomalias":
+            q_out.put(anomalias_locais(msg[1], msg[2]))
+            continue
 
-    frames = list(FRAME_LOG_POR_C2.get(c2, []))
-    snapshot = DADOS_MERCADO_POR_EVENTO.get(c2, {})
+        if tipo == "timeline":
+            q_out.put(timeline_local(msg[1]))
+            continue
 
-    return jsonify(_sanitizar_mercados({
-        "evento_c2": c2,
-        "frames_capturados": len(frames),
-        "frames": frames,
-        "snapshot_atual": snapshot,
-        "politica_suspenso": {
-            "pareado_com_bet": True,
-            "regra": "suspenso só muda quando SU vem no feed (PA.SU ou delta U com SU).",
-            "no_goal_suspend": "NÃO suspende mercados no gol; faz PURGE de goal markets ao detectar gol.",
-            "gc": {
-                "enabled": STALE_ENABLED,
-                "obs": "Se ligado, GC só REMOVE mercados antigos; não seta suspenso."
-            }
-        }
-    })), 200
+        if tipo == "explicar":
+            c2 = msg[1]
+            q_out.put((c2 in donos, list(FRAME_LOG_POR_C2.get(c2, [])), _sanitizar_mercados(DADOS_MERCADO_POR_EVENTO.get(c2, {}))))
+            continue
 
+        if tipo == "snapshot":
+            q_out.put((dump_state(estado_para_snapshot()), list(donos)))
+            continue
 
-@app.route("/targets", methods=["GET"])
-def targets():
-    limit = int(request.args.get("limit", "15"))
+        if tipo == "restore":
+            restaurar_estado(pickle.loads(msg[1]))
+            donos.clear()
+            donos.update(msg[2])
+            versao += 1
+            q_out.put(True)
+            continue
 
-    cooldown = request.args.get("cooldown")
-    if cooldown is not None:
+        if tipo == "stop":
+            if HISTORICO is not None:
+                HISTORICO.stop()  # processo filho sai sem rodar atexit
+            CAPTURA_GOL.stop()
+            q_out.put(True)
+            return
+
+
+class ShardPool:
+    """
+    Front do modo sharded: processos worker + roteador + agregador das leituras.
+    Frames são agrupados em lotes por shard (até `lote` frames ou até a próxima
+    leitura) para diluir o custo de pickle/fila por frame.
+    """
+
+    def __init__(self, n: int, lote: int = 32, isolado: bool = False):
+        ctx = multiprocessing.get_context("spawn")
+        self.n = n
+        self.lote = max(1, lote)
+        self.router = ShardRouter(n)
+        self.q_in = [ctx.Queue() for _ in range(n)]
+        self.q_out = [ctx.Queue() for _ in range(n)]
+        self.locks = [threading.Lock() for _ in range(n)]
+        self.pendentes = [[] for _ in range(n)]
+        self.lock_rota = threading.Lock()
+        self.cache_live = {}  # (incluir_odds, chave do filtro, shard) -> (versao, lista, donos)
+        self.procs = []
+        for i in range(n):
+            pr = ctx.Process(target=_shard_worker_main, args=(i, self.q_in[i], self.q_out[i], isolado),
+                             name=f"bet-{'isolado' if isolado else 'shard'}-{i}", daemon=True)
+            pr.start()
+            self.procs.append(pr)
+
+    # ---------- escrita ----------
+    def enviar(self, raw: str, now_ts: int):
+        if not raw:
+            return
+        with self.lock_rota:
+            destinos, donos = self.router.rotear(raw)
+            for i in destinos:
+                pend = self.pendentes[i]
+                pend.append((raw, now_ts, i in donos))
+                if len(pend) >= self.lote:
+                    self.q_in[i].put(("frames", pend))
+                    self.pendentes[i] = []
+
+    def flush(self):
+        with self.lock_rota:
+            for i in range(self.n):
+                if self.pendentes[i]:
+                    self.q_in[i].put(("frames", self.pendentes[i]))
+                    self.pendentes[i] = []
+
+    def _rpc(self, i: int, msg):
+        with self.locks[i]:
+            self.q_in[i].put(msg)
+            return self.q_out[i].get()
+
+    # ---------- leitura ----------
+    def live(self, incluir_odds: bool = True, filtro: dict = None) -> list:
+        self.flush()
+        por_shard = []
+        for i in range(self.n):
+            chave = (incluir_odds, filtro["chave"] if filtro else None, i)
+            ant = self.cache_live.get(chave)
+            versao, lista, donos = self._rpc(i, ("live", incluir_odds, ant[0] if ant else None, filtro))
+            if lista is None and ant:
+                lista, donos = ant[1], ant[2]
+            else:
+                self.cache_live[chave] = (versao, lista, donos)
+            por_shard.append((lista or [], set(donos or ())))
+
+        # junta: evento de c2 com dono vem do shard dono; sem dono, do primeiro que tiver
+        escolhido = {}
+        ordem = []
+        for i, (lista, donos) in enumerate(por_shard):
+            for ev in lista:
+                c2 = ev.get("event_id")
+                if c2 not in escolhido:
+                    ordem.append(c2)
+                    escolhido[c2] = ev
+                elif c2 in donos:
+                    escolhido[c2] = ev
+        return [escolhido[c2] for c2 in ordem]
+
+    def markets(self, c2: str = ""):
+        self.flush()
+        if c2:
+            fallback = {}
+            for i in range(self.n):
+                dono, st = self._rpc(i, ("markets", c2))
+                if dono:
+                    return st
+                fallback = fallback or st
+            return fallback
+        out = {}
+        for i in range(self.n):
+            out.update(self._rpc(i, ("markets", ""))[1])
+        return out
+
+    def feed(self) -> dict:
+        self.flush()
+        out = {}
+        for i in range(self.n):
+            out.update(self._rpc(i, ("feed",)))
+        return out
+
+    def anomalias(self, k: int, c2: str = "") -> dict:
+        self.flush()
+        docs = [self._rpc(i, ("anomalias", k, c2)) for i in range(self.n)]
+        if c2:
+            # o dono do jogo é quem tem os mercados
+            return max(docs, key=lambda d: len(d["markets"]))
+        todas = sorted((a for d in docs for a in d["anomalies"]), key=lambda a: a["score"], reverse=True)
+        stats = {}
+        for d in docs:
+            for nome, v in d["stats"].items():
+                stats[nome] = stats.get(nome, 0) + v
+        return {"anomalies": todas[:k], "open": sum(d["open"] for d in docs), "stats": stats}
+
+    def timeline(self, c2: str) -> dict:
+        self.flush()
+        # o placar do jogo vai para um shard só: vale o que tem a linha mais longa
+        docs = [self._rpc(i, ("timeline", c2)) for i in range(self.n)]
+        return max(docs, key=lambda d: (len(d["goals"]), bool(d["score"])))
+
+    def explicar(self, c2: str):
+        self.flush()
+        fallback = ([], {})
+        for i in range(self.n):
+            dono, frames, snap = self._rpc(i, ("explicar", c2))
+            if dono:
+                return frames, snap
+            if frames and not fallback[0]:
+                fallback = (frames, snap)
+        return fallback
+
+    def snapshot(self) -> list:
+        """[(estado_pickle, donos), ...] um por shard."""
+        return self.pedir_snapshot()()
+
+    def pedir_snapshot(self):
+        """
+        Enfileira o pedido em todos os shards e devolve a função que espera as
+        respostas. A fila de cada shard é FIFO: o estado devolvido é o dos
+        frames enviados até o pedido, mesmo que a resposta seja lida depois
+        (o front pode soltar o lock do estado entre uma coisa e outra).
+        """
+        self.flush()
+        for lk in self.locks:
+            lk.acquire()
         try:
-            cd = int(cooldown)
-            if cd >= 0:
-                global TEMPO_ESPERA_TARGETS_SEG
-                TEMPO_ESPERA_TARGETS_SEG = cd
-        except:
-            pass
+            for i in range(self.n):
+                self.q_in[i].put(("snapshot",))
+        except BaseException:
+            for lk in self.locks:
+                lk.release()
+            raise
+
+        def coletar() -> list:
+            try:
+                return [self.q_out[i].get() for i in range(self.n)]
+            finally:
+                for lk in self.locks:
+                    lk.release()
+        return coletar
+
+    def restore(self, shards: list):
+        for i, (estado, donos) in enumerate(shards):
+            self._rpc(i, ("restore", estado, donos))
+        self.cache_live.clear()
+
+    def stop(self):
+        self.flush()
+        for i in range(self.n):
+            try:
+                self._rpc(i, ("stop",))
+            except Exception:
+                pass
+        for pr in self.procs:
+            pr.join(timeout=5)
 
-    agora_ts = ts_agora_utc()
-    live = dados_soccer_ao_vivo(incluir_odds=False)
 
-    urls = []
-    for ev in live:
-        c2 = str(ev.get("event_id", "")).strip()
-        if not c2:
-            continue
+SHARD_POOL = None
 
-        if not deve_enviar_target(c2, agora_ts):
-            continue
 
-        urls.append(montar_url_partida_por_c2(c2))
-        ULTIMO_ENVIO_TARGET_TS[c2] = agora_ts
+def iniciar_shards(n: int = SHARDS):
+    global SHARD_POOL
+    if n > 0 and SHARD_POOL is None:
+        SHARD_POOL = ShardPool(n, lote=int(os.environ.get("BET_SHARD_BATCH", "32")))
+    return SHARD_POOL
 
-        if len(urls) >= limit:
-            break
 
-    return jsonify({"urls": urls}), 200
+def dados_live(incluir_odds: bool = True, filtro: dict = None) -> list:
+    """Builder do /live: local, ou agregado dos shards no modo sharded."""
+    if SHARD_POOL is not None and MOTOR_PADRAO:
+        return SHARD_POOL.live(incluir_odds=incluir_odds, filtro=filtro)
+    return dados_soccer_ao_vivo(incluir_odds=incluir_odds, filtro=filtro)
 
 
-@app.route("/active_ids", methods=["GET"])
-def active_ids():
-    live = dados_soccer_ao_vivo(incluir_odds=False)
-    ids = []
+# ============================================================
+# SNAPSHOT EM MEMÓRIA COMPARTILHADA (BET_SHM_NAME=nome)
+# - uma thread publica /live e /markets já serializados num double buffer
+# - read_server.py serve HTTP direto desse buffer, em outros processos
+# - /markets?c2= não é publicado: o /markets vai com índice por c2 e o
+#   read_server recorta o jogo e põe a chave por nome ele mesmo (publicar
+#   as duas formas dobrava o payload e o dumps disputava o GIL da ingestão)
+# - publica quando VERSAO_ESTADO muda (no máximo a cada BET_SHM_PUBLISH_MS)
+#   e pelo menos 1x por segundo (o "time" do /live anda com o relógio)
+# ============================================================
+SHM_NAME = os.environ.get("BET_SHM_NAME", "").strip()
+SHM_CAPACIDADE = int(float(os.environ.get("BET_SHM_MB", "64")) * 1024 * 1024)
+SHM_PUBLISH_MS = int(os.environ.get("BET_SHM_PUBLISH_MS", "200"))
+
+ST_SHM_PUBLISH = METRICAS.stage("shm_publish")
+
+
+def montar_docs_snapshot() -> dict:
+    """Documentos publicados: live, live_sem_odds, markets e markets#idx (c2 -> pedaço)."""
+    dumps = app.json.dumps
+    docs = {
+        "live": dumps(dados_live(incluir_odds=True)).encode("utf-8"),
+        "live_sem_odds": dumps(dados_live(incluir_odds=False)).encode("utf-8"),
+    }
+    if SHARD_POOL is not None:
+        mercados = SHARD_POOL.markets("")
+    else:
+        mercados = _sanitizar_mercados(DADOS_MERCADO_POR_EVENTO)
+    # um dumps por jogo, juntados: mesmo texto do dumps(mercados)
+    docs["markets"], docs["markets#idx"] = pack_object(
+        {c2: dumps(st).encode("utf-8") for c2, st in mercados.items()},
+        lambda c2: dumps(c2).encode("utf-8"))
+    return docs
+
+
+class PublicadorSnapshot(threading.Thread):
+    def __init__(self, nome: str, capacidade: int, intervalo_ms: int):
+        super().__init__(name="shm-publisher", daemon=True)
+        self.pub = SnapshotPublisher(nome, capacidade)
+        self.intervalo = max(10, intervalo_ms) / 1000.0
+        self.parar = threading.Event()
+        self.versao_publicada = -1
+        self.segundo_publicado = -1
+
+    def publicar_agora(self):
+        t0 = ST_SHM_PUBLISH.start()
+        with LOCK_ESTADO:
+            versao = VERSAO_ESTADO
+            docs = montar_docs_snapshot()
+        try:
+            n = self.pub.publish(versao, docs)
+            METRICAS.inc("shm_publish_total")
+            METRICAS.inc("shm_publish_bytes_total", n)
+        except SnapshotTooLarge:
+            METRICAS.inc("shm_publish_skipped_total")
+        ST_SHM_PUBLISH.stop(t0)
+        self.versao_publicada = versao
+        self.segundo_publicado = ts_agora_utc()
+
+    def run(self):
+        while not self.parar.wait(self.intervalo):
+            try:
+                if VERSAO_PADRAO != self.versao_publicada or ts_agora_utc() != self.segundo_publicado:
+                    self.publicar_agora()
+            except Exception:
+                contar_excecao("shm_publish")
+
+    def stop(self):
+        self.parar.set()
+        self.pub.close()
+
+
+PUBLICADOR_SHM = None
+
+
+def iniciar_publicador_shm():
+    global PUBLICADOR_SHM
+    if SHM_NAME and PUBLICADOR_SHM is None:
+        PUBLICADOR_SHM = PublicadorSnapshot(SHM_NAME, SHM_CAPACIDADE, SHM_PUBLISH_MS)
+        PUBLICADOR_SHM.start()
+        atexit.register(PUBLICADOR_SHM.stop)
+    return PUBLICADOR_SHM
+
+
+# ============================================================
+# SNAPSHOT DO ESTADO EM DISCO (restart a quente)
+# - a cada BET_SNAPSHOT_S segundos (e na saída) grava stores + índices
+#   num arquivo binário (pickle, troca atômica)
+# - na subida carrega o snapshot se ele tiver menos de
+#   BET_SNAPSHOT_MAX_AGE_S: os índices FI/selection já estão prontos e os
+#   U-deltas caem no mercado certo sem recarregar as abas
+# - modo sharded: cada worker serializa o próprio estado e o front grava
+#   tudo num arquivo só, junto com o roteador (FI -> shard)
+# ============================================================
+SNAPSHOT_PATH = os.environ.get("BET_SNAPSHOT_PATH", os.path.join(PASTA_LOG_RAW, "estado.snap"))
+SNAPSHOT_SEG = float(os.environ.get("BET_SNAPSHOT_S", "30"))  # 0 desliga
+SNAPSHOT_MAX_AGE_SEG = float(os.environ.get("BET_SNAPSHOT_MAX_AGE_S", "300"))
+SNAPSHOT_FORMATO = 1
+
+ST_SNAPSHOT_DUMP = METRICAS.stage("snapshot_dump")
+METRICAS.describe("snapshot_total", "Snapshots do estado gravados em disco, por resultado.")
+METRICAS.describe("snapshot_restore_total", "Tentativas de restaurar o snapshot na subida, por resultado.")
+
+SNAPSHOT_INFO = {"ts": None, "bytes": 0, "dump_ms": 0.0, "restaurado": None}
+METRICAS.gauge("snapshot_age_seconds",
+               lambda: (time.time() - SNAPSHOT_INFO["ts"]) if SNAPSHOT_INFO["ts"] else -1,
+               "Idade do último snapshot gravado (-1 = nenhum).")
+METRICAS.gauge("snapshot_bytes", lambda: SNAPSHOT_INFO["bytes"], "Tamanho do último snapshot gravado.")
+
+
+def estado_para_snapshot() -> dict:
+    """Stores e índices deste processo (chamar com LOCK_ESTADO)."""
+    return {
+        "DATA": DATA,
+        "EVENTO_C2_PARA_OI": EVENTO_C2_PARA_OI,
+        "EVENTO_POR_FI": EVENTO_POR_FI,
+        "NOME_EVENTO_POR_FI": NOME_EVENTO_POR_FI,
+        "MERCADO_ATUAL_POR_FI": MERCADO_ATUAL_POR_FI,
+        "MARKET_META_POR_FI": MARKET_META_POR_FI,
+        "SELECTION_ID_TO_C2": SELECTION_ID_TO_C2,
+        "DADOS_MERCADO_POR_EVENTO": DADOS_MERCADO_POR_EVENTO,
+        "FI_INPLAY_TO_DELTA_FIS": dict(FI_INPLAY_TO_DELTA_FIS),
+        "LAST_SCORE_BY_C2": LAST_SCORE_BY_C2,
+        "LINHA_DO_TEMPO": LINHA_DO_TEMPO.state(),
+        # deque(maxlen) de defaultdict com lambda não pickla: vira lista
+        "FRAME_LOG_POR_C2": {c2: list(d) for c2, d in FRAME_LOG_POR_C2.items()},
+        "TAXA_FRAMES_POR_C2": TAXA_FRAMES_POR_C2._ent,
+        "TAXA_BYTES_POR_C2": TAXA_BYTES_POR_C2._ent,
+    }
+
+
+def restaurar_estado(estado: dict):
+    """Repõe os stores no lugar (mesmos objetos: quem guardou referência continua valendo)."""
+    with LOCK_ESTADO:
+        for nome, alvo in (
+            ("DATA", DATA),
+            ("EVENTO_C2_PARA_OI", EVENTO_C2_PARA_OI),
+            ("EVENTO_POR_FI", EVENTO_POR_FI),
+            ("NOME_EVENTO_POR_FI", NOME_EVENTO_POR_FI),
+            ("MERCADO_ATUAL_POR_FI", MERCADO_ATUAL_POR_FI),
+            ("MARKET_META_POR_FI", MARKET_META_POR_FI),
+            ("SELECTION_ID_TO_C2", SELECTION_ID_TO_C2),
+            ("DADOS_MERCADO_POR_EVENTO", DADOS_MERCADO_POR_EVENTO),
+            ("FI_INPLAY_TO_DELTA_FIS", FI_INPLAY_TO_DELTA_FIS),
+            ("LAST_SCORE_BY_C2", LAST_SCORE_BY_C2),
+            ("TAXA_FRAMES_POR_C2", TAXA_FRAMES_POR_C2._ent),
+            ("TAXA_BYTES_POR_C2", TAXA_BYTES_POR_C2._ent),
+        ):
+            alvo.clear()
+            alvo.update(estado.get(nome) or {})
+        FRAME_LOG_POR_C2.clear()
+        for c2, frames in (estado.get("FRAME_LOG_POR_C2") or {}).items():
+            FRAME_LOG_POR_C2[c2].extend(frames)
+        for st in DADOS_MERCADO_POR_EVENTO.values():
+            for k, mk in ((st or {}).get("mercados") or {}).items():
+                if isinstance(mk, dict):
+                    mk.setdefault("_chave", k)  # snapshot de antes do _chave
+        LINHA_DO_TEMPO.load(estado.get("LINHA_DO_TEMPO"))
+        bump_versao_estado()
+
+
+def estados_dos_idiomas() -> dict:
+    """feed -> estado_para_snapshot() dos idiomas extras do BET_LANGS (chamar com LOCK_ESTADO)."""
+    out = {}
+    for feed in IDIOMAS[1:]:
+        with MOTORES.use(feed):
+            out[feed] = estado_para_snapshot()
+    return out
+
+
+def restaurar_idiomas(estados):
+    if isinstance(estados, bytes):
+        estados = pickle.loads(estados)  # modo sharded: já vem serializado
+    for feed, estado in (estados or {}).items():
+        if feed not in IDIOMAS[1:]:
+            continue  # idioma que saiu do BET_LANGS
+        with LOCK_ESTADO, MOTORES.use(feed):
+            restaurar_estado(estado)
+
+
+def montar_snapshot():
+    """
+    (payload, lsn): payload do snapshot (processo único ou front + shards) e
+    o último lsn do journal que ele cobre. O journal vira de segmento no
+    mesmo lock, então o segmento novo começa exatamente em lsn + 1.
+    """
+    t0 = ST_SNAPSHOT_DUMP.start()
+    coletar = None
+    try:
+        with LOCK_ESTADO:
+            lsn = JOURNAL.lsn if JOURNAL is not None else 0
+            if SHARD_POOL is not None:
+                # no lock só o lsn, o roteador e o pedido aos shards; o estado
+                # deles (já serializado no worker) chega fora do lock. Os idiomas
+                # extras moram neste processo: serializados aqui dentro
+                doc = {
+                    "formato": SNAPSHOT_FORMATO,
+                    "lsn": lsn,
+                    "router": dict(SHARD_POOL.router.dono_por_fi),
+                    "feeds": dump_state(estados_dos_idiomas()),
+                }
+                coletar = SHARD_POOL.pedir_snapshot()
+            else:
+                doc = {"formato": SNAPSHOT_FORMATO, "lsn": lsn, "estado": estado_para_snapshot(),
+                       "feeds": estados_dos_idiomas()}
+                payload = dump_state(doc)
+            if JOURNAL is not None:
+                JOURNAL.rotate()
+    finally:
+        if coletar is not None:
+            doc["shards"] = coletar()  # sempre: solta os locks dos shards
+    if coletar is not None:
+        payload = dump_state(doc)
+    ST_SNAPSHOT_DUMP.stop(t0)
+    return payload, lsn
+
+
+def salvar_snapshot(path: str = None) -> int:
+    path = path or SNAPSHOT_PATH
+    try:
+        t0 = time.perf_counter()
+        payload, lsn = montar_snapshot()
+        SNAPSHOT_INFO["dump_ms"] = (time.perf_counter() - t0) * 1000.0
+        n = write_snapshot(path, payload)
+    except Exception:
+        METRICAS.inc("snapshot_total", resultado="erro")
+        contar_excecao("snapshot_save")
+        return 0
+    if JOURNAL is not None and path == SNAPSHOT_PATH:
+        JOURNAL.drop_before(lsn + 1)  # o snapshot já cobre esses segmentos
+    SNAPSHOT_INFO["ts"] = time.time()
+    SNAPSHOT_INFO["bytes"] = n
+    METRICAS.inc("snapshot_total", resultado="ok")
+    return n
+
+
+def carregar_snapshot(path: str = None, max_age: float = None) -> bool:
+    """Chamar na subida, depois de iniciar_shards() e antes de aceitar frames."""
+    path = path or SNAPSHOT_PATH
+    max_age = SNAPSHOT_MAX_AGE_SEG if max_age is None else max_age
+    t0 = time.perf_counter()
+    try:
+        lido = read_snapshot(path, max_age=max_age)
+    except SnapshotStale as e:
+        METRICAS.inc("snapshot_restore_total", resultado="velho")
+        print(f"[snapshot] ignorado: {e}")
+        return False
+    except (SnapshotError, OSError) as e:
+        METRICAS.inc("snapshot_restore_total", resultado="erro")
+        print(f"[snapshot] ignorado: {e}")
+        return False
+    if lido is None:
+        METRICAS.inc("snapshot_restore_total", resultado="ausente")
+        return False
+
+    doc, ts = lido
+    if not isinstance(doc, dict) or doc.get("formato") != SNAPSHOT_FORMATO:
+        METRICAS.inc("snapshot_restore_total", resultado="erro")
+        print("[snapshot] ignorado: formato diferente")
+        return False
+
+    shards = doc.get("shards")
+    n_atual = SHARD_POOL.n if SHARD_POOL is not None else 0
+    if (shards is not None and len(shards) != n_atual) or (shards is None and n_atual):
+        # trocar o nº de shards (ou ligar/desligar) muda quem é dono de cada FI
+        METRICAS.inc("snapshot_restore_total", resultado="shards_diferentes")
+        print("[snapshot] ignorado: nº de shards diferente do snapshot")
+        return False
+
+    if shards is not None:
+        with LOCK_ESTADO:
+            SHARD_POOL.router.dono_por_fi.update(doc.get("router") or {})
+            SHARD_POOL.restore(shards)
+            bump_versao_estado()
+    else:
+        restaurar_estado(doc.get("estado") or {})
+    restaurar_idiomas(doc.get("feeds"))
+
+    SNAPSHOT_INFO["restaurado"] = {"ts": ts, "idade_s": round(time.time() - ts, 1), "lsn": doc.get("lsn", 0),
+                                   "ms": round((time.perf_counter() - t0) * 1000.0, 1)}
+    METRICAS.inc("snapshot_restore_total", resultado="ok")
+    print(f"[snapshot] restaurado de {path} ({SNAPSHOT_INFO['restaurado']['idade_s']}s atrás, "
+          f"{SNAPSHOT_INFO['restaurado']['ms']} ms)")
+    return True
+
+
+class GravadorSnapshot(threading.Thread):
+    def __init__(self, intervalo: float = SNAPSHOT_SEG):
+        super().__init__(name="snapshot-writer", daemon=True)
+        self.intervalo = intervalo
+        self.parar = threading.Event()
+        self.ultima_versao = None
+
+    def gravar(self):
+        if VERSAO_PERSISTIDA == self.ultima_versao:
+            return
+        versao = VERSAO_PERSISTIDA
+        if salvar_snapshot():
+            self.ultima_versao = versao
+
+    def run(self):
+        while not self.parar.wait(self.intervalo):
+            self.gravar()
+
+    def stop(self):
+        self.parar.set()
+        self.gravar()
+
+
+GRAVADOR_SNAPSHOT = None
+
+
+# ============================================================
+# JOURNAL (WAL) DOS FRAMES APLICADOS
+# - aplicar_frame_recebido() (o caminho único de escrita) anota cada frame
+#   já na ordem final (depois do reordenador) com o now_ts usado
+# - processar_frame é determinístico dado (raw, now_ts): reaplicar a cauda
+#   do journal sobre o snapshot reconstrói o mesmo estado
+# - group commit (fsync a cada BET_JOURNAL_COMMIT_MS) num thread próprio;
+#   cada snapshot vira o segmento e apaga os que ele já cobre
+# - "journal recente" na recuperação é pela hora da escrita (mtime do
+#   último segmento com registro), não pelo ts do frame: o /process_dump
+#   com target=live anota os frames com o ts gravado no arquivo
+# ============================================================
+JOURNAL_ATIVO = os.environ.get("BET_JOURNAL", "1") == "1"
+JOURNAL_DIR = os.environ.get("BET_JOURNAL_DIR", os.path.join(PASTA_LOG_RAW, "journal"))
+JOURNAL_COMMIT_MS = float(os.environ.get("BET_JOURNAL_COMMIT_MS", "10"))
+JOURNAL = None
+
+METRICAS.describe("journal_replay_total", "Frames reaplicados do journal na recuperação.")
+METRICAS.gauge("journal_lsn", lambda: JOURNAL.lsn if JOURNAL is not None else 0, "Último lsn anotado no journal.")
+METRICAS.gauge("journal_unsynced_records",
+               lambda: (JOURNAL.lsn - JOURNAL.lsn_duravel) if JOURNAL is not None else 0,
+               "Registros do journal ainda sem fsync (perdidos num crash agora).")
+METRICAS.gauge("journal_commits", lambda: JOURNAL.stats["commits"] if JOURNAL is not None else 0,
+               "Group commits (write + fsync) feitos pelo journal.")
+
+
+def registro_journal_feed(feed: str, raw: str) -> str:
+    """Frame de um idioma extra no journal: \\x00<feed>\\x00<frame> (o do feed padrão vai cru)."""
+    return f"\x00{feed}\x00{raw}"
+
+
+def ler_registro_journal(payload: bytes) -> tuple:
+    """(feed, raw) de um registro do journal; feed None = feed padrão."""
+    txt = payload.decode("utf-8")
+    if txt.startswith("\x00"):
+        feed, _, raw = txt[1:].partition("\x00")
+        return feed, raw
+    return None, txt
+
+
+def _ultimo_ts_journal(pasta: str):
+    """Hora (epoch) da última escrita no journal; None sem registro nenhum."""
+    for _, path in reversed(list_segments(pasta)):
+        regs, _ = read_segment(path)
+        if regs:
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return None
+    return None
+
+
+def _descartar_persistencia(pasta: str):
+    """Journal/snapshot velhos não podem voltar num próximo restart."""
+    for _, path in list_segments(pasta):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    try:
+        os.remove(SNAPSHOT_PATH)
+    except OSError:
+        pass
+
+
+def recuperar_estado(pasta: str = None) -> dict:
+    """
+    Snapshot + cauda do journal. Sem journal recente, vale a regra de idade
+    do snapshot; com journal recente o snapshot pode ser mais velho, desde
+    que o journal continue do lsn dele sem buraco.
+    """
+    pasta = pasta or JOURNAL_DIR
+    agora = time.time()
+    ultimo_ts = _ultimo_ts_journal(pasta)
+    journal_fresco = ultimo_ts is not None and agora - ultimo_ts <= SNAPSHOT_MAX_AGE_SEG
+
+    restaurado = carregar_snapshot(max_age=float("inf") if journal_fresco else None)
+    lsn_base = SNAPSHOT_INFO["restaurado"]["lsn"] if restaurado else 0
+    out = {"snapshot": restaurado, "lsn_base": lsn_base, "replay": 0}
+
+    primeiro = first_lsn(pasta)
+    if not journal_fresco or primeiro is None:
+        if not restaurado:
+            _descartar_persistencia(pasta)
+        return out
+    if primeiro > lsn_base + 1:
+        print(f"[journal] buraco entre o snapshot (lsn {lsn_base}) e o journal (lsn {primeiro}): sem replay")
+        return out
+
+    global CAPTURA_GOL_ATIVA
+    captura, CAPTURA_GOL_ATIVA = CAPTURA_GOL_ATIVA, False  # gol já capturado antes do crash
+    t0 = time.perf_counter()
+    try:
+        for _, ts, payload in replay_journal(pasta, lsn_base):
+            try:
+                feed, raw = ler_registro_journal(payload)
+                if feed is not None and feed not in IDIOMAS[1:]:
+                    continue  # idioma que saiu do BET_LANGS
+                aplicar_frame_recebido(raw, ts, replay=True, feed=feed)
+            except Exception:
+                contar_excecao("journal_replay")
+            out["replay"] += 1
+    finally:
+        CAPTURA_GOL_ATIVA = captura
+    METRICAS.inc("journal_replay_total", out["replay"])
+    out["replay_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    print(f"[journal] {out['replay']} frames reaplicados depois do lsn {lsn_base} ({out['replay_ms']} ms)")
+    return out
+
+
+def iniciar_persistencia():
+    """Recupera (snapshot + journal), abre o journal e liga a gravação periódica do snapshot."""
+    global GRAVADOR_SNAPSHOT, JOURNAL
+    if SNAPSHOT_SEG <= 0 or GRAVADOR_SNAPSHOT is not None:
+        return GRAVADOR_SNAPSHOT
+    if JOURNAL_ATIVO:
+        recuperar_estado()
+        JOURNAL = Journal(JOURNAL_DIR, commit_ms=JOURNAL_COMMIT_MS).open()
+        atexit.register(JOURNAL.close)
+    else:
+        carregar_snapshot()
+    GRAVADOR_SNAPSHOT = GravadorSnapshot(SNAPSHOT_SEG)
+    GRAVADOR_SNAPSHOT.ultima_versao = VERSAO_PERSISTIDA
+    GRAVADOR_SNAPSHOT.start()
+    atexit.register(GRAVADOR_SNAPSHOT.stop)
+    return GRAVADOR_SNAPSHOT
+
+
+# ============================================================
+# BUILDERS DAS LEITURAS (compartilhados entre Flask e ASGI)
+# ============================================================
+# ------------------------------------------------------------
+# Fontes (um navegador/host por fonte): a extensão manda "source"
+# (configurável no popup); sem isso, vale o IP de quem postou
+# ------------------------------------------------------------
+MAX_FONTES = int(os.environ.get("BET_MAX_SOURCES", "64"))
+TAXA_FRAMES_POR_FONTE = RateTracker(FEED_RATE_TAU)
+TAXA_BYTES_POR_FONTE = RateTracker(FEED_RATE_TAU)
+ABAS_POR_FONTE = defaultdict(dict)  # fonte -> {tab_id: ultimo_ts}
+
+
+def normalizar_fonte(source, remote_addr) -> str:
+    fonte = str(source or remote_addr or "desconhecida").strip()[:64] or "desconhecida"
+    if fonte not in ABAS_POR_FONTE and len(ABAS_POR_FONTE) >= MAX_FONTES:
+        return "outras"  # segura a cardinalidade dos labels do /metrics
+    return fonte
+
+
+def podar_fontes(agora_ts: int, max_idle: int):
+    """Aba parada há mais de max_idle sai; fonte sem aba nenhuma sai junto (libera a vaga do MAX_FONTES)."""
+    for fonte in list(ABAS_POR_FONTE.keys()):
+        abas = ABAS_POR_FONTE[fonte]
+        for aba in [a for a, ts in abas.items() if agora_ts - ts > max_idle]:
+            del abas[aba]
+        if not abas:
+            del ABAS_POR_FONTE[fonte]
+    TAXA_FRAMES_POR_FONTE.prune(agora_ts, max_idle)
+    TAXA_BYTES_POR_FONTE.prune(agora_ts, max_idle)
+
+
+def registrar_recebimento(raw: str, now_ts: int, fonte: str = "desconhecida", aba=None):
+    METRICAS.inc("frames_total")
+    try:
+        METRICAS.inc("frame_bytes_total", len(raw))
+        METRICAS.inc("source_frames_total", source=fonte)
+        METRICAS.inc("source_bytes_total", len(raw), source=fonte)
+        TAXA_FRAMES_POR_FONTE.hit(fonte, now_ts)
+        TAXA_BYTES_POR_FONTE.hit(fonte, now_ts, len(raw))
+        ABAS_POR_FONTE[fonte][aba] = now_ts
+        if DEBUG_PRINT_RAW_LEN:
+            print("RAW len:", len(raw))
+    except:
+        contar_excecao("handle_data_len")
+
+    try:
+        if raw:
+            ULTIMOS_RAW.append({
+                "ts": now_ts,
+                "len": len(raw),
+                "preview": raw[:DEBUG_RAW_PREVIEW_CHARS]
+            })
+    except:
+        contar_excecao("debug_raw")
+
+
+HISTORY_MAX_TICKS = int(os.environ.get("BET_HISTORY_MAX_TICKS", "20000"))
+
+
+def _int_ou_none(v):
+    v = (v or "").strip() if isinstance(v, str) else v
+    return int(float(v)) if v not in (None, "") else None
+
+
+def montar_history(args) -> tuple:
+    """
+    /history?c2=&market=&selection=&from=&to=&interval=
+    interval (s, padrão 60) > 0: candles OHLC por seleção; interval=0: ticks crus.
+    from/to em epoch (s). Retorna (status, doc).
+    """
+    c2 = (args.get("c2") or "").strip()
+    if not c2:
+        return 400, {"erro": "Informe o parâmetro ?c2=ID_DO_EVENTO"}
+    if HISTORICO is None:
+        return 503, {"erro": "histórico desligado (BET_HISTORY=0)"}
+    try:
+        t0 = _int_ou_none(args.get("from"))
+        t1 = _int_ou_none(args.get("to"))
+        intervalo = _int_ou_none(args.get("interval"))
+    except ValueError:
+        return 400, {"erro": "from/to/interval devem ser números (epoch em segundos)"}
+    intervalo = 60 if intervalo is None else max(0, intervalo)
+    market = (args.get("market") or "").strip() or None
+    selection = (args.get("selection") or "").strip() or None
+
+    doc = {"c2": c2, "market": market, "selection": selection, "from": t0, "to": t1, "interval": intervalo}
+    if intervalo:
+        doc["colunas"] = ["t", "open", "high", "low", "close", "n", "suspenso"]
+        doc["selecoes"] = HISTORICO.ohlc(c2, intervalo, market, selection, t0, t1)
+    else:
+        linhas = HISTORICO.ticks(c2, market, selection, t0, t1, limit=HISTORY_MAX_TICKS + 1)
+        doc["truncado"] = len(linhas) > HISTORY_MAX_TICKS
+        doc["ticks"] = [{"sid": sid, "selection": sel, "market": mk, "ts": ts, "od": od, "suspenso": bool(su)}
+                        for sid, sel, mk, ts, od, su in linhas[:HISTORY_MAX_TICKS]]
+    return 200, doc
+
+
+def montar_history_score(args) -> tuple:
+    c2 = (args.get("c2") or "").strip()
+    if not c2:
+        return 400, {"erro": "Informe o parâmetro ?c2=ID_DO_EVENTO"}
+    if HISTORICO is None:
+        return 503, {"erro": "histórico desligado (BET_HISTORY=0)"}
+    try:
+        t0 = _int_ou_none(args.get("from"))
+        t1 = _int_ou_none(args.get("to"))
+    except ValueError:
+        return 400, {"erro": "from/to devem ser epoch em segundos"}
+    return 200, {"c2": c2, "placar": [{"ts": ts, "score": sc, "anterior": prev}
+                                      for ts, sc, prev in HISTORICO.scores(c2, t0, t1)]}
+
+
+def montar_goals() -> dict:
+    """Janelas de gol capturadas (memória + dumps no disco, mais novas primeiro)."""
+    return {"ring_frames": CAPTURA_GOL.ring.capacity, "stats": dict(CAPTURA_GOL.stats),
+            "goals": CAPTURA_GOL.list()}
+
+
+def _mercado_vivo(c2: str, chave: str) -> bool:
+    st = DADOS_MERCADO_POR_EVENTO.get(c2)
+    mercados = st.get("mercados") if isinstance(st, dict) else None
+    return isinstance(mercados, dict) and chave in mercados
+
+
+def anomalias_locais(k: int, c2: str = "") -> dict:
+    """Anomalias do scanner deste processo/motor (top-k ou de um jogo)."""
+    with LOCK_ESTADO:
+        if c2:
+            return {"c2": c2, "markets": OVERROUND.event(c2), "anomalies": OVERROUND.anomalies(c2)}
+        return {"anomalies": OVERROUND.top(k, alive=_mercado_vivo), "open": OVERROUND.open_count(),
+                "stats": dict(OVERROUND.stats)}
+
+
+def montar_anomalias(args) -> tuple:
+    """
+    /anomalies?top=K: as K piores anomalias abertas (overround fora da banda).
+    /anomalies?c2=ID: overround de cada mercado/linha do jogo + anomalias dele.
+    """
+    c2 = (args.get("c2") or "").strip()
+    try:
+        k = min(1000, max(1, int(args.get("top") or OVERROUND_TOP_K)))
+    except ValueError:
+        return 400, {"erro": "top deve ser inteiro"}
+    feed = feed_da_requisicao(args)
+    if feed is not None:
+        status, doc = ler_no_feed(feed, anomalias_locais, k, c2)
+    elif SHARD_POOL is not None:
+        status, doc = 200, SHARD_POOL.anomalias(k, c2)
+    else:
+        status, doc = 200, anomalias_locais(k, c2)
+    if status == 200:
+        doc["band"] = [OVERROUND_MIN, OVERROUND_MAX]
+    return status, doc
+
+
+def timeline_local(c2: str) -> dict:
+    """Linha do tempo de placar do jogo neste processo/motor."""
+    with LOCK_ESTADO:
+        tl = LINHA_DO_TEMPO.get(c2)
+        return {"c2": c2, "score": LAST_SCORE_BY_C2.get(c2, ""), "base": tl.base if tl is not None else None,
+                "goals": LINHA_DO_TEMPO.entries(c2)}
+
+
+def montar_timeline(args) -> tuple:
+    """
+    /timeline?c2=ID: trocas de placar do jogo (segundo de jogo, período,
+    placar depois, lado, UC), na ordem em que chegaram.
+    """
+    c2 = (args.get("c2") or "").strip()
+    if not c2:
+        return 400, {"erro": "Informe o parâmetro ?c2=ID_DO_EVENTO"}
+    feed = feed_da_requisicao(args)
+    if feed is not None:
+        return ler_no_feed(feed, timeline_local, c2)
+    if SHARD_POOL is not None:
+        return 200, SHARD_POOL.timeline(c2)
+    return 200, timeline_local(c2)
+
+
+def replay_goal(args) -> tuple:
+    """
+    /goals/replay?id=goal_<c2>_<antes>_<depois>_<ts>&format=txt|ndjson
+    Retorna (status, doc_de_erro | gerador de bytes, content-type).
+    txt: o dump no formato indexado (serve para /process_dump e replay_bench --file);
+    ndjson: uma linha {"ts", "fid", "raw"} por frame.
+    """
+    wid = (args.get("id") or "").strip()
+    if not wid:
+        return 400, {"erro": "Informe o parâmetro ?id= (veja /goals)"}, "application/json"
+    status = CAPTURA_GOL.status(wid)
+    if status is None:
+        return 404, {"erro": "janela não encontrada"}, "application/json"
+    if status != "gravado":
+        return 409, {"erro": f"janela ainda não gravada ({status})"}, "application/json"
+    path = CAPTURA_GOL.path(wid)
+    formato = (args.get("format") or "txt").strip().lower()
+    if formato == "ndjson":
+        def gerar():
+            for ts, fid, raw in read_dump(path):
+                yield (json.dumps({"ts": ts, "fid": fid, "raw": raw}, ensure_ascii=False) + "\n").encode("utf-8")
+        return 200, gerar(), "application/x-ndjson"
+
+    def gerar():
+        with open(path, "rb") as f:
+            while True:
+                bloco = f.read(64 * 1024)
+                if not bloco:
+                    return
+                yield bloco
+    return 200, gerar(), "text/plain; charset=utf-8"
+
+
+def montar_sources(janela_abas: int = 60) -> dict:
+    """Throughput por fonte (navegador/host que posta no /data)."""
+    agora_ts = ts_agora_utc()
+    out = {}
+    for fonte in list(ABAS_POR_FONTE.keys()):
+        abas = ABAS_POR_FONTE[fonte]
+        ultimo = TAXA_FRAMES_POR_FONTE.last(fonte)
+        out[fonte] = {
+            "frames_s": round(TAXA_FRAMES_POR_FONTE.rate(fonte, agora_ts), 3),
+            "bytes_s": round(TAXA_BYTES_POR_FONTE.rate(fonte, agora_ts), 1),
+            "frames_total": int(TAXA_FRAMES_POR_FONTE.total(fonte)),
+            "ultimo_ts": ultimo,
+            "idade_s": (agora_ts - ultimo) if ultimo is not None else None,
+            "abas_ativas": sum(1 for ts in list(abas.values()) if agora_ts - ts <= janela_abas),
+        }
+    return out
+
+
+# ============================================================
+# MOTORES POR FEED (um conjunto de stores/índices por feed)
+# - o feed padrão ("idioma") mora nas globais de sempre; frames/leituras de
+#   outro feed (/data com "feed", ?feed= nas leituras) rodam com as globais
+#   apontando para o motor dele (MOTORES.use, dentro do LOCK_ESTADO)
+# - motor extra não tem shards, histórico nem captura de gol: esses ficam
+#   com o feed padrão (o parser e os builders checam MOTOR_PADRAO;
+#   SHARD_POOL/JOURNAL/HISTORICO não são trocados, então quem lê sem lock
+#   sempre vê os do feed padrão)
+# - os idiomas do BET_LANGS (MOTOR_PERSISTIDO) entram no snapshot (um
+#   estado por idioma, em "feeds") e no journal, com o feed no registro
+# - troca de motor = rebind das globais de MOTOR_NOMES dentro do LOCK_ESTADO:
+#   ler um desses nomes fora do lock pode pegar o motor de outro feed. Quem
+#   não segura o lock usa VERSAO_PADRAO ou no_motor_padrao()
+# - fora de MOTOR_NOMES, e de propósito um por processo: CACHE_LEITURA (só
+#   o feed padrão passa por ele; ?feed= monta direto, dentro do lock),
+#   BROKER, CAPTURA_GOL (anel único; só grava com CAPTURA_GOL_ATIVA),
+#   SEQUENCIADOR, METRICAS, TEXTOS, LIMITE_LEITURA
+# - motor sem uso por BET_FEED_IDLE_S é descartado (o vigia poda), menos
+#   os idiomas do BET_LANGS
+# - com mais de um idioma, frame sem feed explícito vai para o idioma do
+#   sufixo do tópico (OVInPlay_10_0 -> "cn"); ?lang= é sinônimo de ?feed=
+# ============================================================
+FEED_PADRAO = idioma
+MAX_FEEDS = int(os.environ.get("BET_MAX_FEEDS", "8"))
+FEED_IDLE_SEG = float(os.environ.get("BET_FEED_IDLE_S", "3600"))
+_RE_FEED = re.compile(r"^[a-z0-9_-]{1,32}$")
+
+MOTOR_NOMES = (
+    "DATA", "SUFIXO", "EVENTO_C2_PARA_OI", "EVENTO_POR_FI", "NOME_EVENTO_POR_FI",
+    "MERCADO_ATUAL_POR_FI", "MARKET_META_POR_FI", "SELECTION_ID_TO_C2",
+    "DADOS_MERCADO_POR_EVENTO", "FRAME_LOG_POR_C2", "FI_INPLAY_TO_DELTA_FIS",
+    "LAST_SCORE_BY_C2", "GOL_UC_PENDENTE", "TAXA_FRAMES_POR_C2", "TAXA_BYTES_POR_C2", "VERSAO_ESTADO",
+    "OVERROUND", "LINHA_DO_TEMPO", "MOVIMENTOS", "DELTAS",
+    "MOTOR_PADRAO", "MOTOR_PERSISTIDO", "CAPTURA_GOL_ATIVA",
+)
+
+
+def _estado_novo_motor(feed: str) -> dict:
+    sufixo = SUFIXO_POR_IDIOMA.get(feed, SUFIXO_POR_IDIOMA.get(FEED_PADRAO, "_1_3"))
+    return {
+        "DATA": {f"C1A{sufixo}": [], f"C18A{sufixo}": []},
+        "SUFIXO": sufixo,
+        "EVENTO_C2_PARA_OI": {},
+        "EVENTO_POR_FI": {},
+        "NOME_EVENTO_POR_FI": {},
+        "MERCADO_ATUAL_POR_FI": {},
+        "MARKET_META_POR_FI": {},
+        "SELECTION_ID_TO_C2": {},
+        "DADOS_MERCADO_POR_EVENTO": {},
+        "FRAME_LOG_POR_C2": defaultdict(lambda: deque(maxlen=50)),
+        "FI_INPLAY_TO_DELTA_FIS": defaultdict(set),
+        "LAST_SCORE_BY_C2": {},
+        "GOL_UC_PENDENTE": {},
+        "TAXA_FRAMES_POR_C2": RateTracker(FEED_RATE_TAU),
+        "TAXA_BYTES_POR_C2": RateTracker(FEED_RATE_TAU),
+        "VERSAO_ESTADO": 0,
+        "OVERROUND": novo_scanner_overround(),
+        "LINHA_DO_TEMPO": ScoreTimeline(TIMELINE_CAP),
+        "MOVIMENTOS": novo_detector_movimentos(feed),
+        "DELTAS": novos_deltas(),
+        "MOTOR_PADRAO": False,
+        "MOTOR_PERSISTIDO": feed in IDIOMAS,
+        "CAPTURA_GOL_ATIVA": False,
+    }
+
+
+MOTORES = EngineSet(globals(), MOTOR_NOMES, _estado_novo_motor, default=FEED_PADRAO,
+                    lock=LOCK_ESTADO, max_engines=MAX_FEEDS)
+METRICAS.describe("feed_rejected_total", "Frames de feed recusados (BET_MAX_FEEDS atingido).")
+METRICAS.gauge("feeds", lambda: len(MOTORES.engines), "Motores (feeds) em memória.")
+METRICAS.gauge("intern_strings", lambda: len(TEXTOS), "Strings na tabela compartilhada entre os feeds.")
+for _idioma in IDIOMAS[1:]:
+    MOTORES.get(_idioma, create=True)
+
+IDIOMA_POR_SUFIXO = {suf: i for i, suf in SUFIXO_POR_IDIOMA.items()}
+_RE_SUFIXO_TOPICO = re.compile(r"(_\d{1,2}_\d{1,2})(?:_\d+)?\x01")
+
+
+def normalizar_feed(feed) -> str:
+    """Id do feed vindo do cliente; vazio/inválido = feed padrão (None)."""
+    feed = str(feed or "").strip().lower()
+    if not feed or feed == FEED_PADRAO or not _RE_FEED.match(feed):
+        return None
+    return feed
+
+
+def feed_da_requisicao(args) -> str:
+    return normalizar_feed(args.get("feed") or args.get("lang"))
+
+
+def feed_do_frame(raw: str) -> str:
+    """Idioma pelo sufixo do primeiro tópico do frame (None = feed padrão / idioma fora do BET_LANGS)."""
+    m = _RE_SUFIXO_TOPICO.search(raw, 0, 256) if raw else None
+    if not m:
+        return None
+    lang = IDIOMA_POR_SUFIXO.get(m.group(1))
+    return normalizar_feed(lang) if lang in IDIOMAS else None
+
+
+def montar_feeds() -> dict:
+    return {"default": FEED_PADRAO, "langs": IDIOMAS, "max": MAX_FEEDS, "idle_s": FEED_IDLE_SEG,
+            "intern_strings": len(TEXTOS), "feeds": MOTORES.feeds()}
+
+
+def ler_no_feed(feed, fn, *args) -> tuple:
+    """(status, doc): roda um builder de leitura no motor do feed; 404 se o feed não existe."""
+    try:
+        with MOTORES.use(feed):
+            return 200, fn(*args)
+    except KeyError:
+        return 404, {"erro": f"feed desconhecido: {feed}"}
+
+
+def aplicar_frame_recebido(raw: str, now_ts: int, replay: bool = False, salvar_raw: bool = True, feed=None):
+    """
+    replay=True: frame vindo do journal na recuperação (não regrava journal/log raw).
+    salvar_raw=False: frame que já veio de arquivo (/process_dump), fora do log raw.
+    feed: motor de destino (None = feed padrão, ou o idioma do frame com BET_LANGS;
+    feed extra fica fora do log raw).
+    """
+    if feed is None and len(IDIOMAS) > 1:
+        feed = feed_do_frame(raw)
+    salvar_raw = salvar_raw and not replay and feed is None
+    with LOCK_ESTADO:
+        try:
+            MOTORES.get(feed, create=True)
+        except EngineLimit:
+            METRICAS.inc("feed_rejected_total")
+            return
+        with MOTORES.use(feed):
+            if JOURNAL is not None and not replay and MOTOR_PERSISTIDO:
+                JOURNAL.append(raw if MOTOR_PADRAO else registro_journal_feed(feed, raw), now_ts)
+            if SHARD_POOL is not None and MOTOR_PADRAO:
+                if salvar_raw:
+                    salvar_raw_websocket_leve(raw)
+                SHARD_POOL.enviar(raw, now_ts)
+                bump_versao_estado()
+            else:
+                processar_frame(raw, now_ts, salvar_raw=salvar_raw)
+
+
+# ------------------------------------------------------------
+# Sequência por aba: o hook.js numera os frames (seq) de cada carregamento
+# de página (sid). POSTs concorrentes chegam fora de ordem; aqui eles são
+# reordenados numa janela curta. Buraco que não fecha na janela = frame
+# perdido -> o próximo /data daquela aba responde "resync" (a extensão
+# recarrega a aba e o site manda o snapshot inteiro de novo).
+# Frame sem seq (extensão antiga, replay) passa direto.
+# ------------------------------------------------------------
+REORDER_JANELA_MS = float(os.environ.get("BET_REORDER_MS", "250"))
+REORDER_MAX_FRAMES = int(os.environ.get("BET_REORDER_MAX", "64"))
+SEQUENCIADOR = Sequencer(window=REORDER_JANELA_MS / 1000.0, max_held=REORDER_MAX_FRAMES)
+RESYNC_PENDENTE = {}  # (fonte, aba) -> sid que teve o buraco
+
+for _k, _txt in (
+    ("frames", "Frames com seq que passaram pelo reordenador."),
+    ("in_order", "Frames com seq que chegaram na ordem."),
+    ("reordered", "Frames que chegaram adiantados e esperaram na janela."),
+    ("duplicates", "Frames com seq repetido/já passado (descartados)."),
+    ("gaps", "Buracos na sequência que não fecharam na janela."),
+    ("lost", "Frames perdidos (soma do tamanho dos buracos)."),
+    ("resets", "Abas que trocaram de sid (reload da página)."),
+):
+    METRICAS.describe(f"seq_{_k}_total", _txt)
+METRICAS.describe("seq_resync_total", "Resyncs (reload da aba) pedidos por buraco na sequência.")
+METRICAS.gauge("seq_held_frames", lambda: SEQUENCIADOR.held_count(), "Frames esperando na janela de reordenação.")
+METRICAS.gauge("seq_streams", lambda: len(SEQUENCIADOR.streams), "Abas (fonte, aba) acompanhadas pelo reordenador.")
+
+
+def _contar_seq(antes: dict):
+    for k, v in SEQUENCIADOR.stats.items():
+        if v != antes[k]:
+            METRICAS.inc(f"seq_{k}_total", v - antes[k])
+
+
+def _marcar_resync(chave):
+    st = SEQUENCIADOR.streams.get(chave)
+    RESYNC_PENDENTE[chave] = st.sid if st is not None else None
+    METRICAS.inc("seq_resync_total", source=chave[0])
+
+
+def parse_seq(data: dict):
+    """(seq, sid) do corpo do /data; (None, None) se não vier seq válido."""
+    try:
+        seq = int(data.get("seq"))
+    except (TypeError, ValueError):
+        return None, None
+    sid = data.get("sid")
+    return seq, (str(sid)[:64] if sid is not None else None)
+
+
+def consumir_resync(fonte: str, aba, sid) -> bool:
+    """True se a aba (no mesmo carregamento que teve o buraco) precisa recarregar."""
+    pendente = RESYNC_PENDENTE.pop((fonte, aba), False)  # pop é atômico: sem lock (roda no event loop do ASGI)
+    return pendente is not False and pendente == sid
+
+
+def receber_frame(raw: str, now_ts: int, fonte: str = "desconhecida", aba=None, seq=None, sid=None, feed=None):
+    """
+    Entrada dos frames do /data: reordena por aba e aplica o que sair na ordem.
+    Cada frame também solta o que passou da janela (de qualquer aba): só com
+    o vigia (a cada 0.25 s, e depois do checar) o buraco esperava até o dobro
+    do BET_REORDER_MS.
+    """
+    if seq is None or aba is None:
+        aplicar_frame_recebido(raw, now_ts, feed=feed)
+        if SEQUENCIADOR.streams:
+            expirar_reordenacao()
+        return
+    with LOCK_ESTADO:
+        antes = dict(SEQUENCIADOR.stats)
+        chave = (fonte, aba)
+        liberados, gap = SEQUENCIADOR.receive(chave, sid, seq, (raw, now_ts, feed), time.monotonic())
+        if gap:
+            _marcar_resync(chave)
+        for raw_l, ts_l, feed_l in liberados:
+            aplicar_frame_recebido(raw_l, ts_l, feed=feed_l)
+        _soltar_expirados()
+        _contar_seq(antes)
+
+
+def _soltar_expirados():
+    """Chamar com LOCK_ESTADO."""
+    liberados, com_gap = SEQUENCIADOR.expire(time.monotonic())
+    for chave in com_gap:
+        _marcar_resync(chave)
+    for raw_l, ts_l, feed_l in liberados:
+        aplicar_frame_recebido(raw_l, ts_l, feed=feed_l)
+
+
+def expirar_reordenacao():
+    """Solta o que passou da janela (buraco vira gap + resync)."""
+    with LOCK_ESTADO:
+        antes = dict(SEQUENCIADOR.stats)
+        _soltar_expirados()
+        _contar_seq(antes)
+
+
+def montar_live(incluir_odds: bool = True, filtro: dict = None) -> list:
+    if filtro is not None:
+        st = ST_BUILD_LIVE_FILTRADO
+    else:
+        st = ST_BUILD_LIVE if incluir_odds else ST_BUILD_LIVE_NO_ODDS
+    t0 = st.start()
+    lista = dados_live(incluir_odds=incluir_odds, filtro=filtro)
+    st.stop(t0)
+    return lista
+
+
+def montar_live_delta(incluir_odds: bool, since) -> dict:
+    """/live?feed=&since=: o feed extra não passa pelo cache; monta e compara no DELTAS do motor ativo."""
+    nome = "live" if incluir_odds else "live_sem_odds"
+    obj = montar_live(incluir_odds)
+    DELTAS[nome].observe(obj)
+    out = DELTAS[nome].delta(obj, since)
+    METRICAS.inc("live_delta_total", tipo="full" if out["full"] else "delta")
+    return out
+
+
+def _markets_filtrado(st: dict, filtro: dict) -> dict:
+    if not isinstance(st, dict):
+        return {}
+    mks = keyed_by_name(st.get("mercados", {}))
+    mks = {n: mk for n, mk in mks.items() if _mercado_no_filtro(n, filtro)}
+    if filtro["campos"]:
+        mks = {n: {k: v for k, v in mk.items() if k in filtro["campos"]} for n, mk in mks.items() if isinstance(mk, dict)}
+    st = dict(st)
+    st["mercados"] = mks
+    return _sanitizar_mercados(st)
+
+
+def montar_markets(c2: str = "", filtro: dict = None):
+    t0 = ST_BUILD_MARKETS.start()
+    if filtro is not None:
+        # lista de c2 / padrões de mercado / campos: só copia o que sai na resposta
+        c2s = sorted(filtro["c2"]) if filtro["c2"] is not None else None
+        if SHARD_POOL is not None and MOTOR_PADRAO:
+            base = {k: SHARD_POOL.markets(k) for k in c2s} if c2s is not None else SHARD_POOL.markets("")
+        else:
+            base = DADOS_MERCADO_POR_EVENTO
+            c2s = c2s if c2s is not None else list(base)
+            base = {k: base[k] for k in c2s if k in base}
+        out = {k: _markets_filtrado(st, filtro) for k, st in base.items() if st}
+        if c2 and "," not in c2:
+            out = out.get(c2, {})
+    elif SHARD_POOL is not None and MOTOR_PADRAO:
+        out = SHARD_POOL.markets(c2)
+    elif c2:
+        st = DADOS_MERCADO_POR_EVENTO.get(c2, {})
+        if isinstance(st, dict) and "mercados" in st:
+            st = dict(st)
+            st["mercados"] = keyed_by_name(st.get("mercados", {}))
+        out = _sanitizar_mercados(st)
+    else:
+        out = _sanitizar_mercados(DADOS_MERCADO_POR_EVENTO)
+    ST_BUILD_MARKETS.stop(t0)
+    return out
+
+
+def montar_explicar_frame(c2: str) -> dict:
+    t0 = ST_BUILD_EXPLICAR_FRAME.start()
+    if SHARD_POOL is not None and MOTOR_PADRAO:
+        frames, snapshot = SHARD_POOL.explicar(c2)
+    else:
+        frames = list(FRAME_LOG_POR_C2.get(c2, []))
+        snapshot = DADOS_MERCADO_POR_EVENTO.get(c2, {})
+
+    out = _sanitizar_mercados({
+        "evento_c2": c2,
+        "frames_capturados": len(frames),
+        "frames": frames,
+        "snapshot_atual": snapshot,
+        "politica_suspenso": {
+            "pareado_com_bet": True,
+            "regra": "suspenso só muda quando SU vem no feed (PA.SU ou delta U com SU).",
+            "no_goal_suspend": "NÃO suspende mercados no gol; faz PURGE de goal markets ao detectar gol.",
+            "gc": {
+                "enabled": STALE_ENABLED,
+                "obs": "Se ligado, GC só REMOVE mercados antigos; não seta suspenso."
+            }
+        }
+    })
+    ST_BUILD_EXPLICAR_FRAME.stop(t0)
+    return out
+
+
+def montar_targets(limit: int, cooldown=None, live: list = None) -> dict:
+    if cooldown is not None:
+        try:
+            cd = int(cooldown)
+            if cd >= 0:
+                global TEMPO_ESPERA_TARGETS_SEG
+                TEMPO_ESPERA_TARGETS_SEG = cd
+        except:
+            pass
+
+    agora_ts = ts_agora_utc()
+    if live is None:
+        # do cache (montado sob LOCK_ESTADO com o feed padrão): ler os globais
+        # do motor fora do lock pega o feed que estiver trocado no momento
+        t0 = ST_BUILD_TARGETS.start()
+        live = CACHE_LEITURA.objeto("live_sem_odds")
+        ST_BUILD_TARGETS.stop(t0)
+
+    urls = []
+    for ev in live:
+        c2 = str(ev.get("event_id", "")).strip()
+        if not c2:
+            continue
+
+        if not deve_enviar_target(c2, agora_ts):
+            continue
+
+        urls.append(montar_url_partida_por_c2(c2))
+        ULTIMO_ENVIO_TARGET_TS[c2] = agora_ts
+
+        if len(urls) >= limit:
+            break
+
+    return {"urls": urls}
+
+
+def montar_active_ids(live: list = None) -> dict:
+    if live is None:
+        t0 = ST_BUILD_ACTIVE_IDS.start()
+        live = CACHE_LEITURA.objeto("live_sem_odds")
+        ST_BUILD_ACTIVE_IDS.stop(t0)
+    ids = []
     for ev in live:
         c2 = str(ev.get("event_id", "")).strip()
         if c2:
             ids.append(c2)
-    return jsonify({"ids": ids}), 200
+    return {"ids": ids}
 
 
-@app.route("/active_map", methods=["GET"])
-def active_map():
-    live = dados_soccer_ao_vivo(incluir_odds=False)
+def montar_active_map(live: list = None) -> dict:
+    if live is None:
+        t0 = ST_BUILD_ACTIVE_MAP.start()
+        live = CACHE_LEITURA.objeto("live_sem_odds")
+        ST_BUILD_ACTIVE_MAP.stop(t0)
     mp = {}
     for ev in live:
         c2 = str(ev.get("event_id", "")).strip()
@@ -1737,7 +3340,834 @@ def active_map():
             "league": ev.get("league"),
             "event": ev.get("event")
         }
-    return jsonify(mp), 200
+    return mp
+
+
+def segundos_restantes(ev: dict):
+    """Tempo de jogo que falta (s) a partir do "time" m:ss e da duração da liga."""
+    try:
+        mm, ss = str(ev.get("time") or "0:00").split(":")
+        decorrido = int(mm) * 60 + int(ss)
+    except:
+        return None
+    return max(0, duracao_minutos_liga(ev.get("league") or "") * 60 - decorrido)
+
+
+def montar_feed_rates(live: list = None) -> dict:
+    """
+    Por jogo ativo: frames/s, bytes/s, idade do último frame, nº de mercados
+    e tempo restante. É a entrada do escalonador de abas do tab_manager.
+    """
+    if live is None:
+        live = CACHE_LEITURA.objeto("live_sem_odds")
+    taxas = SHARD_POOL.feed() if SHARD_POOL is not None and MOTOR_PADRAO else taxas_feed_local()
+    agora_ts = ts_agora_utc()
+    out = {}
+    for ev in live:
+        c2 = str(ev.get("event_id", "")).strip()
+        if not c2:
+            continue
+        t = taxas.get(c2) or {"frames_s": 0.0, "bytes_s": 0.0, "frames_total": 0, "ultimo_ts": None, "mercados": 0}
+        t = dict(t)
+        t["idade_s"] = (agora_ts - t["ultimo_ts"]) if t.get("ultimo_ts") is not None else None
+        if t["idade_s"] is None:
+            t["saude"] = "sem_dados"
+        elif t["idade_s"] > FEED_STALL_SEG:
+            t["saude"] = "parado"
+        else:
+            t["saude"] = "ok"
+        t["restante_s"] = segundos_restantes(ev)
+        t["period"] = ev.get("period")
+        t["url"] = montar_url_partida_por_c2(c2)
+        out[c2] = t
+    return out
+
+
+# ============================================================
+# ESCRITOR ÚNICO (fila -> uma thread aplica os frames em ordem)
+# Usado pelo backend ASGI (e pelo Flask com BET_SINGLE_WRITER=1):
+# o handler do /data só enfileira e responde na hora.
+# ============================================================
+SINGLE_WRITER = os.environ.get("BET_SINGLE_WRITER", "0") == "1"
+INGEST_QUEUE_MAX = int(os.environ.get("BET_INGEST_QUEUE_MAX", "20000"))
+
+
+class IngestorSerial(threading.Thread):
+    def __init__(self, maxsize: int = INGEST_QUEUE_MAX):
+        super().__init__(name="single-writer", daemon=True)
+        self.fila = queue.Queue(maxsize=maxsize)
+
+    def enfileirar(self, raw: str, now_ts: int, fonte: str = "desconhecida", aba=None, seq=None, sid=None,
+                   feed=None) -> bool:
+        try:
+            self.fila.put_nowait((raw, now_ts, fonte, aba, seq, sid, feed))
+            return True
+        except queue.Full:
+            METRICAS.inc("ingest_dropped_total")
+            return False
+
+    def run(self):
+        while True:
+            item = self.fila.get()
+            try:
+                receber_frame(*item)
+            except Exception:
+                contar_excecao("single_writer")
+
+
+INGESTOR = None
+
+
+def iniciar_ingestor():
+    global INGESTOR
+    if INGESTOR is None:
+        INGESTOR = IngestorSerial()
+        INGESTOR.start()
+        METRICAS.gauge("ingest_queue_depth", lambda: INGESTOR.fila.qsize(), "Frames esperando o escritor único.")
+    return INGESTOR
+
+
+# ============================================================
+# LIMITE E PRIORIDADE DAS LEITURAS
+# script em loop no /live não pode atrasar o /data:
+# - token bucket por cliente (IP) nas rotas de leitura: BET_READ_RATE
+#   leituras/s, rajada de BET_READ_BURST; estourou -> 429 + Retry-After
+# - no máximo BET_READ_WORKERS leituras rodando ao mesmo tempo; o resto
+#   espera até BET_READ_WAIT_MS e recebe 503. O /data não passa por aqui:
+#   as outras threads do servidor ficam para a ingestão
+# - coalescência (no CacheLeitura): leituras dentro de BET_READ_COALESCE_MS
+#   da última montagem reaproveitam o documento; com frames esperando o
+#   escritor único, a janela sobe para BET_READ_BACKLOG_STALE_MS
+# ============================================================
+READ_RATE = float(os.environ.get("BET_READ_RATE", "0"))  # leituras/s por cliente, 0 = sem limite
+READ_BURST = float(os.environ.get("BET_READ_BURST", "0"))  # 0 = 2x a taxa
+READ_WORKERS = int(os.environ.get("BET_READ_WORKERS", "4"))  # 0 = sem teto
+READ_WAIT_MS = float(os.environ.get("BET_READ_WAIT_MS", "2000"))
+READ_COALESCE_MS = float(os.environ.get("BET_READ_COALESCE_MS", "0"))
+READ_BACKLOG_STALE_MS = float(os.environ.get("BET_READ_BACKLOG_STALE_MS", "250"))
+
+LIMITE_LEITURA = TokenBuckets(READ_RATE, READ_BURST,
+                              exempt=[x.strip() for x in os.environ.get("BET_READ_RATE_EXEMPT", "").split(",") if x.strip()])
+VAGAS_LEITURA = threading.BoundedSemaphore(READ_WORKERS) if READ_WORKERS > 0 else None
+
+# /stream fica aberto (não ocupa vaga); /metrics e /debug_* são do operador
+ROTAS_LEITURA = frozenset({
+    "/live", "/markets", "/feeds", "/explicar_frame", "/targets", "/active_ids", "/active_map",
+    "/sources", "/history", "/history/score", "/goals", "/feed_rates", "/anomalies",
+    "/timeline",
+})
+METRICAS.describe("read_limited_total", "Leituras recusadas com 429 pelo limite por cliente.")
+METRICAS.describe("read_busy_total", "Leituras recusadas com 503 (sem vaga em BET_READ_WAIT_MS).")
+METRICAS.gauge("read_rate_clients", lambda: len(LIMITE_LEITURA), "Clientes com balde no limite de leitura.")
+
+
+def checar_limite_leitura(rota: str, cliente) -> float:
+    """0 = liberado; senão segundos até a próxima ficha (Retry-After)."""
+    ok, espera = LIMITE_LEITURA.allow(str(cliente or "desconhecida"))
+    if ok:
+        return 0.0
+    METRICAS.inc("read_limited_total", rota=rota)
+    return espera
+
+
+def _janela_coalescer() -> float:
+    janela = READ_COALESCE_MS
+    if INGESTOR is not None and READ_BACKLOG_STALE_MS > janela and not INGESTOR.fila.empty():
+        janela = READ_BACKLOG_STALE_MS
+    return janela / 1000.0
+
+
+# ============================================================
+# CACHE DE LEITURA (JSON pronto por versão do estado)
+# a chave inclui o segundo atual: o "time" do /live anda com o relógio
+# - single-flight: a montagem roda sob um lock só; leituras iguais que
+#   chegam juntas esperam e saem com o mesmo documento
+# - /live?since=<versão>: cada montagem do live passa pelo DeltaTracker, que
+#   responde só o que mudou desde o cursor (+ lápides); o delta de um mesmo
+#   cursor é reaproveitado enquanto o documento não muda
+# - leitura filtrada (fields/markets/c2/only_next_goal) e /markets?c2= são
+#   documentos a mais no cache, com o nome derivado do pedido (até
+#   BET_FILTER_CACHE no total; o mais velho sai)
+# ============================================================
+FILTROS_CACHE_MAX = int(os.environ.get("BET_FILTER_CACHE", "128"))
+METRICAS.describe("read_cache_total", "Leituras do CacheLeitura (hit, coalesced = reaproveitou dentro da janela, miss).")
+METRICAS.describe("live_delta_total", "Respostas do /live?since= (full = cursor velho/inválido).")
+
+
+def pede_flat(accept) -> bool:
+    """Accept com o formato binário plano (betws/flat.py) em vez de JSON."""
+    return flat.CONTENT_TYPE in (accept or "")
+
+
+def encode_flat(tipo: str, obj, c2: str = "") -> bytes:
+    """Doc do /live (lista de eventos) ou do /markets (um evento ou todos) no formato plano."""
+    if tipo == "live":
+        return flat.encode((ev.get("event_id"), ev, ev.get("mercados") or {}) for ev in obj)
+    if c2 and "," not in c2:
+        return flat.encode([(c2, {}, obj.get("mercados") or {})])
+    return flat.encode((k, {}, st.get("mercados") or {}) for k, st in obj.items() if isinstance(st, dict))
+
+
+def _lista_param(v) -> list:
+    return [x.strip() for x in str(v or "").split(",") if x.strip()]
+
+
+def parse_filtro_leitura(args, tipo: str = "live"):
+    """
+    fields= (campos do evento no /live, do mercado no /markets), markets=
+    (padrões de nome com *, sem caixa), c2= (lista), only_next_goal=1.
+    None = sem filtro (documento inteiro, do cache de sempre).
+    """
+    c2s = _lista_param(args.get("c2"))
+    padroes = _lista_param(args.get("markets"))
+    campos = _lista_param(args.get("fields"))
+    so_next_goal = args.get("only_next_goal") == "1"
+    if tipo == "markets" and len(c2s) <= 1:
+        c2s = c2s if (padroes or campos) else []
+    if not (c2s or padroes or campos or so_next_goal):
+        return None
+    odds = args.get("odds", "1") != "0"
+    campos_set = set(campos) or None
+    if so_next_goal and campos_set is not None:
+        campos_set.add("next_goal")
+    quer = (lambda k: campos_set is None or k in campos_set)
+    return {
+        # query canônica: parse_filtro_leitura(parse_qsl(chave)) devolve o mesmo filtro
+        "chave": urlencode((
+            ("c2", ",".join(sorted(c2s))), ("markets", ",".join(padroes)),
+            ("fields", ",".join(sorted(campos_set or ()))), ("only_next_goal", int(so_next_goal)),
+            ("odds", int(odds)))),
+        "c2": set(c2s) or None,
+        "padroes": [re.compile(fnmatch.translate(p), re.IGNORECASE) for p in padroes] or None,
+        "campos": campos_set,
+        "odds": odds and (quer("mercados") or quer("next_goal")),
+        "mercados": odds and quer("mercados") and not so_next_goal,
+        "next_goal": odds and quer("next_goal"),
+    }
+
+
+def nome_cache_live(args) -> str:
+    filtro = parse_filtro_leitura(args, "live")
+    if filtro is not None:
+        return CACHE_LEITURA.nome_filtrado("live", filtro)
+    return "live" if args.get("odds", "1") != "0" else "live_sem_odds"
+
+
+def nome_cache_markets(args) -> str:
+    c2 = (args.get("c2") or "").strip()
+    filtro = parse_filtro_leitura(args, "markets")
+    if filtro is not None:
+        return CACHE_LEITURA.nome_filtrado("markets", filtro, c2)
+    return CACHE_LEITURA.nome_markets(c2)
+
+
+ERRO_SINCE_FILTRADO = "?since= não combina com c2/markets/fields/only_next_goal (o delta é do /live inteiro)"
+
+
+def since_com_filtro(args) -> bool:
+    return "since" in args and parse_filtro_leitura(args, "live") is not None
+
+
+def parse_since(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class CacheLeitura:
+    def __init__(self):
+        self._docs = {}  # nome -> (versao, segundo, bytes | None, objeto, monotonic da montagem)
+        self._deltas = {}  # (nome, since) -> (objeto montado, bytes)
+        self._flat = {}  # nome -> (objeto montado, bytes no formato plano)
+        self._filtros = {}  # nome -> (tipo, c2, filtro) das leituras com fields/markets/c2/only_next_goal
+        self._lock = threading.RLock()  # active_ids/active_map montam em cima do live_sem_odds
+
+    def nome_filtrado(self, tipo: str, filtro: dict, c2: str = "") -> str:
+        """Nome de cache de uma leitura filtrada (mesmo filtro = mesma montagem para todos)."""
+        nome = f"{tipo}?{c2}|{filtro['chave']}"
+        return self._registrar(nome, (tipo, c2, filtro))
+
+    def nome_markets(self, c2: str) -> str:
+        """markets:<c2>: c2 vem do cliente, então entra no mesmo limite das filtradas."""
+        if not c2:
+            return "markets:"
+        return self._registrar(f"markets:{c2}", ("markets", c2, None))
+
+    def _meta(self, nome: str):
+        """
+        (tipo, c2, filtro) de um nome que o cliente escolheu. Outra thread pode
+        ter tirado o nome do cache entre o nome_*() e a montagem: o nome carrega
+        o filtro inteiro, então registra de novo em vez de falhar.
+        """
+        meta = self._filtros.get(nome)
+        if meta is not None:
+            return meta
+        if nome.startswith("markets:") and len(nome) > len("markets:"):
+            meta = ("markets", nome.split(":", 1)[1], None)
+        elif "?" in nome and "|" in nome:
+            tipo, resto = nome.split("?", 1)
+            c2, chave = resto.rsplit("|", 1)
+            meta = (tipo, c2, parse_filtro_leitura(dict(parse_qsl(chave)), tipo))
+        else:
+            return None
+        self._registrar(nome, meta)
+        return meta
+
+    def _registrar(self, nome: str, meta: tuple) -> str:
+        # nomes que o cliente escolhe: no máximo FILTROS_CACHE_MAX, o mais velho sai
+        if nome not in self._filtros:
+            with self._lock:
+                while len(self._filtros) >= FILTROS_CACHE_MAX:
+                    velho = next(iter(self._filtros))
+                    for d in (self._filtros, self._docs, self._flat):
+                        d.pop(velho, None)
+                self._filtros[nome] = meta
+        return nome
+
+    def _montar(self, nome: str):
+        meta = self._meta(nome)
+        if meta is not None:
+            tipo, c2, filtro = meta
+            if tipo == "markets":
+                return montar_markets(c2, filtro)
+            return montar_live(filtro["odds"], filtro)
+        if nome == "live":
+            return montar_live(True)
+        if nome == "live_sem_odds":
+            return montar_live(False)
+        if nome == "active_ids":
+            return montar_active_ids(self.objeto("live_sem_odds"))
+        if nome == "active_map":
+            return montar_active_map(self.objeto("live_sem_odds"))
+        if nome == "feed_rates":
+            return montar_feed_rates(self.objeto("live_sem_odds"))
+        if nome == "markets:":
+            return montar_markets("")
+        raise KeyError(nome)
+
+    def _fresco(self, ent) -> bool:
+        return ent is not None and ent[0] == VERSAO_PADRAO and ent[1] == ts_agora_utc()
+
+    def _valido(self, ent) -> bool:
+        if self._fresco(ent):
+            return True
+        janela = _janela_coalescer() if ent is not None else 0.0
+        return janela > 0 and time.monotonic() - ent[4] < janela
+
+    def _contar_hit(self, ent):
+        METRICAS.inc("read_cache_total", resultado="hit" if self._fresco(ent) else "coalesced")
+
+    def pronto(self, nome: str):
+        """bytes se o cache está válido, senão None (não monta)."""
+        ent = self._docs.get(nome)
+        return ent[2] if self._valido(ent) else None
+
+    def _entrada(self, nome: str, serializar: bool = True):
+        """(versao, segundo, bytes | None, objeto, t); só serializa quem pede bytes."""
+        ent = self._docs.get(nome)
+        if self._valido(ent) and (ent[2] is not None or not serializar):
+            self._contar_hit(ent)
+            return ent
+        with self._lock:
+            ent = self._docs.get(nome)
+            if self._valido(ent):
+                self._contar_hit(ent)
+            else:
+                METRICAS.inc("read_cache_total", resultado="miss")
+                with LOCK_ESTADO:
+                    versao, segundo = VERSAO_ESTADO, ts_agora_utc()
+                    obj = self._montar(nome)
+                    if nome in DELTAS:
+                        DELTAS[nome].observe(obj)
+                ent = (versao, segundo, None, obj, time.monotonic())
+            if serializar and ent[2] is None:
+                ent = (ent[0], ent[1], app.json.dumps(ent[3]).encode("utf-8"), ent[3], ent[4])
+            self._docs[nome] = ent
+            return ent
+
+    def obter(self, nome: str) -> bytes:
+        return self._entrada(nome)[2]
+
+    def delta(self, nome: str, since) -> bytes:
+        """/live?since=: mudanças desde o cursor, sobre o mesmo documento do cache."""
+        self._entrada(nome, serializar=False)
+        with self._lock:
+            obj = self._docs[nome][3]  # a montagem mais nova: é a que o tracker viu por último
+            chave = (nome, since)
+            pronto = self._deltas.get(chave)
+            if pronto is not None and pronto[0] is obj:
+                return pronto[1]
+            with LOCK_ESTADO:
+                out = DELTAS[nome].delta(obj, since)
+                doc = app.json.dumps(out).encode("utf-8")
+            METRICAS.inc("live_delta_total", tipo="full" if out["full"] else "delta")
+            if len(self._deltas) >= 256:
+                self._deltas.clear()
+            self._deltas[chave] = (obj, doc)
+            return doc
+
+    def binario(self, nome: str) -> bytes:
+        """Mesmo documento do cache, no formato plano (Accept: application/vnd.betws.flat)."""
+        obj = self._entrada(nome, serializar=False)[3]
+        pronto = self._flat.get(nome)
+        if pronto is not None and pronto[0] is obj:
+            return pronto[1]
+        with self._lock:
+            ent = self._docs.get(nome)  # pode ter saído do cache depois do _entrada
+            obj = ent[3] if ent is not None else obj
+            pronto = self._flat.get(nome)
+            if pronto is not None and pronto[0] is obj:
+                return pronto[1]
+            meta = self._meta(nome)
+            if meta is not None:
+                doc = encode_flat(meta[0], obj, meta[1])
+            elif nome.startswith("markets:"):
+                doc = encode_flat("markets", obj, "")
+            else:
+                doc = encode_flat("live", obj)
+            self._flat[nome] = (obj, doc)
+            return doc
+
+    def objeto(self, nome: str):
+        return self._entrada(nome, serializar=False)[3]
+
+
+CACHE_LEITURA = CacheLeitura()
+
+
+def _saude_feed_resumo(campo: str):
+    rows = CACHE_LEITURA.objeto("feed_rates").values()
+    if campo == "parados":
+        return sum(1 for r in rows if r.get("saude") == "parado")
+    return max((r["idade_s"] for r in rows if r.get("idade_s") is not None), default=0)
+
+
+METRICAS.gauge("feed_stalled_events", lambda: _saude_feed_resumo("parados"),
+               f"Jogos ativos sem frame de mercado há mais de {FEED_STALL_SEG}s.")
+METRICAS.gauge("feed_max_age_seconds", lambda: _saude_feed_resumo("idade"),
+               "Maior idade do último frame de mercado entre os jogos ativos com dados.")
+
+
+# ============================================================
+# PUSH DE EVENTOS (SSE em /stream)
+# tópico "events": início/fim de jogo ao vivo, para o tab_manager abrir e
+# fechar abas na hora em vez de fazer polling no /active_ids
+# tópicos "live" / "live_no_odds": o /live para o dashboard. O vigia monta
+# um delta por versão do estado (o mesmo do /live?since=) e publica uma vez;
+# o broker manda os mesmos bytes para todos os dashboards conectados
+# ============================================================
+BROKER = Broker(maxlen=int(os.environ.get("BET_STREAM_QUEUE", "1000")))
+METRICAS.gauge("stream_subscribers", lambda: BROKER.subscribers(), "Assinantes conectados no /stream.")
+
+
+def snapshot_eventos() -> dict:
+    ids = CACHE_LEITURA.objeto("active_ids").get("ids", [])
+    return {"ids": ids, "urls": {c2: montar_url_partida_por_c2(c2) for c2 in ids}}
+
+
+# tópico -> nome do documento no CacheLeitura
+LIVE_POR_TOPICO = {"live": "live", "live_no_odds": "live_sem_odds"}
+METRICAS.describe("live_push_total", "Deltas do /live publicados no /stream (um por versão, para todos os assinantes).")
+
+# tópico -> (evento, fn) mandado logo que o cliente conecta
+SNAPSHOT_POR_TOPICO = {
+    "events": ("snapshot", snapshot_eventos),
+    "rates": ("rates", lambda: CACHE_LEITURA.objeto("feed_rates")),
+    # documento inteiro com a versão ({"full": true}); depois só deltas
+    "live": ("live", lambda: CACHE_LEITURA.delta("live", None)),
+    "live_no_odds": ("live", lambda: CACHE_LEITURA.delta("live_sem_odds", None)),
+}
+
+# tópico "rates": /feed_rates inteiro a cada N segundos (só se alguém assina)
+RATES_PUSH_SEG = float(os.environ.get("BET_RATES_PUSH_S", "2"))
+
+
+class VigiaEventos(threading.Thread):
+    """Compara o conjunto de jogos ativos a cada mudança de versão (ou de segundo)."""
+
+    def __init__(self, intervalo: float = 0.25):
+        super().__init__(name="event-watcher", daemon=True)
+        self.intervalo = intervalo
+        self.ativos = None
+        self.marca = None
+        self.ultimo_rates = 0.0
+        self.ultima_poda = time.time()
+        self.versao_live = {}  # tópico -> versão do último delta publicado
+
+    def publicar_rates(self):
+        agora = time.time()
+        if agora - self.ultima_poda > 60:
+            self.ultima_poda = agora
+            with LOCK_ESTADO:
+                podar_taxas_feed()
+                MOTORES.prune_idle(FEED_IDLE_SEG, keep=IDIOMAS)
+        if not BROKER.has_subscribers("rates") or agora - self.ultimo_rates < RATES_PUSH_SEG:
+            return
+        self.ultimo_rates = agora
+        BROKER.publish("rates", "rates", CACHE_LEITURA.objeto("feed_rates"))
+
+    def publicar_live(self):
+        """Um delta por versão, montado uma vez só, qualquer que seja o nº de dashboards."""
+        for topico, nome in LIVE_POR_TOPICO.items():
+            if not BROKER.has_subscribers(topico):
+                self.versao_live.pop(topico, None)
+                continue
+            CACHE_LEITURA.objeto(nome)
+            with LOCK_ESTADO:
+                versao = DELTAS[nome].version
+            desde = self.versao_live.get(topico)
+            self.versao_live[topico] = versao
+            if desde is None or versao == desde:
+                # assinante novo já recebeu o documento inteiro no snapshot;
+                # se ficou um buraco, o "since" do próximo delta denuncia
+                continue
+            BROKER.publish(topico, "live", CACHE_LEITURA.delta(nome, desde).decode("utf-8"))
+            METRICAS.inc("live_push_total", topico=topico)
+
+    def checar(self):
+        marca = (VERSAO_PADRAO, ts_agora_utc())
+        if marca == self.marca:
+            return
+        self.marca = marca
+        ids = CACHE_LEITURA.objeto("active_ids").get("ids", [])
+        atual = set(ids)
+        if self.ativos is not None:
+            for c2 in ids:
+                if c2 not in self.ativos:
+                    BROKER.publish("events", "event_start", {"c2": c2, "url": montar_url_partida_por_c2(c2)})
+            for c2 in self.ativos - atual:
+                BROKER.publish("events", "event_end", {"c2": c2})
+        self.ativos = atual
+        self.publicar_live()
+
+    def run(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                expirar_reordenacao()
+                self.checar()
+                self.publicar_rates()
+            except Exception:
+                contar_excecao("event_watcher")
+
+
+VIGIA_EVENTOS = None
+
+
+def iniciar_vigia_eventos():
+    global VIGIA_EVENTOS
+    if VIGIA_EVENTOS is None:
+        VIGIA_EVENTOS = VigiaEventos()
+        VIGIA_EVENTOS.start()
+    return VIGIA_EVENTOS
+
+
+def parse_topicos(arg: str) -> list:
+    return [t for t in (x.strip() for x in (arg or "events").split(",")) if t]
+
+
+def mensagens_iniciais(topicos: list) -> list:
+    out = []
+    for t in topicos:
+        if t in SNAPSHOT_POR_TOPICO:
+            ev, fn = SNAPSHOT_POR_TOPICO[t]
+            dados = fn()
+            if isinstance(dados, bytes):
+                dados = dados.decode("utf-8")  # já serializado pelo CacheLeitura
+            else:
+                dados = json.dumps(dados, ensure_ascii=False, separators=(",", ":"))
+            out.append((BROKER.seq, t, ev, dados))
+    return out
+
+
+def assinar_mudancas_odds(callback, c2: str = None, maxlen: int = None, feed: str = None):
+    """
+    API Python do detector (mesmo processo): callback(tipo, evento) num thread
+    próprio. Fila limitada como a do /stream: assinante lento perde os mais
+    antigos (sub.dropped), nunca segura o parser. sub.close() para.
+    feed=: só os eventos desse feed (com BET_LANGS, cada idioma manda os seus).
+    """
+    sub = BROKER.subscribe([f"odds:{c2}" if c2 else "odds"], maxlen)
+
+    def loop():
+        while not sub.closed:
+            msg = sub.get(1.0)
+            if msg is None:
+                continue
+            try:
+                ev = json.loads(msg[3])
+                if feed is not None and ev.get("feed") != feed:
+                    continue
+                callback(msg[2], ev)
+            except Exception:
+                contar_excecao("odds_callback")
+
+    threading.Thread(target=loop, name="odds-callback", daemon=True).start()
+    return sub
+
+
+# ============================================================
+# ROTAS
+# ============================================================
+@app.before_request
+def limitar_leituras():
+    if request.method != "GET" or request.path not in ROTAS_LEITURA:
+        return None
+    espera = checar_limite_leitura(request.path, request.remote_addr)
+    if espera:
+        resp = jsonify({"erro": "limite de leituras", "retry_after": round(espera, 3)})
+        resp.headers["Retry-After"] = str(max(1, int(espera + 0.999)))
+        return resp, 429
+    if VAGAS_LEITURA is not None:
+        if not VAGAS_LEITURA.acquire(timeout=READ_WAIT_MS / 1000.0):
+            METRICAS.inc("read_busy_total", rota=request.path)
+            return jsonify({"erro": "leituras ocupadas"}), 503
+        g.vaga_leitura = True
+    return None
+
+
+@app.teardown_request
+def liberar_vaga_leitura(_exc=None):
+    if g.pop("vaga_leitura", False):
+        VAGAS_LEITURA.release()
+
+
+@app.route("/data", methods=["POST"])
+def handle_data():
+    data = request.json or {}
+    raw = data.get("data", "")
+    now_ts = ts_agora_utc()
+
+    fonte = normalizar_fonte(data.get("source"), request.remote_addr)
+    aba = data.get("tab")
+    seq, sid = parse_seq(data)
+    feed = normalizar_feed(data.get("feed") or request.args.get("feed") or request.args.get("lang"))
+    registrar_recebimento(raw, now_ts, fonte, aba)
+
+    if INGESTOR is not None:
+        INGESTOR.enfileirar(raw, now_ts, fonte, aba, seq, sid, feed)
+    else:
+        receber_frame(raw, now_ts, fonte, aba, seq, sid, feed)
+
+    return "resync" if consumir_resync(fonte, aba, sid) else "1"
+
+
+@app.route("/stream", methods=["GET"])
+def stream():
+    topicos = parse_topicos(request.args.get("topics"))
+    sub = BROKER.subscribe(topicos)
+
+    def gerar():
+        try:
+            for msg in mensagens_iniciais(topicos):
+                yield format_sse(msg).encode("utf-8")
+            while True:
+                msg = sub.get(15.0)
+                yield sse_bytes(msg) if msg else SSE_PING_BYTES
+        finally:
+            sub.close()
+
+    return Response(gerar(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/debug_raw", methods=["GET"])
+def debug_raw():
+    return jsonify(list(ULTIMOS_RAW)), 200
+
+
+@app.route("/live", methods=["GET"])
+def live_event():
+    incluir_odds = request.args.get("odds", "1") != "0"
+    feed = feed_da_requisicao(request.args)
+    binario = pede_flat(request.headers.get("Accept"))
+    if since_com_filtro(request.args):
+        return jsonify({"erro": ERRO_SINCE_FILTRADO}), 400
+    if feed is None:
+        if "since" in request.args:
+            nome = "live" if incluir_odds else "live_sem_odds"
+            return Response(CACHE_LEITURA.delta(nome, parse_since(request.args.get("since"))), mimetype="application/json")
+        nome = nome_cache_live(request.args)
+        if binario:
+            return Response(CACHE_LEITURA.binario(nome), mimetype=flat.CONTENT_TYPE)
+        return Response(CACHE_LEITURA.obter(nome), mimetype="application/json")
+    if "since" in request.args:
+        status, doc = ler_no_feed(feed, montar_live_delta, incluir_odds, parse_since(request.args.get("since")))
+        return jsonify(doc), status
+    status, doc = ler_no_feed(feed, montar_live, incluir_odds, parse_filtro_leitura(request.args, "live"))
+    if binario and status == 200:
+        return Response(encode_flat("live", doc), mimetype=flat.CONTENT_TYPE)
+    return jsonify(doc), status
+
+
+@app.route("/markets", methods=["GET"])
+def markets():
+    c2 = (request.args.get("c2") or "").strip()
+    feed = feed_da_requisicao(request.args)
+    binario = pede_flat(request.headers.get("Accept"))
+    if feed is None:
+        nome = nome_cache_markets(request.args)
+        if binario:
+            return Response(CACHE_LEITURA.binario(nome), mimetype=flat.CONTENT_TYPE)
+        return Response(CACHE_LEITURA.obter(nome), mimetype="application/json")
+    status, doc = ler_no_feed(feed, montar_markets, c2, parse_filtro_leitura(request.args, "markets"))
+    if binario and status == 200:
+        return Response(encode_flat("markets", doc, c2), mimetype=flat.CONTENT_TYPE)
+    return jsonify(doc), status
+
+
+@app.route("/feeds", methods=["GET"])
+def feeds():
+    return jsonify(montar_feeds()), 200
+
+
+@app.route("/explicar_frame", methods=["GET"])
+def explicar_frame():
+    c2 = (request.args.get("c2") or "").strip()
+    if not c2:
+        return jsonify({"erro": "Informe o parâmetro ?c2=ID_DO_EVENTO"}), 400
+    status, doc = ler_no_feed(feed_da_requisicao(request.args), montar_explicar_frame, c2)
+    return jsonify(doc), status
+
+
+@app.route("/targets", methods=["GET"])
+def targets():
+    limit = int(request.args.get("limit", "15"))
+    live = CACHE_LEITURA.objeto("live_sem_odds")
+    return jsonify(montar_targets(limit, request.args.get("cooldown"), live=live)), 200
+
+
+@app.route("/active_ids", methods=["GET"])
+def active_ids():
+    return Response(CACHE_LEITURA.obter("active_ids"), mimetype="application/json")
+
+
+@app.route("/active_map", methods=["GET"])
+def active_map():
+    return Response(CACHE_LEITURA.obter("active_map"), mimetype="application/json")
+
+
+@app.route("/sources", methods=["GET"])
+def sources():
+    return jsonify(montar_sources()), 200
+
+
+@app.route("/history", methods=["GET"])
+def history():
+    status, doc = montar_history(request.args)
+    return jsonify(doc), status
+
+
+@app.route("/history/score", methods=["GET"])
+def history_score():
+    status, doc = montar_history_score(request.args)
+    return jsonify(doc), status
+
+
+@app.route("/goals", methods=["GET"])
+def goals():
+    return jsonify(montar_goals()), 200
+
+
+@app.route("/anomalies", methods=["GET"])
+def anomalies():
+    status, doc = montar_anomalias(request.args)
+    return jsonify(doc), status
+
+
+@app.route("/timeline", methods=["GET"])
+def timeline():
+    status, doc = montar_timeline(request.args)
+    return jsonify(doc), status
+
+
+@app.route("/goals/replay", methods=["GET"])
+def goals_replay():
+    status, corpo, ctype = replay_goal(request.args)
+    if isinstance(corpo, dict):
+        return jsonify(corpo), status
+    return Response(corpo, status=status, mimetype=ctype.split(";")[0])
+
+
+@app.route("/feed_rates", methods=["GET"])
+def feed_rates():
+    return Response(CACHE_LEITURA.obter("feed_rates"), mimetype="application/json")
+
+
+# ============================================================
+# PROFILE SOB DEMANDA (processo vivo, sem restart)
+# ============================================================
+def _estruturas_do_store() -> dict:
+    # cópia rasa do nível de cima dentro do lock (do feed padrão, nunca de um
+    # motor no meio da troca): a ingestão continua mexendo nos dicts enquanto
+    # o tamanho é medido fora dele. Os níveis de baixo seguem vivos;
+    # deep_sizeof tenta de novo o container que mudar durante a visita
+    with LOCK_ESTADO:
+        return {
+            "DATA": dict(DATA),
+            "DADOS_MERCADO_POR_EVENTO": dict(DADOS_MERCADO_POR_EVENTO),
+            "FRAME_LOG_POR_C2": dict(FRAME_LOG_POR_C2),
+            "GOL_FRAME_RING": CAPTURA_GOL.ring.entries(),
+            "SELECTION_ID_TO_C2": dict(SELECTION_ID_TO_C2),
+            "EVENTO_POR_FI": dict(EVENTO_POR_FI),
+            "FI_INPLAY_TO_DELTA_FIS": dict(FI_INPLAY_TO_DELTA_FIS),
+            "MARKET_META_POR_FI": dict(MARKET_META_POR_FI),
+            "ULTIMOS_RAW": list(ULTIMOS_RAW),
+        }
+
+
+STORE_REPORT = StoreReport(_estruturas_do_store, keep=int(os.environ.get("BET_STORE_REPORT_KEEP", "20")))
+
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    """
+    /debug/profile?seconds=N&mode=cpu|alloc[&interval_ms=5]
+    Retorna collapsed stacks (text/plain) prontos para flamegraph.pl/speedscope.
+    cpu: peso = nº de amostras; alloc: peso = bytes alocados e vivos no fim da janela.
+    """
+    mode = (request.args.get("mode") or "cpu").strip().lower()
+    try:
+        seconds = float(request.args.get("seconds", "5"))
+        interval_ms = float(request.args.get("interval_ms", "5"))
+    except ValueError:
+        return jsonify({"erro": "seconds/interval_ms inválidos"}), 400
+
+    try:
+        if mode == "cpu":
+            pesos, ticks = sample_cpu(seconds, interval=interval_ms / 1000.0,
+                                      include_idle=request.args.get("idle") == "1")
+            cab = {"X-Profile-Samples": str(ticks)}
+        elif mode == "alloc":
+            pesos, total = sample_alloc(seconds)
+            cab = {"X-Profile-Bytes": str(total)}
+        else:
+            return jsonify({"erro": "mode deve ser cpu ou alloc"}), 400
+    except ProfilerBusy as e:
+        return jsonify({"erro": str(e)}), 409
+
+    return Response(render_collapsed(pesos), mimetype="text/plain", headers=cab)
+
+
+@app.route("/debug/profile/store", methods=["GET"])
+def debug_profile_store():
+    """
+    Relatório top-N de memória das estruturas do store.
+    Cada chamada tira um relatório novo; ?history=1 devolve também os anteriores.
+    """
+    try:
+        top = max(1, int(request.args.get("top", "10")))
+    except ValueError:
+        top = 10
+    rel = STORE_REPORT.take(top=top)
+    if request.args.get("history") == "1":
+        return jsonify({"atual": rel, "historico": list(STORE_REPORT.history)}), 200
+    return jsonify(rel), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(METRICAS.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/")
@@ -1750,47 +4180,158 @@ def dashboard():
     return render_template("dashboard.html")
 
 
-@app.route("/process_dump", methods=["GET"])
-def process_dump():
-    path = (request.args.get("path") or "").strip()
+# ============================================================
+# PROCESS_DUMP EM BACKGROUND
+# - o arquivo é lido em streaming por um job (thread), com progresso,
+#   cancelamento e limite de frames/s; cada frame usa o ts gravado no dump
+#   (o GC/stale anda como andou na captura)
+# - target=live: aplica no estado ao vivo (mesmo caminho do /data, fora do
+#   log raw); target=isolated: processo worker próprio (ShardPool de 1,
+#   isolado), lido por /process_dump/live e /process_dump/markets
+# ============================================================
+DUMP_RATE_PADRAO = float(os.environ.get("BET_DUMP_RATE", "0"))  # frames/s, 0 = sem limite
+DUMP_JOBS_MAX = int(os.environ.get("BET_DUMP_JOBS_MAX", "20"))
+DUMP_JOBS = {}       # id -> DumpJob (mais novos no fim)
+DUMP_ISOLADOS = {}   # id -> ShardPool isolado
+_LOCK_DUMP_JOBS = threading.Lock()
+_SEQ_DUMP_JOB = [0]
+
+
+def _descartar_job_dump(job_id: str):
+    job = DUMP_JOBS.pop(job_id, None)
+    if job is not None:
+        job.cancel()
+        job.join(timeout=5)
+    pool = DUMP_ISOLADOS.pop(job_id, None)
+    if pool is not None:
+        pool.stop()
+
+
+def iniciar_job_dump(args) -> tuple:
+    """(status, doc). args: path, target=live|isolated, feed (com target=live), rate, ts=recorded|now."""
+    path = (args.get("path") or "").strip()
     if not path:
-        return jsonify({"erro": "use ?path=CAMINHO_DO_ARQUIVO"}), 400
-
+        return 400, {"erro": "use ?path=CAMINHO_DO_ARQUIVO"}
+    if not os.path.isfile(path):
+        return 404, {"erro": f"arquivo não encontrado: {path}"}
+    target = (args.get("target") or "live").strip().lower()
+    if target not in ("live", "isolated"):
+        return 400, {"erro": "target deve ser live ou isolated"}
     try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            txt = f.read()
-
-        blocks = []
-        cur = []
-        for line in txt.splitlines():
-            if line.startswith("--- ts="):
-                if cur:
-                    blocks.append("\n".join(cur))
-                    cur = []
-                continue
-            if line.startswith("== GOAL DETECTED ==") or line.startswith("===== "):
-                continue
-            cur.append(line)
-        if cur:
-            blocks.append("\n".join(cur))
-
-        processed = 0
-        for raw in blocks:
-            raw = raw.strip()
-            if not raw:
-                continue
-            now_ts = ts_agora_utc()
+        rate = float(args.get("rate") or DUMP_RATE_PADRAO)
+    except ValueError:
+        return 400, {"erro": "rate deve ser número (frames/s)"}
+    recorded = (args.get("ts") or "recorded").strip().lower() != "now"
+
+    with _LOCK_DUMP_JOBS:
+        _SEQ_DUMP_JOB[0] += 1
+        job_id = f"d{_SEQ_DUMP_JOB[0]}"
+        velhos = [k for k, j in DUMP_JOBS.items() if j.status != "rodando"]
+        for k in velhos[:max(0, len(DUMP_JOBS) + 1 - DUMP_JOBS_MAX)]:
+            _descartar_job_dump(k)
+
+    if target == "isolated":
+        pool = ShardPool(1, lote=int(os.environ.get("BET_SHARD_BATCH", "32")), isolado=True)
+        DUMP_ISOLADOS[job_id] = pool
+        aplicar = pool.enviar
+    else:
+        feed = feed_da_requisicao(args)
+
+        def aplicar(raw, ts):
+            aplicar_frame_recebido(raw, ts, salvar_raw=False, feed=feed)
+
+    job = DumpJob(job_id, path, aplicar, rate=rate, recorded_ts=recorded, target=target, clock=ts_agora_utc)
+    if target == "isolated":
+        job.on_finish = lambda j: DUMP_ISOLADOS[j.id].flush() if j.id in DUMP_ISOLADOS else None
+    DUMP_JOBS[job_id] = job
+    job.start()
+    return 202, job.progress()
+
+
+def status_job_dump(args) -> tuple:
+    job_id = (args.get("job") or "").strip()
+    if not job_id:
+        return 200, {"jobs": [j.progress() for j in list(DUMP_JOBS.values())]}
+    job = DUMP_JOBS.get(job_id)
+    if job is None:
+        return 404, {"erro": "job não encontrado"}
+    return 200, job.progress()
+
+
+def cancelar_job_dump(args) -> tuple:
+    """Para o job; com drop=1 também esquece o job e derruba o estado isolado."""
+    job_id = (args.get("job") or "").strip()
+    job = DUMP_JOBS.get(job_id)
+    if job is None:
+        return 404, {"erro": "job não encontrado"}
+    job.cancel()
+    job.join(timeout=5)
+    doc = job.progress()
+    if (args.get("drop") or "") in ("1", "true"):
+        _descartar_job_dump(job_id)
+        doc["dropped"] = True
+    return 200, doc
+
+
+def _pool_isolado(args):
+    job_id = (args.get("job") or "").strip()
+    pool = DUMP_ISOLADOS.get(job_id)
+    if pool is None:
+        return None, (404, {"erro": "job isolado não encontrado (use target=isolated)"})
+    return pool, None
+
+
+def live_job_dump(args) -> tuple:
+    pool, erro = _pool_isolado(args)
+    if erro:
+        return erro
+    incluir_odds = (args.get("odds") or "1") != "0"
+    return 200, pool.live(incluir_odds=incluir_odds)
+
+
+def markets_job_dump(args) -> tuple:
+    pool, erro = _pool_isolado(args)
+    if erro:
+        return erro
+    return 200, pool.markets((args.get("c2") or "").strip())
+
+
+@app.route("/process_dump", methods=["GET", "POST"])
+def process_dump():
+    status, doc = iniciar_job_dump(request.args)
+    return jsonify(doc), status
 
-            aprender_fi_para_c2_no_mesmo_frame(raw)
-            parse_frames_placar_ao_vivo(raw, now_ts)
-            parse_odds_e_linhas_do_raw(raw, now_ts)
 
-            processed += 1
+@app.route("/process_dump/status", methods=["GET"])
+def process_dump_status():
+    status, doc = status_job_dump(request.args)
+    return jsonify(doc), status
 
-        return jsonify({"ok": True, "blocks": processed}), 200
-    except Exception as e:
-        return jsonify({"ok": False, "erro": str(e)}), 500
+
+@app.route("/process_dump/cancel", methods=["GET", "POST"])
+def process_dump_cancel():
+    status, doc = cancelar_job_dump(request.args)
+    return jsonify(doc), status
+
+
+@app.route("/process_dump/live", methods=["GET"])
+def process_dump_live():
+    status, doc = live_job_dump(request.args)
+    return jsonify(doc), status
+
+
+@app.route("/process_dump/markets", methods=["GET"])
+def process_dump_markets():
+    status, doc = markets_job_dump(request.args)
+    return jsonify(doc), status
 
 
 if __name__ == "__main__":
+    iniciar_shards()
+    iniciar_historico()
+    iniciar_persistencia()
+    iniciar_publicador_shm()
+    iniciar_vigia_eventos()
+    if SINGLE_WRITER:
+        iniciar_ingestor()
     app.run(host="0.0.0.0", port=8485, threaded=True, debug=False)
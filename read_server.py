@@ -0,0 +1,135 @@
+import os
+import sys
+import signal
+import socket
+import json
+import argparse
+import multiprocessing
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from betws.shm import SnapshotReader
+from betws.markets import keyed_by_name
+
+# ============================================================
+# READ SERVER (processos só de leitura)
+# Serve /live e /markets direto do snapshot que o local_api.py publica em
+# memória compartilhada (BET_SHM_NAME). Nenhum parse de frame nem de JSON:
+# só copia bytes do buffer. Rode N processos na mesma porta (SO_REUSEPORT)
+# e a leitura escala sem disputar o GIL da ingestão.
+# Exceção: /markets?c2= recorta o jogo do /markets publicado e põe a chave
+# por nome aqui (um parse do jogo por publicação, guardado até a próxima).
+#
+# Ex:
+#   BET_SHM_NAME=bet365_snap python local_api.py
+#   python read_server.py --shm bet365_snap --port 8486 --workers 4
+# ============================================================
+
+
+def markets_do_jogo(st: bytes) -> bytes:
+    """Mesmo formato do /markets?c2= do local_api (mercados com chave por nome)."""
+    st = json.loads(st)
+    if isinstance(st, dict) and "mercados" in st:
+        st["mercados"] = keyed_by_name(st.get("mercados", {}))
+    return json.dumps(st, sort_keys=True).encode("utf-8")
+
+
+class Handler(BaseHTTPRequestHandler):
+    leitor: SnapshotReader = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _responder(self, status: int, corpo: bytes, ctype: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("X-Snapshot-Version", str(self.leitor.version))
+        self.send_header("X-Snapshot-Ts-Ms", str(self.leitor.ts_ms))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        qs = parse_qs(url.query)
+
+        if url.path == "/live":
+            odds = (qs.get("odds") or ["1"])[0] != "0"
+            doc = self.leitor.get("live" if odds else "live_sem_odds")
+        elif url.path == "/markets":
+            c2 = ((qs.get("c2") or [""])[0]).strip()
+            if c2:
+                doc = self.leitor.derived("markets", c2, markets_do_jogo)
+                if doc is None and self.leitor.get("markets") is not None:
+                    doc = b"{}"
+            else:
+                doc = self.leitor.get("markets")
+        elif url.path == "/healthz":
+            doc = b'{"ok": true}'
+        else:
+            self._responder(404, b'{"erro": "rota nao encontrada"}')
+            return
+
+        if doc is None:
+            self._responder(503, b'{"erro": "snapshot ainda nao publicado"}')
+            return
+        self._responder(200, doc)
+
+
+class ReusePortServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def servir(shm: str, host: str, port: int):
+    Handler.leitor = SnapshotReader(shm)
+    srv = ReusePortServer((host, port), Handler)
+    try:
+        srv.serve_forever()
+    finally:
+        Handler.leitor.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shm", default=os.environ.get("BET_SHM_NAME", "bet365_snap"))
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8486)
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = ap.parse_args()
+
+    workers = args.workers
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        print("[WARN] SO_REUSEPORT indisponível neste SO; usando 1 processo")
+        workers = 1
+
+    print(f"=== Read Server === shm={args.shm} http://{args.host}:{args.port} workers={workers}")
+    if workers == 1:
+        servir(args.shm, args.host, args.port)
+        return
+
+    procs = [multiprocessing.Process(target=servir, args=(args.shm, args.host, args.port), daemon=True)
+             for _ in range(workers)]
+    for pr in procs:
+        pr.start()
+
+    # SIGTERM no pai também derruba os workers (senão ficam presos na porta)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for pr in procs:
+            pr.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pr in procs:
+            pr.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+
+# ============================================================
+# REPLAY BENCHMARK
+# Reaplica frames gravados (raw_websocket.txt, dump de gol ou arquivo no
+# formato do /process_dump) ou frames sintéticos no motor do local_api,
+# e mede frames/s. Não sobe servidor HTTP.
+#
+# Ex:
+#   python replay_bench.py --synthetic 40:20000 --shards 0,1,2,4
+#   python replay_bench.py --file C:/workspace/bet365-scraper/raw_websocket.txt
+#   python replay_bench.py --journal   (custo do journal/WAL em CPU do ingest)
+#   python replay_bench.py --formats   (JSON x formato plano do /live: tempo e tamanho)
+#   python replay_bench.py --anomalies (scanner de overround: custo por frame e
+#                                       incremental == varredura completa)
+# ============================================================
+
+
+def ler_frames_arquivo(path: str) -> list:
+    """
+    Aceita os dois formatos que o projeto grava:
+    - blocos separados por linhas "--- ts=..." (process_dump / dumps indexados)
+    - frames separados por linha em branco (raw_websocket.txt, goal_*.txt antigos)
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        txt = f.read()
+
+    if "\n--- ts=" in txt or txt.startswith("--- ts="):
+        blocos, cur = [], []
+        for line in txt.splitlines():
+            if line.startswith("--- ts="):
+                if cur:
+                    blocos.append("\n".join(cur))
+                    cur = []
+                continue
+            if line.startswith("== GOAL DETECTED ==") or line.startswith("===== "):
+                continue
+            cur.append(line)
+        if cur:
+            blocos.append("\n".join(cur))
+    else:
+        blocos = txt.split("\n\n")
+
+    return [b.strip() for b in blocos if b.strip()]
+
+
+# ------------------------------------------------------------
+# Frames sintéticos (mesmo formato do WS: overview + detalhe + deltas)
+# ------------------------------------------------------------
+SUF = "_1_3"
+
+
+def _fi(i):
+    return 190000000 + i
+
+
+def _c2(i):
+    return 150000 + i
+
+
+def _sid(i, k):
+    return 500000 + i * 100 + k
+
+
+def frame_overview(n_ev: int) -> str:
+    partes = ["F", "CL;NA=Soccer;"]
+    for i in range(n_ev):
+        partes.append(
+            f"EV;IT=OV{_fi(i)}C1A{SUF};C2={_c2(i)};NA=Team{i}A v Team{i}B;"
+            f"CT=Esoccer Battle - 8 mins play;SS=0-0;TM=1;TS=0;TT=1;TU=20261019120000;MD=0;FI={_fi(i)};OI={_fi(i)};"
+        )
+    return f"\x14OVInPlay{SUF}\x01" + "|".join(partes) + "|"
+
+
+def frame_detalhe(i: int) -> str:
+    fi = _fi(i)
+    p = [f"EV;FI={fi};C2={_c2(i)};NA=Team{i}A v Team{i}B;"]
+    mercados = [
+        ("Fulltime Result", [("Team%dA" % i, "2/1", None, None), ("Draw", "11/4", None, None), ("Team%dB" % i, "5/2", None, None)]),
+        ("Match Goals", [(None, "5/6", "2.5", "O"), (None, "10/11", "2.5", "U")]),
+        ("Asian Handicap", [(None, "4/5", "-0.5", None), (None, "1/1", "+0.5", None)]),
+        ("1st Goal", [("Team%dA" % i, "4/5", None, None), ("No Goal", "10/1", None, None), ("Team%dB" % i, "6/5", None, None)]),
+    ]
+    k = 0
+    for m, (nome_mk, sels) in enumerate(mercados):
+        p.append(f"MG;ID={m + 1}{i};NA={nome_mk};FI={fi};")
+        p.append(f"MA;ID={m + 1}{i};FI={fi};")
+        for o, (na, od, ha, n2) in enumerate(sels):
+            k += 1
+            campos = f"ID={_sid(i, k)};OD={od};SU=0;OR={o};FI={fi};IT=OV{fi}-{_sid(i, k)}{SUF}_0;"
+            if na:
+                campos = f"NA={na};" + campos
+            if ha:
+                campos += f"HA={ha};"
+            if n2:
+                campos += f"N2={n2};"
+            p.append("PA;" + campos)
+    return f"\x14OV{fi}C1A{SUF}\x01F|" + "|".join(p) + "|"
+
+
+def frames_sinteticos(n_ev: int, n_frames: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    out = [frame_overview(n_ev)] + [frame_detalhe(i) for i in range(n_ev)]
+    placar = [[0, 0] for _ in range(n_ev)]
+    for _ in range(n_frames):
+        i = rnd.randrange(n_ev)
+        if rnd.random() < 0.01:
+            placar[i][rnd.randrange(2)] += 1
+            out.append(f"\x15OV{_fi(i)}C1A{SUF}\x01U|SS={placar[i][0]}-{placar[i][1]};TM=3;TS=5;UC=Goal;|\x08")
+            continue
+        deltas = []
+        for _ in range(rnd.randint(1, 4)):
+            sid = _sid(i, rnd.randint(1, 10))
+            su = ";SU=1" if rnd.random() < 0.05 else ";SU=0"
+            deltas.append(f"\x15OV{_fi(i)}-{sid}{SUF}_0\x01U|OD={rnd.randint(1, 20)}/{rnd.randint(1, 10)}{su};|\x08")
+        out.append("".join(deltas))
+    return out
+
+
+# ------------------------------------------------------------
+# Execução
+# ------------------------------------------------------------
+def rodar_local(api, frames: list, feed: str = "bench") -> float:
+    """Roda num motor descartável: cada rodada parte do estado vazio."""
+    api.MOTORES.drop(feed)
+    now_ts = api.ts_agora_utc()
+    with api.MOTORES.use(feed, create=True):
+        t0 = time.perf_counter()
+        for raw in frames:
+            api.processar_frame(raw, now_ts, salvar_raw=False)
+        dt = time.perf_counter() - t0
+    api.MOTORES.drop(feed)
+    return dt
+
+
+def rodar_journal(frames: list, pasta: str, commit_ms: float):
+    """
+    Só o trabalho do journal sobre os mesmos frames: append (caminho do
+    frame) + thread de group commit (encode, crc, write, fsync).
+    Retorna (cpu, journal); process_time soma todos os threads.
+    """
+    from betws.journal import Journal
+    shutil.rmtree(pasta, ignore_errors=True)
+    j = Journal(pasta, commit_ms=commit_ms).open()
+    now_ts = int(time.time())
+    c0 = time.process_time()
+    for raw in frames:
+        j.append(raw, now_ts)
+    j.close()  # último commit entra na conta
+    return time.process_time() - c0, j
+
+
+def medir_journal(api, frames: list, commit_ms: float, rodadas: int = 5):
+    """
+    Overhead = CPU do journal / CPU do ingest, cada um medido isolado (menor
+    de N rodadas). A diferença entre duas rodadas completas (com e sem
+    journal) fica abaixo do ruído da máquina e não serve de medida.
+    """
+    pasta = os.path.join(os.environ["BET_RAW_LOG_DIR"], "journal_bench")
+    ingest, journal = [], []
+    j = None
+    for _ in range(rodadas):
+        c0 = time.process_time()
+        rodar_local(api, frames)
+        ingest.append(time.process_time() - c0)
+        cpu, j = rodar_journal(frames, pasta, commit_ms)
+        journal.append(cpu)
+    base, cj = min(ingest), min(journal)
+    extra = 100.0 * cj / base if base > 0 else 0.0
+    print(f"journal: cpu ingest={base:.3f}s journal={cj:.3f}s  overhead={extra:.1f}%  "
+          f"us/frame={1e6 * cj / len(frames):.2f}  commits={j.stats['commits']} bytes={j.stats['bytes']}  "
+          f"({'dentro' if extra < 5.0 else 'ACIMA'} do limite de 5%)")
+    shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _melhor(fn, rodadas: int = 7) -> float:
+    ts = []
+    for _ in range(rodadas):
+        t0 = time.perf_counter()
+        fn()
+        ts.append(time.perf_counter() - t0)
+    return min(ts)
+
+
+def medir_formatos(api, frames: list, feed: str = "bench"):
+    """Encode/decode e tamanho do /live e do /markets em JSON e no formato plano."""
+    import json
+    from betws import flat
+    api.MOTORES.drop(feed)
+    now_ts = api.ts_agora_utc()
+    with api.MOTORES.use(feed, create=True):
+        for raw in frames:
+            api.processar_frame(raw, now_ts, salvar_raw=False)
+        docs = {"live": api.montar_live(True)}
+        docs["markets"] = api.montar_markets("")
+    api.MOTORES.drop(feed)
+    for tipo, obj in docs.items():
+        dj = api.app.json.dumps(obj).encode("utf-8")
+        df = api.encode_flat(tipo, obj)
+        t_ej = _melhor(lambda: api.app.json.dumps(obj).encode("utf-8"))
+        t_ef = _melhor(lambda: api.encode_flat(tipo, obj))
+        t_dj = _melhor(lambda: json.loads(dj))
+        t_df = _melhor(lambda: flat.decode(df))
+        linhas = len(flat.decode(df)["rows"])
+        print(f"{tipo:<8} seleções={linhas:<6} json: {len(dj):>9} B encode={1e3 * t_ej:7.2f}ms decode={1e3 * t_dj:7.2f}ms | "
+              f"flat: {len(df):>9} B encode={1e3 * t_ef:7.2f}ms decode={1e3 * t_df:7.2f}ms | "
+              f"tamanho x{len(dj) / max(1, len(df)):.1f}")
+
+
+def _varredura_completa(api):
+    """Scanner novo com todos os mercados do motor ativo marcados (o que o incremental evita)."""
+    sc = api.novo_scanner_overround()
+    for c2, st in api.DADOS_MERCADO_POR_EVENTO.items():
+        for mk in ((st or {}).get("mercados") or {}).values():
+            sc.touch(c2, mk)
+    return sc
+
+
+def _resumo_scanner(sc) -> tuple:
+    grupos = {(c2, chave, ln): g["overround"]
+              for c2, mercados in sc._grupos.items() for chave, m in mercados.items() for ln, g in m.out.items()}
+    return grupos, set(sc._abertas)
+
+
+def medir_anomalias(api, frames: list, feed: str = "bench"):
+    """
+    Custo do scanner incremental por frame contra uma varredura completa por
+    frame, e conferência: no fim do replay, o estado do incremental tem que
+    ser igual ao de um scanner que varre todos os mercados de uma vez.
+    """
+    api.MOTORES.drop(feed)
+    now_ts = api.ts_agora_utc()
+    with api.MOTORES.use(feed, create=True):
+        sc = api.OVERROUND
+        gasto = [0.0]
+        flush = sc.flush
+
+        def flush_medido(now):
+            t0 = time.perf_counter()
+            n = flush(now)
+            gasto[0] += time.perf_counter() - t0
+            return n
+
+        sc.flush = flush_medido
+        t0 = time.perf_counter()
+        for raw in frames:
+            api.processar_frame(raw, now_ts, salvar_raw=False)
+        total = time.perf_counter() - t0
+
+        completo = _varredura_completa(api)
+        t_full = _melhor(lambda: _varredura_completa(api).flush(now_ts), rodadas=3)
+        completo.flush(now_ts)
+        n_mercados = completo.stats["markets"]
+        inc, ref = _resumo_scanner(sc), _resumo_scanner(completo)
+        top = sc.top(5)
+    api.MOTORES.drop(feed)
+
+    por_flush = sc.stats["markets"] / max(1, sc.stats["flushes"])
+    print(f"anomalias: ingest={total:.3f}s  scanner={gasto[0]:.3f}s ({100.0 * gasto[0] / total:.1f}%)  "
+          f"us/frame={1e6 * gasto[0] / len(frames):.2f}  mercados/flush={por_flush:.1f} de {n_mercados}")
+    print(f"varredura completa: {1e3 * t_full:.2f}ms por frame ({1e6 * t_full / max(1, n_mercados):.2f}us/mercado) "
+          f"-> x{t_full * len(frames) / max(gasto[0], 1e-9):.0f} o custo do incremental")
+    print(f"incremental == completo: grupos={'ok' if inc[0] == ref[0] else 'DIFERENTE'} "
+          f"abertas={'ok' if inc[1] == ref[1] else 'DIFERENTE'}  ({len(inc[1])} abertas, "
+          f"abertas/fechadas no replay {sc.stats['opened']}/{sc.stats['closed']})")
+    for a in top:
+        print(f"  {a['kind']:<9} {a['overround']:.4f} c2={a['c2']} {a['market']} {a['line'] or ''}")
+
+
+def rodar_sharded(api, frames: list, n: int) -> float:
+    pool = api.ShardPool(n, lote=int(os.environ.get("BET_SHARD_BATCH", "32")))
+    try:
+        pool.live(incluir_odds=False)  # espera os workers subirem
+        now_ts = api.ts_agora_utc()
+        t0 = time.perf_counter()
+        for raw in frames:
+            pool.enviar(raw, now_ts)
+        pool.live(incluir_odds=False)  # barreira: todos os shards processaram tudo
+        return time.perf_counter() - t0
+    finally:
+        pool.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", help="arquivo de captura (raw_websocket.txt, goal_*.txt ou formato do /process_dump)")
+    ap.add_argument("--synthetic", default="40:20000", help="EVENTOS:FRAMES quando --file não é usado")
+    ap.add_argument("--shards", default="0", help="lista de N de shards (0 = processo único), ex: 0,1,2,4")
+    ap.add_argument("--repeat", type=int, default=1, help="repete a lista de frames N vezes")
+    ap.add_argument("--journal", action="store_true", help="mede o overhead de CPU do journal (WAL) no ingest")
+    ap.add_argument("--journal-commit-ms", type=float, default=10.0, help="janela do group commit no --journal")
+    ap.add_argument("--formats", action="store_true", help="compara JSON e formato plano (encode/decode/tamanho) do /live")
+    ap.add_argument("--anomalies", action="store_true", help="custo e conferência do scanner de overround (/anomalies)")
+    args = ap.parse_args()
+
+    # o replay não deve escrever log raw/dumps de gol no disco do usuário
+    os.environ.setdefault("BET_RAW_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".bench_tmp"))
+    os.environ.setdefault("BET_GOL_DUMP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".bench_tmp", "gol"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import local_api as api
+    api.CAPTURA_GOL_ATIVA = False
+
+    if args.file:
+        frames = ler_frames_arquivo(args.file)
+    else:
+        n_ev, n_frames = (int(x) for x in args.synthetic.split(":"))
+        frames = frames_sinteticos(n_ev, n_frames)
+    frames = frames * max(1, args.repeat)
+    total_bytes = sum(len(f) for f in frames)
+    print(f"frames={len(frames)} bytes={total_bytes}")
+
+    if args.journal:
+        medir_journal(api, frames, args.journal_commit_ms)
+        return
+
+    if args.formats:
+        medir_formatos(api, frames)
+        return
+
+    if args.anomalies:
+        medir_anomalias(api, frames)
+        return
+
+    base = None
+    for n in (int(x) for x in args.shards.split(",")):
+        dt = rodar_local(api, frames) if n == 0 else rodar_sharded(api, frames, n)
+        fps = len(frames) / dt if dt > 0 else 0.0
+        base = base or fps
+        print(f"shards={n:<3} tempo={dt:8.3f}s  frames/s={fps:10.0f}  us/frame={1e6 * dt / len(frames):8.1f}  x{fps / base:5.2f}")
+
+
+if __name__ == "__main__":
+    main()
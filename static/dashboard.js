@@ -1,5 +1,19 @@
-const prevOdds = new Map(); // key -> number
-let timer = null;
+// Dashboard por push: assina /stream?topics=live (ou live_no_odds) e aplica
+// os deltas do servidor direto no DOM, seleção por seleção.
+// O servidor monta um delta por versão do estado e manda o mesmo para todos
+// os dashboards abertos; aqui só se mexe no que mudou (nada de innerHTML
+// da grade inteira).
+//
+// mensagem "live" = { version, since, full, events, removed: {events, markets, selections} }
+// evento = { event_id, event, league, time, score, period, mercados?: { nome: { suspenso, selecoes: [...] } } }
+
+const MAX_MERCADOS = 3; // por jogo, pra não lotar
+const MAX_SELECOES = 8; // por mercado
+
+const cards = new Map(); // event_id -> { el, campos: {...}, mercados: Map(nome -> { el, grid, sels: Map(chave -> { row, nome, odd, valor }) }) }
+let versao = null;       // versão do documento que está na tela
+let fonte = null;        // EventSource
+let pendentes = null;    // mensagens que chegaram durante um resync
 
 function nowStr() {
   return new Date().toLocaleTimeString();
@@ -12,140 +26,238 @@ function formatOdd(x) {
   return n.toFixed(2);
 }
 
-function oddClass(key, value) {
-  const n = Number(value);
-  if (!Number.isFinite(n)) return "";
-  const prev = prevOdds.get(key);
-  prevOdds.set(key, n);
-  if (prev === undefined) return "";
-  if (n > prev) return "up";
-  if (n < prev) return "down";
-  return "";
-}
-
-// Seu backend já retorna:
-// event = { id, event, league, time, score, period, odds? }
-// odds = { "Market Name": [ {selection, odds_decimal, odds_fractional, selection_id}, ... ] }
-function renderMatch(m) {
-  const id = m.id ?? "";
-  const title = m.event ?? "";
-  const league = m.league ?? "";
-  const time = m.time ?? "";
-  const score = m.score ?? "";
-  const period = m.period ?? "";
-
-  const oddsObj = m.odds && typeof m.odds === "object" ? m.odds : null;
-
-  let oddsHtml = `<div class="muted small">Odds: desativadas</div>`;
-  if (oddsObj) {
-    const markets = Object.keys(oddsObj);
-    if (markets.length === 0) {
-      oddsHtml = `<div class="muted small">Sem odds disponíveis</div>`;
-    } else {
-      // mostra no máximo 3 mercados pra não lotar (você pode aumentar)
-      const topMarkets = markets.slice(0, 3);
-      oddsHtml = topMarkets.map(mktName => {
-        const sels = Array.isArray(oddsObj[mktName]) ? oddsObj[mktName] : [];
-        const rows = sels.slice(0, 8).map(s => {
-          const nm = s.selection ?? ("Selection " + (s.selection_id ?? ""));
-          const od = s.odds_decimal ?? s.odds_fractional ?? "";
-          const key = `${id}::${mktName}::${s.selection_id ?? nm}`;
-          const cls = oddClass(key, od);
-          return `
-            <div class="selRow ${cls}">
-              <div class="selName">${nm}</div>
-              <div class="selOdd">${formatOdd(od)}</div>
-            </div>
-          `;
-        }).join("");
-
-        return `
-          <div class="market">
-            <div class="marketTitle">${mktName}</div>
-            <div class="marketGrid">${rows || `<div class="muted small">Sem seleções</div>`}</div>
-          </div>
-        `;
-      }).join("");
-    }
-  }
+function el(tag, cls, text) {
+  const e = document.createElement(tag);
+  if (cls) e.className = cls;
+  if (text !== undefined) e.textContent = text;
+  return e;
+}
 
-  return `
-    <section class="match" data-id="${id}">
-      <div class="matchHead">
-        <div class="teams">
-          <div>
-            <div class="team">${title || "<span class='muted'>(sem nome)</span>"}</div>
-            <div class="small muted">${league}</div>
-          </div>
-          <div class="scoreBox">
-            <div class="score">${score || "—"}</div>
-            <div class="small muted">${time} • ${period}</div>
-          </div>
-        </div>
-        <div class="meta">
-          <div class="muted">id: ${id}</div>
-          <div class="muted">live</div>
-        </div>
-      </div>
-
-      <div class="odds">
-        ${oddsHtml}
-      </div>
-    </section>
-  `;
-}
-
-async function fetchLive() {
-  const sport = document.getElementById("sport").value;
-  const odds = document.getElementById("odds").value;
-  const filter = document.getElementById("filter").value.trim().toLowerCase();
+// mesma chave do servidor (betws/delta.py: selection_key)
+function chaveSelecao(s) {
+  return s.selection_id || s.selection_it || s.nome || "";
+}
+
+function filtroAtual() {
+  return document.getElementById("filter").value.trim().toLowerCase();
+}
+
+function aplicarFiltro(card, filtro) {
+  card.el.hidden = !!filtro && !card.el.textContent.toLowerCase().includes(filtro);
+}
+
+// ---------- construção (uma vez por jogo / mercado / seleção) ----------
+function criarCard(id) {
+  const sec = el("section", "match");
+  sec.dataset.id = id;
 
-  const t0 = performance.now();
-  document.getElementById("status").textContent = "atualizando…";
+  const head = el("div", "matchHead");
+  const teams = el("div", "teams");
+  const esq = el("div");
+  const nome = el("div", "team", "(sem nome)");
+  const liga = el("div", "small muted");
+  esq.append(nome, liga);
+  const box = el("div", "scoreBox");
+  const placar = el("div", "score", "—");
+  const tempo = el("div", "small muted");
+  box.append(placar, tempo);
+  teams.append(esq, box);
+  const meta = el("div", "meta");
+  meta.append(el("div", "muted", "id: " + id), el("div", "muted", "live"));
+  head.append(teams, meta);
 
-  const res = await fetch(`/live?sport=${encodeURIComponent(sport)}&odds=${encodeURIComponent(odds)}`, { cache: "no-store" });
-  const t1 = performance.now();
+  const odds = el("div", "odds");
+  const vazio = el("div", "muted small", "Sem odds disponíveis");
+  odds.append(vazio);
+  sec.append(head, odds);
 
-  document.getElementById("lat").textContent = Math.round(t1 - t0) + "ms";
-  document.getElementById("last").textContent = nowStr();
+  const card = { el: sec, nome, liga, placar, tempo, odds, vazio, campos: {}, mercados: new Map() };
+  cards.set(id, card);
+  document.getElementById("grid").append(sec);
+  return card;
+}
+
+function criarMercado(card, nome) {
+  const box = el("div", "market");
+  const titulo = el("div", "marketTitle", nome);
+  const grid = el("div", "marketGrid");
+  box.append(titulo, grid);
+  card.odds.append(box);
+  card.vazio.hidden = true;
+  const mk = { el: box, titulo, grid, sels: new Map() };
+  card.mercados.set(nome, mk);
+  return mk;
+}
 
-  if (!res.ok) throw new Error("HTTP " + res.status);
-  let list = await res.json();
-  if (!Array.isArray(list)) list = [];
+function criarSelecao(mk, chave) {
+  const row = el("div", "selRow");
+  const nome = el("div", "selName");
+  const odd = el("div", "selOdd", "—");
+  row.append(nome, odd);
+  mk.grid.append(row);
+  const sel = { row, nome, odd, valor: undefined };
+  mk.sels.set(chave, sel);
+  return sel;
+}
 
-  if (filter) {
-    list = list.filter(m => JSON.stringify(m).toLowerCase().includes(filter));
+// ---------- atualização (só o que veio no delta) ----------
+function atualizarSelecao(sel, s) {
+  const nm = s.nome ?? ("Selection " + (s.selection_id ?? ""));
+  if (sel.nome.textContent !== nm) sel.nome.textContent = nm;
+  const od = s.od_dec ?? s.od_frac ?? "";
+  const txt = formatOdd(od);
+  if (sel.odd.textContent !== txt) sel.odd.textContent = txt;
+  const n = Number(od);
+  sel.row.classList.remove("up", "down");
+  if (Number.isFinite(n) && sel.valor !== undefined && n !== sel.valor) {
+    sel.row.classList.add(n > sel.valor ? "up" : "down");
   }
+  if (Number.isFinite(n)) sel.valor = n;
+  sel.row.classList.toggle("muted", !!s.suspenso);
+}
 
-  document.getElementById("count").textContent = String(list.length);
-  document.getElementById("grid").innerHTML = list.map(renderMatch).join("");
-  document.getElementById("status").textContent = "ok";
+function atualizarMercado(card, nome, m) {
+  let mk = card.mercados.get(nome);
+  if (!mk) {
+    if (card.mercados.size >= MAX_MERCADOS) return;
+    mk = criarMercado(card, nome);
+  }
+  mk.titulo.classList.toggle("muted", !!m.suspenso);
+  for (const s of m.selecoes || []) {
+    const chave = chaveSelecao(s);
+    let sel = mk.sels.get(chave);
+    if (!sel) {
+      if (mk.sels.size >= MAX_SELECOES) continue;
+      sel = criarSelecao(mk, chave);
+    }
+    atualizarSelecao(sel, s);
+  }
 }
 
-function start() {
-  const interval = Math.max(250, Number(document.getElementById("interval").value) || 1000);
+function atualizarEvento(ev, filtro) {
+  const id = ev.event_id;
+  if (!id) return;
+  const card = cards.get(id) || criarCard(id);
+  Object.assign(card.campos, ev);
+  const c = card.campos;
+  if ("event" in ev) card.nome.textContent = c.event || "(sem nome)";
+  if ("league" in ev) card.liga.textContent = c.league ?? "";
+  if ("score" in ev) card.placar.textContent = c.score || "—";
+  if ("time" in ev || "period" in ev) card.tempo.textContent = `${c.time ?? ""} • ${c.period ?? ""}`;
+  for (const [nome, m] of Object.entries(ev.mercados || {})) {
+    atualizarMercado(card, nome, m);
+  }
+  aplicarFiltro(card, filtro);
+}
 
-  if (timer) clearInterval(timer);
+function remover(removed) {
+  for (const id of removed.events || []) {
+    const card = cards.get(id);
+    if (card) {
+      card.el.remove();
+      cards.delete(id);
+    }
+  }
+  for (const [id, nome] of removed.markets || []) {
+    const card = cards.get(id);
+    const mk = card && card.mercados.get(nome);
+    if (mk) {
+      mk.el.remove();
+      card.mercados.delete(nome);
+      card.vazio.hidden = card.mercados.size > 0;
+    }
+  }
+  for (const [id, nome, chave] of removed.selections || []) {
+    const mk = cards.get(id)?.mercados.get(nome);
+    const sel = mk && mk.sels.get(chave);
+    if (sel) {
+      sel.row.remove();
+      mk.sels.delete(chave);
+    }
+  }
+}
 
-  fetchLive().catch(err => {
+function limpar() {
+  cards.clear();
+  document.getElementById("grid").replaceChildren();
+}
+
+function aplicar(doc) {
+  if (doc.full) {
+    limpar();
+  } else if (versao !== null && doc.version <= versao) {
+    return; // já está na tela (snapshot mais novo que o delta)
+  }
+  const filtro = filtroAtual();
+  remover(doc.removed || {});
+  for (const ev of doc.events || []) atualizarEvento(ev, filtro);
+  versao = doc.version;
+  document.getElementById("count").textContent = String(cards.size);
+  document.getElementById("ver").textContent = String(versao);
+}
+
+// delta que começa depois da nossa versão = perdemos mensagens (fila cheia,
+// assinatura no meio de uma publicação): busca o que falta no /live?since=
+async function resync(odds) {
+  const f = fonte;
+  try {
+    const res = await fetch(`/live?since=${versao}&odds=${odds}`, { cache: "no-store" });
+    if (!res.ok) throw new Error("HTTP " + res.status);
+    const doc = await res.json();
+    if (f !== fonte) return; // trocou de tópico no meio
+    aplicar(doc);
+  } catch (err) {
     console.error(err);
-    document.getElementById("status").textContent = "erro";
-  });
+    if (f === fonte) start(); // recomeça do documento inteiro
+    return;
+  }
+  const fila = pendentes;
+  pendentes = null;
+  for (const doc of fila) receber(doc, odds);
+}
 
-  timer = setInterval(() => {
-    fetchLive().catch(err => {
-      console.error(err);
-      document.getElementById("status").textContent = "erro";
-    });
-  }, interval);
+function receber(doc, odds) {
+  if (pendentes !== null) {
+    pendentes.push(doc);
+    return;
+  }
+  if (!doc.full && versao !== null && doc.since > versao) {
+    pendentes = [doc];
+    resync(odds);
+    return;
+  }
+  aplicar(doc);
 }
 
-["sport","odds","interval"].forEach(id => {
-  document.getElementById(id).addEventListener("change", start);
-});
+function start() {
+  const odds = document.getElementById("odds").value;
+  if (fonte) fonte.close();
+  versao = null;
+  pendentes = null;
+  limpar();
+  document.getElementById("status").textContent = "conectando…";
+
+  fonte = new EventSource(`/stream?topics=${odds === "0" ? "live_no_odds" : "live"}`);
+  fonte.addEventListener("live", e => {
+    const t0 = performance.now();
+    receber(JSON.parse(e.data), odds);
+    document.getElementById("lat").textContent = (performance.now() - t0).toFixed(1) + "ms";
+    document.getElementById("last").textContent = nowStr();
+    document.getElementById("status").textContent = "ok";
+  });
+  // o EventSource reconecta sozinho; a reconexão começa com o documento inteiro
+  fonte.onerror = () => {
+    document.getElementById("status").textContent = "reconectando…";
+  };
+}
+
+document.getElementById("odds").addEventListener("change", start);
 document.getElementById("filter").addEventListener("input", () => {
   clearTimeout(window.__filterT);
-  window.__filterT = setTimeout(start, 250);
+  window.__filterT = setTimeout(() => {
+    const filtro = filtroAtual();
+    for (const card of cards.values()) aplicarFiltro(card, filtro);
+  }, 250);
 });
 
 start();
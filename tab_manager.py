@@ -1,11 +1,16 @@
+import os
 import re
+import math
 import time
 import json
+import asyncio
 import argparse
-from typing import Dict, Optional, Set, Any
+import itertools
+from typing import Callable, Dict, List, Optional, Set, Any
+from urllib.parse import urlparse
 
 import requests
-from websocket import create_connection
+from websockets.asyncio.client import connect
 
 # ============================================================
 # Regex para extrair C2 da URL da Bet365
@@ -19,15 +24,25 @@ def extract_c2(url: str) -> Optional[str]:
 
 
 # ============================================================
-# CDP CLIENT (Browser-level WebSocket)
-# Usa Target.createTarget / Target.closeTarget
+# CDP CLIENT (Browser-level WebSocket, asyncio)
+# - cada comando tem um future indexado pelo id; uma task lê o socket e
+#   resolve o future certo (nada de descartar mensagens esperando o id)
+# - eventos (mensagens sem id) vão para os handlers registrados em on()
 # ============================================================
-class CDPClient:
-    def __init__(self, base_url: str):
+class CDPError(RuntimeError):
+    pass
+
+
+class AsyncCDPClient:
+    def __init__(self, base_url: str, timeout: float = 15.0):
         self.base_url = base_url.rstrip("/")
-        self.ws_url = self._get_browser_ws_url()
+        self.timeout = timeout
         self.ws = None
-        self.next_id = 1
+        self._ids = itertools.count(1)
+        self._pendentes: Dict[int, asyncio.Future] = {}
+        self._handlers: Dict[str, List[Callable[[dict], Any]]] = {}
+        self._leitor: Optional[asyncio.Task] = None
+        self.fechado = asyncio.Event()
 
     def _get_browser_ws_url(self) -> str:
         r = requests.get(f"{self.base_url}/json/version", timeout=5)
@@ -38,144 +53,695 @@ class CDPClient:
             raise RuntimeError("webSocketDebuggerUrl não encontrado. Brave foi iniciado com --remote-debugging-port?")
         return ws
 
-    def _ensure_ws(self):
-        if self.ws is None:
-            self.ws = create_connection(self.ws_url, timeout=10)
+    async def connect(self):
+        ws_url = await asyncio.to_thread(self._get_browser_ws_url)
+        self.ws = await connect(ws_url, max_size=None, ping_interval=None)
+        self.fechado.clear()
+        self._leitor = asyncio.create_task(self._ler())
+        return self
 
-    def _call(self, method: str, params: dict | None = None) -> dict:
-        self._ensure_ws()
-        msg_id = self.next_id
-        self.next_id += 1
+    def on(self, method: str, handler: Callable[[dict], Any]):
+        self._handlers.setdefault(method, []).append(handler)
 
-        payload = {
-            "id": msg_id,
-            "method": method
-        }
+    async def _ler(self):
+        try:
+            async for raw in self.ws:
+                msg = json.loads(raw)
+                mid = msg.get("id")
+                if mid is not None:
+                    fut = self._pendentes.pop(mid, None)
+                    if fut is None or fut.done():
+                        continue
+                    if "error" in msg:
+                        fut.set_exception(CDPError(f"CDP error: {msg['error']}"))
+                    else:
+                        fut.set_result(msg.get("result", {}))
+                    continue
+                for h in self._handlers.get(msg.get("method", ""), ()):
+                    try:
+                        r = h(msg.get("params") or {})
+                        if asyncio.iscoroutine(r):
+                            asyncio.create_task(r)
+                    except Exception as e:
+                        print(f"[WARN] handler {msg.get('method')}: {e}")
+        except Exception as e:
+            print(f"[WARN] conexão CDP caiu: {e}")
+        finally:
+            for fut in self._pendentes.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("conexão CDP fechada"))
+            self._pendentes.clear()
+            self.fechado.set()
+
+    async def call(self, method: str, params: dict | None = None, session_id: str | None = None) -> dict:
+        if self.ws is None or self.fechado.is_set():
+            raise ConnectionError("CDP não conectado")
+        msg_id = next(self._ids)
+        payload = {"id": msg_id, "method": method}
         if params:
             payload["params"] = params
+        if session_id:
+            payload["sessionId"] = session_id
+        fut = asyncio.get_running_loop().create_future()
+        self._pendentes[msg_id] = fut
+        try:
+            await self.ws.send(json.dumps(payload))
+            return await asyncio.wait_for(fut, self.timeout)
+        finally:
+            self._pendentes.pop(msg_id, None)
 
-        self.ws.send(json.dumps(payload))
-
-        while True:
-            resp = json.loads(self.ws.recv())
-            if resp.get("id") == msg_id:
-                if "error" in resp:
-                    raise RuntimeError(f"CDP error {method}: {resp['error']}")
-                return resp.get("result", {})
-
-    def new_tab(self, url: str) -> dict:
-        res = self._call("Target.createTarget", {"url": url})
+    async def new_tab(self, url: str) -> dict:
+        res = await self.call("Target.createTarget", {"url": url})
         return {"id": res.get("targetId")}
 
-    def close_tab(self, target_id: str) -> bool:
-        self._call("Target.closeTarget", {"targetId": target_id})
+    async def close_tab(self, target_id: str) -> bool:
+        await self.call("Target.closeTarget", {"targetId": target_id})
+        return True
+
+    async def reload_tab(self, target_id: str, ignore_cache: bool = True) -> bool:
+        # conexão é browser-level: Page.* precisa de uma sessão na aba (flatten)
+        res = await self.call("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+        sid = res.get("sessionId")
+        try:
+            await self.call("Page.reload", {"ignoreCache": ignore_cache}, session_id=sid)
+        finally:
+            try:
+                await self.call("Target.detachFromTarget", {"sessionId": sid})
+            except Exception:
+                pass
         return True
 
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._leitor is not None:
+            await asyncio.gather(self._leitor, return_exceptions=True)
+
 
 # ============================================================
-# LOCAL API HELPERS
+# LOCAL API: push de início/fim de jogo via SSE (/stream?topics=events)
 # ============================================================
-def get_targets(local_api: str, limit: int) -> list[str]:
-    r = requests.get(
-        f"{local_api}/targets",
-        params={"limit": str(limit)},
-        timeout=10
-    )
-    r.raise_for_status()
-    data = r.json()
-    return data.get("urls", []) if isinstance(data, dict) else []
-
-def get_active_ids(local_api: str) -> Set[str]:
-    r = requests.get(f"{local_api}/active_ids", timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    return {str(x) for x in data.get("ids", [])}
+async def stream_eventos(local_api: str, topics: str = "events"):
+    """
+    Gera (evento, dados) do /stream. Cada conexão nova começa com um
+    "snapshot" (ids ativos), então reconectar já ressincroniza o estado.
+    """
+    u = urlparse(local_api)
+    porta = u.port or (443 if u.scheme == "https" else 80)
+    r, w = await asyncio.open_connection(u.hostname, porta, ssl=(u.scheme == "https") or None)
+    try:
+        w.write((
+            f"GET /stream?topics={topics} HTTP/1.1\r\nHost: {u.hostname}\r\n"
+            "Accept: text/event-stream\r\nConnection: keep-alive\r\n\r\n"
+        ).encode())
+        await w.drain()
+
+        status = await r.readline()
+        if b" 200 " not in status:
+            raise ConnectionError(f"/stream respondeu {status!r}")
+        chunked = False
+        while True:
+            h = await r.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            if h.lower().startswith(b"transfer-encoding:") and b"chunked" in h.lower():
+                chunked = True
+
+        async def linhas():
+            if not chunked:
+                while True:
+                    ln = await r.readline()
+                    if not ln:
+                        return
+                    yield ln
+            buf = b""
+            while True:
+                tam = int((await r.readline()).strip() or b"0", 16)
+                if tam == 0:
+                    return
+                buf += await r.readexactly(tam)
+                await r.readexactly(2)
+                *prontas, buf = buf.split(b"\n")
+                for ln in prontas:
+                    yield ln + b"\n"
+
+        evento, dados = "message", []
+        async for ln in linhas():
+            ln = ln.decode("utf-8").rstrip("\r\n")
+            if not ln:
+                if dados:
+                    yield evento, json.loads("\n".join(dados))
+                evento, dados = "message", []
+            elif ln.startswith(":"):
+                continue
+            elif ln.startswith("event:"):
+                evento = ln[6:].strip()
+            elif ln.startswith("data:"):
+                dados.append(ln[5:].lstrip())
+    finally:
+        w.close()
 
 
 # ============================================================
-# MAIN LOOP
+# ESCALONADOR ADAPTATIVO
+# Nota de cada jogo = valor / custo, com as taxas do /feed_rates:
+#   valor = fator_tempo * (w_mercados*M + w_taxa*R + w_stale*S)
+#     M: nº de mercados (log, saturando em ~50)
+#     R: frames/s do jogo (log, saturando em ~10/s) — só mede com aba aberta
+#     S: quanto o dado está velho SEM aba aberta (0..1 em --stale-horizon s);
+#        jogo nunca visto conta como S=1
+#     fator_tempo: 0.25..1 conforme o tempo restante (--time-horizon)
+#   custo = 1 + custo_kb * (KB/s do jogo)
+# Dentro do orçamento (--max-tabs) mantém as maiores notas; troca uma aba
+# aberta por uma candidata só se a candidata for (1 + histerese) melhor e a
+# aberta já tiver ficado --min-dwell s (tempo de a taxa dela ser medida).
 # ============================================================
-def run_loop(
-    local_api: str,
-    cdp_url: str,
-    poll: float,
-    max_tabs: int,
-    open_per_tick: int
-):
-    cdp = CDPClient(cdp_url)
+class Escalonador:
+    def __init__(
+        self,
+        w_mercados: float = 1.0,
+        w_taxa: float = 1.5,
+        w_stale: float = 1.0,
+        custo_kb: float = 0.05,
+        time_horizon: float = 240.0,
+        stale_horizon: float = 120.0,
+        histerese: float = 0.25,
+        min_dwell: float = 30.0,
+        trocas_por_ciclo: int = 1
+    ):
+        self.w_mercados = w_mercados
+        self.w_taxa = w_taxa
+        self.w_stale = w_stale
+        self.custo_kb = custo_kb
+        self.time_horizon = time_horizon
+        self.stale_horizon = stale_horizon
+        self.histerese = histerese
+        self.min_dwell = min_dwell
+        self.trocas_por_ciclo = trocas_por_ciclo
+
+    def nota(self, info: Optional[dict], aberta: bool) -> float:
+        if not info:
+            return self.w_stale  # sem taxa ainda: vale como "nunca visto"
+        if info.get("period") == "Fim":
+            return 0.0
+
+        restante = info.get("restante_s")
+        tempo = 1.0 if restante is None else min(1.0, restante / self.time_horizon)
+        fator_tempo = 0.25 + 0.75 * tempo
+
+        m = min(1.0, math.log1p(info.get("mercados") or 0) / math.log1p(50))
+        r = min(1.0, math.log1p(info.get("frames_s") or 0.0) / math.log1p(10))
+        if aberta:
+            stale = 0.0
+        elif info.get("idade_s") is None:
+            stale = 1.0
+        else:
+            stale = min(1.0, info["idade_s"] / self.stale_horizon)
+
+        valor = fator_tempo * (self.w_mercados * m + self.w_taxa * r + self.w_stale * stale)
+        custo = 1.0 + self.custo_kb * (info.get("bytes_s") or 0.0) / 1024.0
+        return valor / custo
+
+    def planejar(self, ativos: Dict[str, str], rates: Dict[str, dict], abertas: Dict[str, float],
+                 ocupadas: int, max_tabs: int, bloqueados: Set[str], agora: float):
+        """
+        ativos: c2 -> url; abertas: c2 -> opened_at (abas que podem sair);
+        ocupadas: vagas já em uso (abertas + abrindo); bloqueados: c2 que não
+        podem abrir agora (abrindo, cooldown).
+        Retorna (abrir [(c2, url)], fechar [c2], notas {c2: nota}).
+        """
+        notas = {c2: self.nota(rates.get(c2), c2 in abertas) for c2 in ativos}
+        candidatos = sorted(
+            (c2 for c2 in ativos if c2 not in abertas and c2 not in bloqueados and ativos[c2]),
+            key=lambda c2: -notas[c2]
+        )
+
+        abrir, fechar = [], []
+        vagas = max_tabs - ocupadas
+        while vagas > 0 and candidatos:
+            c2 = candidatos.pop(0)
+            abrir.append((c2, ativos[c2]))
+            vagas -= 1
+
+        trocaveis = sorted(
+            (c2 for c2, aberta_em in abertas.items() if c2 in notas and agora - aberta_em >= self.min_dwell),
+            key=lambda c2: notas[c2]
+        )
+        for _ in range(self.trocas_por_ciclo):
+            if not candidatos or not trocaveis:
+                break
+            melhor, pior = candidatos[0], trocaveis[0]
+            if notas[melhor] <= notas[pior] * (1.0 + self.histerese) or notas[melhor] <= 0:
+                break
+            candidatos.pop(0)
+            trocaveis.pop(0)
+            fechar.append(pior)
+            abrir.append((melhor, ativos[melhor]))
+        return abrir, fechar, notas
 
-    # c2 -> { target_id, url, opened_at }
-    open_tabs: Dict[str, Dict[str, Any]] = {}
 
-    while True:
-        start = time.time()
+# ============================================================
+# POOL DE NAVEGADORES (um endpoint CDP por navegador/host)
+# spec: URL[,cap=N][,cores=N][,name=NOME]
+#   ex: --cdp http://127.0.0.1:9222,cap=10 --cdp http://10.0.0.5:9222,cap=6,cores=4,name=pc2
+# Cada c2 fica em exatamente um navegador. Abertura vai para o endpoint vivo
+# com menor carga = abas/capacidade + w_cpu * (CPU do navegador / núcleos),
+# com a CPU medida por SystemInfo.getProcessInfo (soma de cpuTime de todos
+# os processos do navegador).
+# ============================================================
+class Endpoint:
+    def __init__(self, url: str, capacidade: int, nome: Optional[str] = None, cores: Optional[int] = None):
+        self.url = url.rstrip("/")
+        self.capacidade = max(0, int(capacidade))
+        self.nome = nome or (urlparse(self.url).netloc or self.url)
+        self.cores = max(1, int(cores or os.cpu_count() or 1))
+        self.cdp: Optional[AsyncCDPClient] = None
+        self.vivo = False
+        self.cpu = 0.0  # núcleos em uso pelo navegador inteiro
+        self._cpu_ant = None  # (relógio, cpuTime total)
+
+    async def amostrar_cpu(self):
+        res = await self.cdp.call("SystemInfo.getProcessInfo")
+        total = sum(float(p.get("cpuTime") or 0.0) for p in res.get("processInfo", []))
+        agora = time.monotonic()
+        if self._cpu_ant is not None and agora > self._cpu_ant[0]:
+            self.cpu = max(0.0, (total - self._cpu_ant[1]) / (agora - self._cpu_ant[0]))
+        self._cpu_ant = (agora, total)
+
+
+def parse_endpoint(spec: str, cap_padrao: int) -> Endpoint:
+    partes = [p.strip() for p in spec.split(",") if p.strip()]
+    opts = dict(p.split("=", 1) for p in partes[1:] if "=" in p)
+    return Endpoint(
+        partes[0],
+        int(opts.get("cap", cap_padrao)),
+        nome=opts.get("name"),
+        cores=int(opts["cores"]) if "cores" in opts else None
+    )
 
-        # ----------------------------
-        # Ativos
-        # ----------------------------
-        try:
-            active_ids = get_active_ids(local_api)
-        except Exception as e:
-            print(f"[WARN] erro ao buscar active_ids: {e}")
-            active_ids = set()
-
-        # ----------------------------
-        # Fechar abas inativas
-        # ----------------------------
-        for c2, meta in list(open_tabs.items()):
-            if c2 not in active_ids:
+
+# ============================================================
+# TAB MANAGER (reage a eventos, abre/fecha abas em paralelo)
+# ============================================================
+class TabManager:
+    def __init__(self, endpoints: List[Endpoint], max_tabs: int, max_parallel: int, reopen_cooldown: float,
+                 escalonador: Optional[Escalonador] = None, stall_after: float = 30.0,
+                 max_reloads: int = 1, max_replaces: int = 1, stall_block: float = 180.0,
+                 w_cpu: float = 1.0):
+        self.pool: Dict[str, Endpoint] = {ep.nome: ep for ep in endpoints}
+        self.max_tabs = max_tabs
+        self.reopen_cooldown = reopen_cooldown
+        self.max_parallel = max(1, max_parallel)
+        self.sems: Dict[str, asyncio.Semaphore] = {nome: asyncio.Semaphore(self.max_parallel) for nome in self.pool}
+        self.escalonador = escalonador or Escalonador()
+        self.w_cpu = w_cpu
+
+        # c2 -> linha do /feed_rates (push do tópico "rates")
+        self.rates: Dict[str, dict] = {}
+        self.rates_em = 0.0  # hora local em que o último "rates" chegou
+        self.notas: Dict[str, float] = {}
+
+        # saúde do feed por aba: parada há mais de stall_after s ->
+        # reload (até max_reloads) -> aba nova (até max_replaces) -> jogo
+        # bloqueado por stall_block s (a vaga vai para outro jogo)
+        self.stall_after = stall_after
+        self.max_reloads = max_reloads
+        self.max_replaces = max_replaces
+        self.stall_block = stall_block
+        self.falhas: Dict[str, Dict[str, int]] = {}  # c2 -> {reloads, replaces}
+        self.bloqueado_ate: Dict[str, float] = {}
+        self.recarregando: Set[str] = set()
+
+        # c2 -> url (ordem de chegada = prioridade de abertura)
+        self.ativos: Dict[str, str] = {}
+        # c2 -> { target_id, url, opened_at, endpoint }
+        self.open_tabs: Dict[str, Dict[str, Any]] = {}
+        self.target_to_c2: Dict[tuple, str] = {}  # (endpoint, target_id) -> c2
+        self.abrindo: Dict[str, str] = {}  # c2 -> endpoint
+        self.fechando: Set[str] = set()
+        self.ultimo_open: Dict[str, float] = {}
+
+        self.sujo = asyncio.Event()
+
+    # ---------- pool ----------
+    def abas_no_endpoint(self, nome: str) -> int:
+        n = sum(1 for m in self.open_tabs.values() if m["endpoint"] == nome)
+        return n + sum(1 for e in self.abrindo.values() if e == nome)
+
+    def carga(self, ep: Endpoint) -> float:
+        if not ep.capacidade:
+            return float("inf")
+        return self.abas_no_endpoint(ep.nome) / ep.capacidade + self.w_cpu * ep.cpu / ep.cores
+
+    def capacidade_viva(self) -> int:
+        total = sum(ep.capacidade for ep in self.pool.values() if ep.vivo)
+        return min(total, self.max_tabs) if self.max_tabs > 0 else total
+
+    def escolher_endpoint(self) -> Optional[Endpoint]:
+        livres = [ep for ep in self.pool.values()
+                  if ep.vivo and self.abas_no_endpoint(ep.nome) < ep.capacidade]
+        return min(livres, key=self.carga) if livres else None
+
+    def _ligar_eventos(self, ep: Endpoint, cdp: AsyncCDPClient):
+        cdp.on("Target.targetCreated", lambda p: self._on_created(ep, p))
+        cdp.on("Target.targetDestroyed", lambda p: self._on_destroyed(ep, p))
+
+    async def manter_endpoint(self, ep: Endpoint):
+        """Conecta e reconecta um endpoint; quando cai, as abas dele voltam para o pool."""
+        espera = 1.0
+        while True:
+            cdp = AsyncCDPClient(ep.url)
+            try:
+                await cdp.connect()
+                self._ligar_eventos(ep, cdp)
+                ep.cdp = cdp
+                ep.vivo = True
+                ep._cpu_ant = None
+                await cdp.call("Target.setDiscoverTargets", {"discover": True})
+                print(f"[POOL] {ep.nome} conectado (cap={ep.capacidade})")
+                espera = 1.0
+                self.sujo.set()
+                await cdp.fechado.wait()
+            except Exception as e:
+                print(f"[WARN] CDP {ep.nome} indisponível: {e}")
+            finally:
+                if ep.vivo:
+                    ep.vivo = False
+                    self._endpoint_caiu(ep)
+                try:
+                    await cdp.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 30.0)
+
+    def _endpoint_caiu(self, ep: Endpoint):
+        perdidos = [c2 for c2, m in self.open_tabs.items() if m["endpoint"] == ep.nome]
+        for c2 in perdidos:
+            meta = self.open_tabs.pop(c2)
+            self.target_to_c2.pop((ep.nome, meta["target_id"]), None)
+            self.ultimo_open.pop(c2, None)  # reabre já em outro navegador
+            self.fechando.discard(c2)
+            self.recarregando.discard(c2)
+        print(f"[POOL] {ep.nome} caiu; {len(perdidos)} jogos voltam para o pool")
+        self.sujo.set()
+
+    async def loop_cpu(self, cada: float = 5.0):
+        while True:
+            await asyncio.sleep(cada)
+            for ep in list(self.pool.values()):
+                if not ep.vivo:
+                    continue
                 try:
-                    cdp.close_tab(meta["target_id"])
-                    print(f"[CLOSE] c2={c2} target={meta['target_id']}")
-                except Exception as e:
-                    print(f"[WARN] erro ao fechar c2={c2}: {e}")
-                open_tabs.pop(c2, None)
-
-        # ----------------------------
-        # Abrir novas abas
-        # ----------------------------
-        remaining = max_tabs - len(open_tabs)
-        if remaining > 0:
+                    await ep.amostrar_cpu()
+                except Exception:
+                    pass  # navegador sem SystemInfo: placement só por abas/capacidade
+
+    # ---------- eventos CDP ----------
+    def _on_created(self, ep: Endpoint, params: dict):
+        info = params.get("targetInfo") or {}
+        tid = info.get("targetId")
+        if info.get("type") != "page" or not tid or (ep.nome, tid) in self.target_to_c2:
+            return
+        c2 = extract_c2(info.get("url", ""))
+        if not c2 or c2 in self.abrindo:
+            return
+        if c2 in self.open_tabs:
+            # mesmo jogo já aberto em outro navegador (ou outra aba): fecha a sobra
+            if self.open_tabs[c2]["target_id"] != tid:
+                print(f"[DUP] c2={c2} em {ep.nome} target={tid}; fechando")
+                asyncio.create_task(self._fechar_sobra(ep, tid))
+            return
+        # aba aberta fora do manager (ou que sobrou de uma execução anterior): adota
+        self.open_tabs[c2] = {"target_id": tid, "url": info.get("url"), "opened_at": time.time(), "endpoint": ep.nome}
+        self.target_to_c2[(ep.nome, tid)] = c2
+        print(f"[ADOPT] c2={c2} {ep.nome} target={tid}")
+        self.sujo.set()
+
+    def _on_destroyed(self, ep: Endpoint, params: dict):
+        tid = params.get("targetId")
+        c2 = self.target_to_c2.pop((ep.nome, tid), None)
+        if c2 is None:
+            # _fechar já tirou do mapa; se a aba ainda constar aberta, tira aqui
+            c2 = next((c for c, m in self.open_tabs.items()
+                       if m["target_id"] == tid and m["endpoint"] == ep.nome), None)
+            if c2 is None:
+                return
+        meta = self.open_tabs.get(c2)
+        if meta and meta["target_id"] == tid and meta["endpoint"] == ep.nome:
+            self.open_tabs.pop(c2, None)
+            if c2 not in self.fechando:
+                print(f"[GONE] c2={c2} {ep.nome} target={tid} (fechada fora do manager)")
+        self.sujo.set()  # removeu um target conhecido: a vaga pode ser reocupada já
+
+    # ---------- eventos da API ----------
+    def aplicar_evento(self, evento: str, dados: dict):
+        if evento == "snapshot":
+            urls = dados.get("urls") or {}
+            self.ativos = {str(c2): urls.get(c2) for c2 in dados.get("ids", [])}
+        elif evento == "event_start":
+            self.ativos[str(dados["c2"])] = dados.get("url")
+        elif evento == "event_end":
+            self.ativos.pop(str(dados["c2"]), None)
+        elif evento == "rates":
+            self.rates = dados or {}
+            self.rates_em = time.time()
+        else:
+            return
+        self.sujo.set()
+
+    # ---------- ações ----------
+    async def _abrir(self, c2: str, url: str, ep: Endpoint):
+        async with self.sems[ep.nome]:
+            try:
+                created = await ep.cdp.new_tab(url)
+                tid = created.get("id")
+                if not tid:
+                    print(f"[WARN] target sem id: {created}")
+                    return
+                self.open_tabs[c2] = {"target_id": tid, "url": url, "opened_at": time.time(), "endpoint": ep.nome}
+                self.target_to_c2[(ep.nome, tid)] = c2
+                print(f"[OPEN] c2={c2} {ep.nome} target={tid}")
+            except Exception as e:
+                print(f"[WARN] erro ao abrir {url} em {ep.nome}: {e}")
+            finally:
+                self.abrindo.pop(c2, None)
+        if c2 not in self.ativos:
+            self.sujo.set()  # acabou enquanto abria: o próximo ciclo fecha
+
+    async def _fechar(self, c2: str, tid: str, nome: str):
+        ep = self.pool[nome]
+        async with self.sems[nome]:
             try:
-                urls = get_targets(local_api, min(open_per_tick, remaining))
+                if ep.vivo:
+                    await ep.cdp.close_tab(tid)
+                    print(f"[CLOSE] c2={c2} {nome} target={tid}")
             except Exception as e:
-                print(f"[WARN] erro ao buscar targets: {e}")
-                urls = []
+                print(f"[WARN] erro ao fechar c2={c2}: {e}")
+            finally:
+                self.fechando.discard(c2)
+                self.target_to_c2.pop((nome, tid), None)
+                meta = self.open_tabs.get(c2)
+                if meta and meta["target_id"] == tid and meta["endpoint"] == nome:
+                    self.open_tabs.pop(c2, None)
+                # vaga livre: o targetDestroyed pode chegar depois daqui (e já
+                # não acha o target), então quem acorda o reconciliar é o fechamento
+                self.sujo.set()
+
+    async def _fechar_sobra(self, ep: Endpoint, tid: str):
+        try:
+            await ep.cdp.close_tab(tid)
+        except Exception as e:
+            print(f"[WARN] erro ao fechar aba duplicada em {ep.nome}: {e}")
 
-            for url in urls:
-                c2 = extract_c2(url)
-                if not c2:
-                    print(f"[SKIP] não consegui extrair c2: {url}")
-                    continue
+    async def _recarregar(self, c2: str, tid: str, nome: str):
+        ep = self.pool[nome]
+        async with self.sems[nome]:
+            try:
+                await ep.cdp.reload_tab(tid)
+                print(f"[RELOAD] c2={c2} {nome} target={tid} (feed parado)")
+            except Exception as e:
+                print(f"[WARN] erro ao recarregar c2={c2}: {e}")
+            finally:
+                self.recarregando.discard(c2)
+
+    def _ultimo_frame_local(self, c2: str) -> Optional[float]:
+        # idade_s vem do relógio do servidor; converte para o relógio local
+        idade = (self.rates.get(c2) or {}).get("idade_s")
+        if idade is None or not self.rates_em:
+            return None
+        return self.rates_em - idade
+
+    def _checar_saude(self, agora: float):
+        """
+        Retorna (recarregar [c2], substituir [c2], bloquear [c2]).
+        Referência de "parado": o mais recente entre abertura/reload da aba e
+        o último frame do jogo.
+        """
+        recarregar, substituir, bloquear = [], [], []
+        if not self.rates_em:
+            return recarregar, substituir, bloquear
+        for c2, meta in self.open_tabs.items():
+            if c2 in self.fechando or c2 in self.recarregando or c2 not in self.ativos:
+                continue
+            base = max(meta["opened_at"], meta.get("reloaded_at", 0.0))
+            ultimo = self._ultimo_frame_local(c2)
+            if ultimo is not None and ultimo > base:
+                # aba entregando: zera o histórico de falhas
+                self.falhas.pop(c2, None)
+            ref = max(base, ultimo or 0.0)
+            if agora - ref <= self.stall_after:
+                continue
+
+            f = self.falhas.setdefault(c2, {"reloads": 0, "replaces": 0})
+            if f["reloads"] < self.max_reloads:
+                f["reloads"] += 1
+                meta["reloaded_at"] = agora
+                recarregar.append(c2)
+            elif f["replaces"] < self.max_replaces:
+                f["replaces"] += 1
+                f["reloads"] = 0
+                substituir.append(c2)
+            else:
+                self.falhas.pop(c2, None)
+                bloquear.append(c2)
+        return recarregar, substituir, bloquear
+
+    def _planejar(self):
+        # jogo que acabou sai sempre; o resto o escalonador decide
+        fechar = [c2 for c2 in self.open_tabs if c2 not in self.ativos and c2 not in self.fechando]
+
+        agora = time.time()
+        recarregar, substituir, bloquear = self._checar_saude(agora)
+        for c2 in recarregar:
+            meta = self.open_tabs[c2]
+            self.recarregando.add(c2)
+            asyncio.create_task(self._recarregar(c2, meta["target_id"], meta["endpoint"]))
+        for c2 in substituir:
+            # aba nova do mesmo jogo: fecha a travada e libera a reabertura já
+            print(f"[REPLACE] c2={c2} (feed parado mesmo após reload)")
+            self.ultimo_open.pop(c2, None)
+            fechar.append(c2)
+        for c2 in bloquear:
+            print(f"[STALL] c2={c2} bloqueado por {self.stall_block:.0f}s")
+            self.bloqueado_ate[c2] = agora + self.stall_block
+            fechar.append(c2)
+
+        bloqueados = set(self.abrindo)
+        for c2, ts in self.ultimo_open.items():
+            if agora - ts < self.reopen_cooldown:
+                bloqueados.add(c2)
+        for c2, ate in list(self.bloqueado_ate.items()):
+            if agora < ate:
+                bloqueados.add(c2)
+            else:
+                self.bloqueado_ate.pop(c2, None)
+
+        abertas = {c2: m["opened_at"] for c2, m in self.open_tabs.items()
+                   if c2 in self.ativos and c2 not in self.fechando and c2 not in fechar}
+        ocupadas = len(abertas) + len(self.abrindo)
+        abrir, trocar, self.notas = self.escalonador.planejar(
+            self.ativos, self.rates, abertas, ocupadas, self.capacidade_viva(), bloqueados, agora
+        )
+        for c2 in trocar:
+            print(f"[ROTATE] sai c2={c2} (nota {self.notas.get(c2, 0):.2f})")
+        fechar += trocar
+        fechar = [(c2, self.open_tabs[c2]["target_id"], self.open_tabs[c2]["endpoint"]) for c2 in dict.fromkeys(fechar)]
+        return fechar, abrir
+
+    def tabela(self) -> str:
+        """Taxa por aba (e nota) para calibrar os pesos do escalonador."""
+        linhas = [f"{'c2':>12} {'aba':>12} {'frames/s':>9} {'KB/s':>7} {'merc':>5} {'idade':>6} {'rest':>5} {'nota':>6} {'saude':>9}"]
+        for c2 in sorted(self.ativos, key=lambda c: -self.notas.get(c, 0)):
+            r = self.rates.get(c2) or {}
+            idade = r.get("idade_s")
+            rest = r.get("restante_s")
+            onde = self.open_tabs[c2]["endpoint"] if c2 in self.open_tabs else "-"
+            linhas.append(
+                f"{c2:>12} {onde:>12} {r.get('frames_s', 0):>9.2f} "
+                f"{(r.get('bytes_s') or 0) / 1024:>7.1f} {r.get('mercados', 0):>5} "
+                f"{'-' if idade is None else idade:>6} {'-' if rest is None else rest:>5} {self.notas.get(c2, 0):>6.2f} "
+                f"{r.get('saude', '-'):>9}"
+            )
+        linhas.append(f"{'endpoint':>20} {'vivo':>5} {'abas':>9} {'cpu':>6}")
+        for ep in self.pool.values():
+            linhas.append(
+                f"{ep.nome:>20} {'sim' if ep.vivo else 'não':>5} "
+                f"{self.abas_no_endpoint(ep.nome):>4}/{ep.capacidade:<4} {ep.cpu:>6.2f}"
+            )
+        return "\n".join(linhas)
+
+    async def reconciliar(self):
+        fechar, abrir = self._planejar()
+        for c2, tid, nome in fechar:
+            self.fechando.add(c2)
+            asyncio.create_task(self._fechar(c2, tid, nome))
+        agora = time.time()
+        abertos = []
+        for c2, url in abrir:
+            ep = self.escolher_endpoint()
+            if ep is None:
+                break
+            self.abrindo[c2] = ep.nome  # reserva a vaga antes da próxima escolha
+            self.ultimo_open[c2] = agora
+            abertos.append((c2, url))
+            asyncio.create_task(self._abrir(c2, url, ep))
+        return fechar, abertos
+
+    async def loop_reconciliar(self):
+        while True:
+            try:
+                # cooldown de reabertura pode liberar vaga sem evento novo
+                await asyncio.wait_for(self.sujo.wait(), timeout=max(1.0, self.reopen_cooldown))
+            except asyncio.TimeoutError:
+                pass
+            self.sujo.clear()
+            await self.reconciliar()
 
-                if c2 in open_tabs:
-                    continue
 
-                if active_ids and c2 not in active_ids:
-                    continue
+# ============================================================
+# MAIN LOOP
+# ============================================================
+async def consumir_api(local_api: str, mgr: TabManager):
+    espera = 1.0
+    while True:
+        try:
+            async for evento, dados in stream_eventos(local_api, "events,rates"):
+                espera = 1.0
+                mgr.aplicar_evento(evento, dados)
+        except Exception as e:
+            print(f"[WARN] /stream: {e} (reconectando em {espera:.0f}s)")
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, 30.0)
 
-                try:
-                    created = cdp.new_tab(url)
-                    tid = created.get("id")
-                    if not tid:
-                        print(f"[WARN] target sem id: {created}")
-                        continue
 
-                    open_tabs[c2] = {
-                        "target_id": tid,
-                        "url": url,
-                        "opened_at": time.time()
-                    }
-                    print(f"[OPEN] c2={c2} target={tid}")
+async def imprimir_tabela(mgr: TabManager, cada: float):
+    while True:
+        await asyncio.sleep(cada)
+        print(mgr.tabela())
 
-                except Exception as e:
-                    print(f"[WARN] erro ao abrir {url}: {e}")
 
-        # ----------------------------
-        # Sleep
-        # ----------------------------
-        elapsed = time.time() - start
-        time.sleep(max(0, poll - elapsed))
+async def run_async(
+    local_api: str,
+    endpoints: List[Endpoint],
+    max_tabs: int,
+    max_parallel: int,
+    reopen_cooldown: float,
+    escalonador: Optional[Escalonador] = None,
+    stats_every: float = 0.0,
+    saude: Optional[dict] = None,
+    w_cpu: float = 1.0
+):
+    mgr = TabManager(endpoints, max_tabs, max_parallel, reopen_cooldown, escalonador, w_cpu=w_cpu, **(saude or {}))
+    tarefas = [asyncio.create_task(mgr.manter_endpoint(ep)) for ep in endpoints]
+    tarefas += [
+        asyncio.create_task(consumir_api(local_api, mgr)),
+        asyncio.create_task(mgr.loop_reconciliar()),
+        asyncio.create_task(mgr.loop_cpu()),
+    ]
+    if stats_every > 0:
+        tarefas.append(asyncio.create_task(imprimir_tabela(mgr, stats_every)))
+    await asyncio.gather(*tarefas)
 
 
 # ============================================================
@@ -184,28 +750,67 @@ def run_loop(
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--local-api", default="http://127.0.0.1:8485")
-    ap.add_argument("--cdp", default="http://127.0.0.1:9222")
-    ap.add_argument("--poll", type=float, default=5.0)
-    ap.add_argument("--max-tabs", type=int, default=12)
-    ap.add_argument("--open-per-tick", type=int, default=3)
+    ap.add_argument("--cdp", action="append", default=None,
+                    help="endpoint CDP (repita para um pool): URL[,cap=N][,cores=N][,name=NOME]")
+    ap.add_argument("--max-tabs", type=int, default=12, help="teto global de abas (0 = soma das capacidades)")
+    ap.add_argument("--tabs-per-browser", type=int, default=12, help="capacidade padrão de cada endpoint sem cap=")
+    ap.add_argument("--w-cpu", type=float, default=1.0, help="peso da CPU do navegador na escolha do endpoint")
+    ap.add_argument("--max-parallel", type=int, default=4, help="comandos CDP de abrir/fechar simultâneos por navegador")
+    ap.add_argument("--reopen-cooldown", type=float, default=30.0, help="segundos antes de reabrir a aba do mesmo jogo")
+    ap.add_argument("--w-markets", type=float, default=1.0)
+    ap.add_argument("--w-rate", type=float, default=1.5)
+    ap.add_argument("--w-stale", type=float, default=1.0)
+    ap.add_argument("--cost-kb", type=float, default=0.05, help="custo extra por KB/s de feed da aba")
+    ap.add_argument("--time-horizon", type=float, default=240.0)
+    ap.add_argument("--stale-horizon", type=float, default=120.0)
+    ap.add_argument("--hysteresis", type=float, default=0.25)
+    ap.add_argument("--min-dwell", type=float, default=30.0, help="segundos mínimos de aba aberta antes de poder sair na rotação")
+    ap.add_argument("--rotate-per-cycle", type=int, default=1)
+    ap.add_argument("--stall-after", type=float, default=30.0, help="s sem frame de mercado para considerar a aba travada")
+    ap.add_argument("--max-reloads", type=int, default=1, help="reloads antes de trocar por uma aba nova")
+    ap.add_argument("--max-replaces", type=int, default=1, help="abas novas antes de bloquear o jogo")
+    ap.add_argument("--stall-block", type=float, default=180.0, help="s que um jogo travado fica fora do escalonamento")
+    ap.add_argument("--stats-every", type=float, default=0.0, help="imprime a taxa/nota por aba a cada N s (0 = não)")
 
     args = ap.parse_args()
+    endpoints = [parse_endpoint(spec, args.tabs_per_browser) for spec in (args.cdp or ["http://127.0.0.1:9222"])]
 
     print("=== Tab Manager ===")
     print(f"local_api: {args.local_api}")
-    print(f"cdp:       {args.cdp}")
-    print(f"poll:      {args.poll}s")
+    for ep in endpoints:
+        print(f"cdp:       {ep.nome} {ep.url} cap={ep.capacidade} cores={ep.cores}")
     print(f"max_tabs:  {args.max_tabs}")
-    print(f"open/tick: {args.open_per_tick}")
+    print(f"parallel:  {args.max_parallel}")
     print("===================")
 
-    run_loop(
+    escalonador = Escalonador(
+        w_mercados=args.w_markets,
+        w_taxa=args.w_rate,
+        w_stale=args.w_stale,
+        custo_kb=args.cost_kb,
+        time_horizon=args.time_horizon,
+        stale_horizon=args.stale_horizon,
+        histerese=args.hysteresis,
+        min_dwell=args.min_dwell,
+        trocas_por_ciclo=args.rotate_per_cycle
+    )
+
+    asyncio.run(run_async(
         local_api=args.local_api.rstrip("/"),
-        cdp_url=args.cdp.rstrip("/"),
-        poll=args.poll,
+        endpoints=endpoints,
         max_tabs=args.max_tabs,
-        open_per_tick=args.open_per_tick
-    )
+        max_parallel=args.max_parallel,
+        reopen_cooldown=args.reopen_cooldown,
+        escalonador=escalonador,
+        stats_every=args.stats_every,
+        saude={
+            "stall_after": args.stall_after,
+            "max_reloads": args.max_reloads,
+            "max_replaces": args.max_replaces,
+            "stall_block": args.stall_block,
+        },
+        w_cpu=args.w_cpu
+    ))
 
 
 if __name__ == "__main__":